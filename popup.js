@@ -2,6 +2,13 @@
 const API_URL = 'http://127.0.0.1:8000/api/';
 const TOKEN_KEY = 'authToken';
 const SELECTED_GROUP_KEY = 'selectedGroup';
+// Offline copies: the group list, the tasks per scope ('personal' or a group id)
+// as last seen on the server, and the task writes not sent yet
+const GROUPS_KEY = 'groups';
+const SNAPSHOTS_KEY = 'snapshots';
+const OUTBOX_KEY = 'outbox';
+// Only the fields the task list renders
+const TASK_FIELDS = 'id,text,completed,priority,group';
 
 // UI Elements
 const mainForm = document.getElementById('main-form');
@@ -67,6 +74,29 @@ document.addEventListener('DOMContentLoaded', () => {
         splashVideo.play();
     });
 });
+// Send the writes queued while offline as soon as the connection is back
+window.addEventListener('online', () => {
+    if (!taskManager.classList.contains('hidden-element')) {
+        loadTasks();
+    }
+});
+
+// chrome.storage.local as promises
+function getStored(keys) {
+    return new Promise(resolve => chrome.storage.local.get(keys, resolve));
+}
+
+function setStored(items) {
+    return new Promise(resolve => chrome.storage.local.set(items, resolve));
+}
+
+// Read-modify-write of stored keys, one at a time so concurrent updates don't overwrite each other.
+// update(stored) returns the items to store.
+let storageUpdates = Promise.resolve();
+function updateStored(keys, update) {
+    storageUpdates = storageUpdates.then(() => getStored(keys).then(stored => setStored(update(stored))));
+    return storageUpdates;
+}
 
 // Helper function to get token
 function getToken() {
@@ -182,7 +212,8 @@ function handleRegister(event) {
 }
 
 function handleLogout() {
-    chrome.storage.local.remove(TOKEN_KEY, function() {
+    // the offline copies belong to this user, and so do the writes not sent yet
+    chrome.storage.local.remove([TOKEN_KEY, GROUPS_KEY, SNAPSHOTS_KEY, OUTBOX_KEY], function() {
         showMainForm();
         alert('You have been logged out.');
         groupDropdown.innerHTML = '';
@@ -197,54 +228,21 @@ function handleAddTask() {
     const selectedGroup = groupDropdown.value;
     const priority = priorityDropdown.value;
 
-    const body = {
+    const data = {
         text: text,
         priority: priority
     };
     if (selectedGroup !== 'personal') {
-        body.group = selectedGroup;
+        data.group = Number(selectedGroup);
     }
-    getToken().then(token => {
-        fetch(`${API_URL}tasks/`, {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Token ${token}`
-            },
-            body: JSON.stringify(body),
-        })
-        .then(response => response.json())
-        .then(task => {
-            const newTaskElement = createTaskElement(task);
-            taskList.appendChild(newTaskElement);
-            taskInput.value = '';
-            priorityDropdown.value = 'medium';
-        })
-        .catch(error => console.error('Error adding task:', error));
-    }).catch(error => console.error(error));
+    taskInput.value = '';
+    priorityDropdown.value = 'medium';
+    // the client_id makes replaying the create harmless
+    saveTaskWrite({ op: 'create', client_id: crypto.randomUUID(), data: data });
 }
 
 function handleCompleteTask(task, checkbox) {
-    getToken().then(token => {
-        fetch(`${API_URL}tasks/${task.id}/`, {
-            method: 'PUT',
-            headers: {
-                'Content-Type': 'application/json',
-                'Authorization': `Token ${token}`
-            },
-            body: JSON.stringify({ completed: checkbox.checked }),
-        })
-        .then(response => response.json())
-        .then(updatedTask => {
-            const taskSpan = checkbox.nextElementSibling;
-            if (updatedTask.completed) {
-                taskSpan.classList.add('completed');
-            } else {
-                taskSpan.classList.remove('completed');
-            }
-        })
-        .catch(error => console.error('Error completing task:', error));
-    }).catch(error => console.error(error));
+    saveTaskWrite({ op: 'update', ...taskRef(task), data: { completed: checkbox.checked } });
 }
 
 function handleAddGroup() {
@@ -308,33 +306,32 @@ function handleGroupChange() {
 
 function loadGroups() {
     getToken().then(token => {
-        fetch(`${API_URL}groups/`, {
-            method: 'GET',
-            headers: {
-                'Authorization': `Token ${token}`
-            },
-        })
-        .then(response => response.json())
-        .then(groups => {
-            groupDropdown.innerHTML = '';
-            const personalOption = document.createElement('option');
-            personalOption.value = 'personal';
-            personalOption.textContent = 'Personal';
-            groupDropdown.appendChild(personalOption);
-            groups.forEach(group => {
-                const option = document.createElement('option');
-                option.value = group.id;
-                option.textContent = group.name;
-                groupDropdown.appendChild(option);
-            });
-            chrome.storage.local.get([SELECTED_GROUP_KEY], function(result) {
-                const storedGroup = result[SELECTED_GROUP_KEY];
-                if (storedGroup && (storedGroup === 'personal' || groups.some(g => g.id == storedGroup))) {
-                    groupDropdown.value = storedGroup;
-                } else {
-                    groupDropdown.value = 'personal';
+        // show the stored list right away, the tasks can render before the network answers
+        getStored([GROUPS_KEY]).then(stored => {
+            const cachedGroups = stored[GROUPS_KEY];
+            if (cachedGroups) {
+                showGroups(cachedGroups);
+            }
+            // the dropdown only needs ids and names, skip the member lists
+            return fetchJSON(`${API_URL}groups/?view=summary`, token)
+            .then(summaries => {
+                const groups = summaries.map(group => ({ id: group.id, name: group.name }));
+                // forget the tasks of groups the user left
+                const scopes = new Set(['personal', ...groups.map(group => String(group.id))]);
+                updateStored([SNAPSHOTS_KEY], current => {
+                    const snapshots = current[SNAPSHOTS_KEY] || {};
+                    Object.keys(snapshots).filter(scope => !scopes.has(scope)).forEach(scope => delete snapshots[scope]);
+                    return { [GROUPS_KEY]: groups, [SNAPSHOTS_KEY]: snapshots };
+                });
+                if (JSON.stringify(groups) !== JSON.stringify(cachedGroups)) {
+                    showGroups(groups);
+                }
+            })
+            .catch(error => {
+                if (!cachedGroups) {
+                    throw error;
                 }
-                loadTasks();
+                console.error('Showing the stored groups:', error);
             });
         })
         .catch(error => console.error('Error loading groups:', error));
@@ -343,10 +340,37 @@ function loadGroups() {
     });
 }
 
+function showGroups(groups) {
+    groupDropdown.innerHTML = '';
+    const personalOption = document.createElement('option');
+    personalOption.value = 'personal';
+    personalOption.textContent = 'Personal';
+    groupDropdown.appendChild(personalOption);
+    groups.forEach(group => {
+        const option = document.createElement('option');
+        option.value = group.id;
+        option.textContent = group.name;
+        groupDropdown.appendChild(option);
+    });
+    chrome.storage.local.get([SELECTED_GROUP_KEY], function(result) {
+        const storedGroup = result[SELECTED_GROUP_KEY];
+        if (storedGroup && (storedGroup === 'personal' || groups.some(g => g.id == storedGroup))) {
+            groupDropdown.value = storedGroup;
+        } else {
+            groupDropdown.value = 'personal';
+        }
+        loadTasks();
+    });
+}
+
 function createTaskElement(task) {
     const li = document.createElement('li');
-    li.setAttribute('data-task-id', task.id);
+    li.setAttribute('data-task-id', task.id || task.client_id);
     li.setAttribute('data-group-id', task.group);
+    if (!task.id) {
+        // created here, not on the server yet
+        li.classList.add('pending');
+    }
 
     if (task.priority) {
         li.classList.add(`priority-${task.priority}`);
@@ -369,7 +393,7 @@ function createTaskElement(task) {
     const removeBtn = document.createElement('button');
     removeBtn.textContent = 'x';
     removeBtn.classList.add('remove-btn');
-    removeBtn.addEventListener('click', () => deleteTask(task.id));
+    removeBtn.addEventListener('click', () => deleteTask(task));
 
     li.appendChild(checkbox);
     li.appendChild(span);
@@ -378,73 +402,242 @@ function createTaskElement(task) {
     return li;
 }
 
-function deleteTask(taskId) {
-    getToken().then(token => {
-        fetch(`${API_URL}tasks/${taskId}/`, {
-            method: 'DELETE',
-            headers: {
-                'Authorization': `Token ${token}`
-            },
-        })
-        .then(response => {
-            if (response.ok) {
-                document.querySelector(`li[data-task-id="${taskId}"]`).remove();
-            } else {
-                alert("Failed to delete task. You may not have permission.");
-            }
-        })
-        .catch(error => {
-            console.error('Error deleting task:', error);
-            alert("Error deleting task.");
-        });
-    }).catch(error => console.error(error));
+function deleteTask(task) {
+    saveTaskWrite({ op: 'delete', ...taskRef(task) });
 }
 
 function loadTasks() {
+    const scope = groupDropdown.value;
+    if (!scope || scope === 'undefined') {
+        showTaskError("Please select a group to view tasks.");
+        return;
+    }
     getToken().then(token => {
-        const selectedGroupId = groupDropdown.value;
-        
-        let url = `${API_URL}tasks/`;
-        if (selectedGroupId === 'personal') {
-            url += '?group__isnull=True';
-        } else if (selectedGroupId && selectedGroupId !== 'undefined') {
-            url += `?group=${selectedGroupId}`;
+        // the stored copy at once, then catch up with the server in the background
+        showStoredTasks(scope).then(() => syncTasks(scope, token));
+    }).catch(error => {
+        console.error("Token not found, please log in.");
+        showMainForm();
+    });
+}
+
+// Queue a task write, show it at once, then send it (right away, or once back online)
+function saveTaskWrite(op) {
+    const scope = groupDropdown.value;
+    queueTaskWrite({ ...op, key: crypto.randomUUID() })
+    .then(() => showStoredTasks(scope))
+    .then(() => getToken())
+    .then(token => syncTasks(scope, token))
+    .catch(error => console.error(error));
+}
+
+// How a bulk operation names a task: by id, or by client_id until the server has assigned one
+function taskRef(task) {
+    return task.id ? { id: task.id } : { client_id: task.client_id };
+}
+
+function sameTask(task, ref) {
+    return ref.id ? task.id === ref.id : task.client_id === ref.client_id;
+}
+
+function taskScope(task) {
+    return task.group ? String(task.group) : 'personal';
+}
+
+// keys of the outbox operations in the batch being sent
+let sendingKeys = new Set();
+
+function queueTaskWrite(op) {
+    return updateStored([OUTBOX_KEY], stored => {
+        const outbox = stored[OUTBOX_KEY] || [];
+        // fold writes to a task created offline into its create, unless that is being sent
+        const create = op.op !== 'create' && !op.id && outbox.find(queued =>
+            queued.op === 'create' && queued.client_id === op.client_id && !sendingKeys.has(queued.key));
+        if (create && op.op === 'update') {
+            Object.assign(create.data, op.data);
+        } else if (create) {
+            outbox.splice(outbox.indexOf(create), 1);
+        } else {
+            outbox.push(op);
         }
-        
-        fetch(url, {
-            method: 'GET',
-            headers: {
-                'Authorization': `Token ${token}`
+        return { [OUTBOX_KEY]: outbox };
+    });
+}
+
+// The stored tasks of scope with the queued writes applied, newest first
+function tasksToShow(snapshot, outbox, scope) {
+    const tasks = (snapshot ? snapshot.tasks : []).map(task => ({ ...task }));
+    outbox.forEach(op => {
+        if (op.op === 'create') {
+            if (taskScope(op.data) === scope) {
+                tasks.push({ client_id: op.client_id, completed: false, ...op.data });
             }
+            return;
+        }
+        const index = tasks.findIndex(task => sameTask(task, op));
+        if (index === -1) {
+            return;
+        }
+        if (op.op === 'delete' || ('group' in op.data && taskScope(op.data) !== scope)) {
+            tasks.splice(index, 1);
+        } else {
+            Object.assign(tasks[index], op.data);
+        }
+    });
+    // not created on the server yet: on top
+    return tasks.sort((a, b) => (b.id || Infinity) - (a.id || Infinity) || 0);
+}
+
+function showStoredTasks(scope) {
+    return getStored([SNAPSHOTS_KEY, OUTBOX_KEY]).then(stored => {
+        if (groupDropdown.value !== scope) {
+            return;  // the user switched lists meanwhile
+        }
+        const tasks = tasksToShow((stored[SNAPSHOTS_KEY] || {})[scope], stored[OUTBOX_KEY] || [], scope);
+        taskList.innerHTML = '';
+        tasks.forEach(task => taskList.appendChild(createTaskElement(task)));
+    });
+}
+
+function showTaskError(message) {
+    const taskError = document.getElementById('task-error');
+    taskError.textContent = message;
+    taskError.classList.toggle('hidden-element', !message);
+}
+
+// Send the queued writes, refresh the stored copy of scope, and show it
+function syncTasks(scope, token) {
+    return sendOutbox(token)
+    .then(rejected => {
+        showTaskError(rejected.length ? `Some changes were not saved: ${rejected.join(' ')}` : '');
+        return fetchTasks(scope, token);
+    })
+    .then(() => showStoredTasks(scope))
+    .catch(error => {
+        if (error instanceof TypeError) {
+            // fetch() fails like this without a connection
+            showTaskError("You're offline. Changes will be sent when the connection is back.");
+        } else {
+            console.error('Error syncing tasks:', error);
+            showTaskError(error.message);
+        }
+    });
+}
+
+let outboxSending = null;
+function sendOutbox(token) {
+    // one batch at a time; a caller arriving meanwhile waits for it, then sends what is left
+    if (outboxSending) {
+        return outboxSending.then(() => sendOutbox(token));
+    }
+    outboxSending = getStored([OUTBOX_KEY]).then(stored => {
+        const batch = stored[OUTBOX_KEY] || [];
+        if (batch.length === 0) {
+            return [];
+        }
+        sendingKeys = new Set(batch.map(op => op.key));
+        return fetchJSON(`${API_URL}tasks/bulk/`, token, {
+            method: 'POST',
+            body: JSON.stringify({ operations: batch.map(({ key, ...op }) => op) }),
         })
-        .then(response => {
-            if (!response.ok) {
-                return response.json().then(errorData => {
-                    throw new Error(errorData.error || 'Failed to load tasks.');
+        .then(data => {
+            const rejected = [];
+            return updateStored([OUTBOX_KEY, SNAPSHOTS_KEY], current => {
+                const snapshots = current[SNAPSHOTS_KEY] || {};
+                data.results.forEach((result, index) => {
+                    const op = batch[index];
+                    // update the stored copies right away, the next snapshot agrees with them
+                    if (result.data) {
+                        dropStoredTask(snapshots, result.data);
+                        const snapshot = snapshots[taskScope(result.data)];
+                        if (snapshot) {
+                            snapshot.tasks.push(result.data);
+                        }
+                    } else if (op.op === 'delete' && (result.status === 204 || result.status === 404)) {
+                        // deleted, or already gone
+                        dropStoredTask(snapshots, op);
+                    } else if (result.status >= 400) {
+                        rejected.push(JSON.stringify(result.errors || result.status));
+                    }
                 });
-            }
-            return response.json();
-        })
-        .then(tasks => {
-            taskList.innerHTML = '';
-            tasks.forEach(task => {
-                const newTaskElement = createTaskElement(task);
-                taskList.appendChild(newTaskElement);
-            });
-        })
-        .catch(error => {
-            console.error('Error loading tasks:', error);
-            const taskError = document.getElementById('task-error');
-            if (error.message.includes('expected a number but got \'undefined\'')) {
-                 taskError.textContent = "Please select a group to view tasks.";
-            } else {
-                taskError.textContent = error.message;
-            }
-            taskError.classList.remove('hidden-element');
+                const outbox = (current[OUTBOX_KEY] || []).filter(op => !sendingKeys.has(op.key));
+                return { [OUTBOX_KEY]: outbox, [SNAPSHOTS_KEY]: snapshots };
+            }).then(() => rejected);
         });
-    }).catch(error => {
-        console.error("Token not found, please log in.");
-        showMainForm();
+    }).finally(() => {
+        sendingKeys = new Set();
+        outboxSending = null;
+    });
+    return outboxSending;
+}
+
+// ref: a task or an operation, matched by its id or its client_id
+function dropStoredTask(snapshots, ref) {
+    const matches = task => (ref.id && task.id === ref.id) || (ref.client_id && task.client_id === ref.client_id);
+    Object.values(snapshots).forEach(snapshot => {
+        snapshot.tasks = snapshot.tasks.filter(task => !matches(task));
+    });
+}
+
+// Bring the stored copy of scope up to date: a versioned snapshot for groups, the full list for personal tasks
+function fetchTasks(scope, token) {
+    return getStored([SNAPSHOTS_KEY]).then(stored => {
+        const snapshot = (stored[SNAPSHOTS_KEY] || {})[scope];
+        const fetched = scope === 'personal' ? fetchPersonalTasks(token) : fetchGroupSnapshot(scope, snapshot, token);
+        return fetched.then(fresh => updateStored([SNAPSHOTS_KEY], current => {
+            const snapshots = current[SNAPSHOTS_KEY] || {};
+            snapshots[scope] = fresh;
+            return { [SNAPSHOTS_KEY]: snapshots };
+        }));
+    });
+}
+
+// GET groups/<id>/snapshot/ answers "unchanged", a "patch" from our version or the "full" list
+function fetchGroupSnapshot(groupId, snapshot, token) {
+    let url = `${API_URL}groups/${groupId}/snapshot/`;
+    if (snapshot && snapshot.version !== undefined) {
+        url += `?version=${snapshot.version}`;
+    }
+    return fetchJSON(url, token).then(doc => {
+        // snapshot tasks leave out their group
+        const withGroup = tasks => tasks.map(task => ({ ...task, group: Number(groupId) }));
+        if (doc.status === 'unchanged') {
+            return snapshot;
+        }
+        if (doc.status === 'full') {
+            return { version: doc.version, tasks: withGroup(doc.tasks) };
+        }
+        const replaced = new Set([...doc.deleted, ...doc.changed.map(task => task.id)]);
+        const tasks = snapshot.tasks.filter(task => !replaced.has(task.id)).concat(withGroup(doc.changed));
+        return { version: doc.version, tasks: tasks };
+    });
+}
+
+// Personal tasks have no snapshot: follow the `next` cursor through the whole list
+function fetchPersonalTasks(token) {
+    const tasks = [];
+    const loadPage = url => fetchJSON(url, token).then(page => {
+        tasks.push(...page.results);
+        return page.next ? loadPage(page.next) : { tasks: tasks };
+    });
+    return loadPage(`${API_URL}tasks/?fields=${TASK_FIELDS}&group__isnull=True`);
+}
+
+function fetchJSON(url, token, options = {}) {
+    return fetch(url, {
+        ...options,
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Token ${token}`
+        }
+    })
+    .then(response => {
+        if (!response.ok) {
+            return response.json().then(errorData => {
+                throw new Error(errorData.error || errorData.detail || 'Request failed.');
+            });
+        }
+        return response.json();
     });
 }
 
@@ -472,36 +665,9 @@ function activateTaskEdit(task, taskSpanElement) {
             taskSpanElement.textContent = originalText;
             return;
         }
-        getToken().then(token => {
-            const dataToUpdate = { 
-                text: newText,
-                completed: task.completed,
-            };
-            if (task.group) {
-                dataToUpdate.group = task.group;
-            }
-            fetch(`${API_URL}tasks/${task.id}/`, {
-                method: 'PUT',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'Authorization': `Token ${token}`
-                },
-                body: JSON.stringify(dataToUpdate),
-            }).then(response => {
-                if (!response.ok) {
-                    return response.json().then(err => { throw new Error(JSON.stringify(err)); });
-                }
-                return response.json();
-            }).then(updatedTask => {
-                taskSpanElement.textContent = updatedTask.text;
-                task.text = updatedTask.text;
-            }).catch(error => {
-                console.error('Error editing task:', error);
-                alert('Failed to edit task. Error: ' + error.message);
-                taskSpanElement.textContent = originalText;
-                task.text = originalText;
-            });
-        });
+        taskSpanElement.textContent = newText;
+        task.text = newText;
+        saveTaskWrite({ op: 'update', ...taskRef(task), data: { text: newText } });
     };
     inputField.addEventListener('blur', saveEdit);
     inputField.addEventListener('keypress', (e) => {
@@ -549,27 +715,8 @@ function createMemberListItem(member) {
 
 function loadGroupMembers(groupId) {
     getToken().then(token => {
-        fetch(`${API_URL}groups/${groupId}/`, {
-            method: 'GET',
-            headers: {
-                'Authorization': `Token ${token}`
-            }
-        })
-        .then(response => {
-            if (!response.ok) {
-                return response.json().then(errorData => {
-                    throw new Error(errorData.error || 'Failed to load group members.');
-                });
-            }
-            return response.json();
-        })
-        .then(groupData => {
-            groupMembersList.innerHTML = '';
-            groupData.members.forEach(member => {
-                const memberItem = createMemberListItem(member);
-                groupMembersList.appendChild(memberItem);
-            });
-        })
+        groupMembersList.innerHTML = '';
+        loadMemberPage(`${API_URL}groups/${groupId}/members/`, token)
         .catch(error => {
             console.error('Error loading group members:', error);
             groupMembersError.textContent = error.message;
@@ -581,10 +728,37 @@ function loadGroupMembers(groupId) {
     });
 }
 
+function loadMemberPage(url, token) {
+    return fetch(url, {
+        method: 'GET',
+        headers: {
+            'Authorization': `Token ${token}`
+        }
+    })
+    .then(response => {
+        if (!response.ok) {
+            return response.json().then(errorData => {
+                throw new Error(errorData.error || 'Failed to load group members.');
+            });
+        }
+        return response.json();
+    })
+    .then(page => {
+        page.results.forEach(member => {
+            const memberItem = createMemberListItem(member);
+            groupMembersList.appendChild(memberItem);
+        });
+        if (page.next) {
+            return loadMemberPage(page.next, token);
+        }
+    });
+}
+
 function handleAddMember() {
     const selectedGroupId = groupDropdown.value;
-    const username = memberUsernameInput.value.trim();
-    if (!username) {
+    // several usernames at once, separated by commas or spaces
+    const usernames = memberUsernameInput.value.split(/[\s,]+/).filter(name => name);
+    if (usernames.length === 0) {
         groupMembersError.textContent = "Please enter a username.";
         groupMembersError.classList.remove('hidden-element');
         return;
@@ -597,7 +771,7 @@ function handleAddMember() {
                 'Content-Type': 'application/json',
                 'Authorization': `Token ${token}`
             },
-            body: JSON.stringify({ username: username }),
+            body: JSON.stringify({ usernames: usernames }),
         })
         .then(response => {
             if (!response.ok) {
@@ -608,9 +782,15 @@ function handleAddMember() {
             return response.json();
         })
         .then(data => {
-            console.log(data.message);
-            memberUsernameInput.value = '';
-            groupMembersError.classList.add('hidden-element');
+            // one result per username; keep the ones that failed in the input
+            const failed = data.results.filter(result => result.error);
+            memberUsernameInput.value = failed.map(result => result.username).join(', ');
+            if (failed.length > 0) {
+                groupMembersError.textContent = failed.map(result => `${result.username}: ${result.error}`).join(' ');
+                groupMembersError.classList.remove('hidden-element');
+            } else {
+                groupMembersError.classList.add('hidden-element');
+            }
             loadGroupMembers(selectedGroupId);
         })
         .catch(error => {
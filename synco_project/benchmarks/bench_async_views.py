@@ -0,0 +1,118 @@
+"""
+Sync vs async read views under ASGI: requests per second and latency percentiles
+for GET /api/tasks/ and GET /api/groups/ with many concurrent clients, and the
+queries per request with and without coalescing of identical reads.
+
+Requests are driven in-process through Django's ASGI handler, so no server or
+network is involved. --db-latency-ms adds a sleep to every query to stand in for
+the round trip to a remote PostgreSQL.
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.harness import QueryCounter, auth_headers, percentile, report, test_database
+
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import path
+
+from tasks import async_views, views
+from tasks.models import Group, Task
+
+# served through ROOT_URLCONF while the benchmark runs
+urlpatterns = [
+    path('sync/tasks/', views.task_list),
+    path('async/tasks/', async_views.task_list),
+    path('sync/groups/', views.group_list),
+    path('async/groups/', async_views.group_list),
+]
+
+
+def make_fixture(task_count):
+    user = User.objects.create_user(username='bench', password='bench')
+    for i in range(5):
+        group = Group.objects.create(name=f'Group {i}')
+        group.members.add(user)
+        Task.objects.bulk_create(
+            (Task(group=group, text=f'task {n}', priority='medium') for n in range(task_count // 5)),
+            batch_size=1000,
+        )
+    return auth_headers(user)['HTTP_AUTHORIZATION']
+
+
+async def asgi_get(app, path, authorization):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 5000),
+        'server': ('localhost', 8000),
+        'headers': [(b'host', b'localhost'), (b'authorization', authorization.encode())],
+    }
+    status = None
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+async def load(app, path, authorization, clients, requests_per_client):
+    latencies = []
+
+    async def client():
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            status = await asgi_get(app, path, authorization)
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert status == 200, status
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=4, help='requests per client')
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--db-latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    def slow_query(execute, sql, params, many, context):
+        time.sleep(args.db_latency_ms / 1000)
+        return execute(sql, params, many, context)
+
+    with test_database(), override_settings(ROOT_URLCONF='benchmarks.bench_async_views'):
+        authorization = make_fixture(args.tasks)
+        app = get_asgi_application()
+        results = {}
+        for endpoint in ('tasks', 'groups'):
+            for mode in ('sync', 'async'):
+                for coalesce in (False, True):
+                    path = f'/{mode}/{endpoint}/'
+                    name = f'{mode} {endpoint}' + (' coalesced' if coalesce else '')
+                    with override_settings(SYNCO_COALESCE_LIST_READS=coalesce), \
+                            connection.execute_wrapper(slow_query), QueryCounter() as queries:
+                        results[name] = asyncio.run(load(app, path, authorization, args.clients, args.requests))
+                    results[name]['queries_per_request'] = round(queries.count / results[name]['requests'], 2)
+        report('async_views', {'clients': args.clients, 'db_latency_ms': args.db_latency_ms, **results})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Cost of a 304 Not Modified compared with a full 200 on the task, group list
+and group detail endpoints, for a group holding 5k tasks.
+"""
+import argparse
+
+from benchmarks.harness import auth_headers, measure, report, test_database
+
+from django.contrib.auth.models import User
+from django.test import Client
+
+from tasks.models import Group, Task
+
+
+def run(task_count, iterations):
+    user = User.objects.create_user(username='bench', password='bench')
+    group = Group.objects.create(name='Benchmark')
+    group.members.add(user, *User.objects.bulk_create(User(username=f'member{i}') for i in range(50)))
+    Task.objects.bulk_create(
+        (Task(group=group, text=f'task {i}', priority='medium') for i in range(task_count)),
+        batch_size=1000,
+    )
+
+    client = Client(**auth_headers(user))
+    results = {}
+    for name, url in [
+        ('task_list', f'/api/tasks/?group={group.id}'),
+        ('group_list', '/api/groups/'),
+        ('group_detail', f'/api/groups/{group.id}/'),
+    ]:
+        etag = client.get(url)['ETag']
+        full = measure(lambda: client.get(url), iterations)
+        cached = measure(lambda: client.get(url, HTTP_IF_NONE_MATCH=etag), iterations)
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+        results[name] = {'200': full, '304': cached,
+                         'speedup': round(full['mean_ms'] / cached['mean_ms'], 1)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+    with test_database():
+        report('conditional_get', run(args.tasks, args.iterations))
+
+
+if __name__ == '__main__':
+    main()
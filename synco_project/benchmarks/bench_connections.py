@@ -0,0 +1,176 @@
+"""
+Connection churn and latency of GET /api/tasks/ under concurrent load, through
+the WSGI and the ASGI handler, with connections closed after every request
+(CONN_MAX_AGE=0) and kept open (CONN_MAX_AGE=600, the WSGI default).
+
+Under WSGI each client thread plays a worker thread. Under ASGI one event loop
+runs as many concurrent requests, as daphne does, and Django gives each request
+a fresh thread: it opens a connection per request whatever CONN_MAX_AGE says,
+which is why production runs daphne behind deploy/start-pgbouncer.sh and that
+connect is a local one to PgBouncer. Point DATABASES at a local PostgreSQL (or
+at PgBouncer) to measure real handshakes; on SQLite, --connect-ms stands in for
+the cost of opening a connection (TCP, TLS, auth, backend startup).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.harness import auth_headers, percentile, report, test_database
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import RequestFactory
+
+from tasks.models import Group, Task
+
+
+def wsgi_load(url, headers, threads, requests_per_thread, samples):
+    # the real WSGI handler: the test Client never closes connections between requests
+    handler = WSGIHandler()
+    factory = RequestFactory(**headers)
+    lock = threading.Lock()
+
+    def request():
+        statuses = []
+        body = handler(factory.get(url).environ, lambda status, headers, exc_info=None: statuses.append(status))
+        b''.join(body)
+        body.close()  # sends request_finished, which closes expired connections
+        assert statuses[0].startswith('200'), statuses
+
+    def worker():
+        local = []
+        for _ in range(requests_per_thread):
+            start = time.perf_counter()
+            request()
+            local.append((time.perf_counter() - start) * 1000)
+        connections.close_all()
+        with lock:
+            samples.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+
+def asgi_load(url, headers, threads, requests_per_thread, samples):
+    handler = ASGIHandler()
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode(),
+        'headers': [(b'host', b'testserver')] + [
+            (name[len('HTTP_'):].lower().replace('_', '-').encode(), value.encode())
+            for name, value in headers.items()
+        ],
+    }
+
+    async def request():
+        messages = []
+        body = [{'type': 'http.request'}]
+
+        async def receive():
+            if body:
+                return body.pop()
+            await asyncio.Future()  # the client stays connected
+
+        async def send(message):
+            messages.append(message)
+
+        await handler(dict(scope), receive, send)
+        assert messages[0]['status'] == 200, messages[0]
+
+    async def client():
+        for _ in range(requests_per_thread):
+            start = time.perf_counter()
+            await request()
+            samples.append((time.perf_counter() - start) * 1000)
+
+    async def serve():
+        await asyncio.gather(*(client() for _ in range(threads)))
+
+    asyncio.run(serve())
+
+
+def load(server, url, headers, threads, requests_per_thread):
+    opened = []
+    samples = []
+    lock = threading.Lock()
+
+    def count(sender, connection, **kwargs):
+        with lock:
+            opened.append(connection)
+
+    connection_created.connect(count)
+    try:
+        start = time.perf_counter()
+        server(url, headers, threads, requests_per_thread, samples)
+        elapsed = time.perf_counter() - start
+    finally:
+        connection_created.disconnect(count)
+    return {
+        'requests': len(samples),
+        'connections_opened': len(opened),
+        'connections_per_request': round(len(opened) / len(samples), 3),
+        'requests_per_second': round(len(samples) / elapsed, 1),
+        'mean_ms': round(statistics.mean(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+def run(threads, requests_per_thread, connect_ms):
+    user = User.objects.create_user(username='bench', password='bench')
+    group = Group.objects.create(name='Benchmark')
+    group.members.add(user)
+    Task.objects.bulk_create(Task(group=group, text=f'task {i}', priority='medium') for i in range(200))
+    headers = auth_headers(user)
+    url = f'/api/tasks/?group={group.id}'
+
+    def handshake(sender, **kwargs):
+        time.sleep(connect_ms / 1000)
+
+    if connect_ms:
+        connection_created.connect(handshake)
+    settings_dict = connections.settings['default']
+    results = {}
+    try:
+        for name, server in (('wsgi', wsgi_load), ('asgi', asgi_load)):
+            for max_age in (0, 600):
+                # read by every connection the worker threads open from now on
+                settings_dict['CONN_MAX_AGE'] = max_age
+                results[f'{name} CONN_MAX_AGE={max_age}'] = load(server, url, headers, threads,
+                                                                 requests_per_thread)
+    finally:
+        connection_created.disconnect(handshake)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=100, help='Requests per thread.')
+    parser.add_argument('--connect-ms', type=float, default=0,
+                        help='Simulated cost of opening a connection.')
+    args = parser.parse_args()
+    if connection.vendor == 'sqlite':
+        # an in-memory test database is never really closed, use a file so churn is real
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    with test_database():
+        report('connections', {
+            'vendor': connection.vendor,
+            'connect_ms': args.connect_ms,
+            'threads': args.threads,
+            **run(args.threads, args.requests, args.connect_ms),
+        })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Every endpoint in tasks/urls.py against synthetic data: throughput, latency
+percentiles, queries and response size per request, as JSON.
+
+Requests go through Django's test client, or over HTTP to a live server thread
+with --live. The data comes from the generate_synthetic_data command with a fixed
+seed, so two runs differ only by the code under test:
+
+    python -m benchmarks.bench_endpoints --output before.json
+    git checkout other-branch
+    python -m benchmarks.bench_endpoints --output after.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import http.client
+import json
+import statistics
+import subprocess
+import time
+from io import StringIO
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.harness import QueryCounter, auth_headers, live_server, percentile, report, test_database
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from tasks import urls as task_urls
+from tasks.models import Group, Task
+
+# endpoints that hash a password run this share of --iterations
+SLOW_ITERATIONS = 0.1
+SLOW_SCENARIOS = {'api_token_auth', 'register_user'}
+
+
+class TestClientTransport:
+    def __init__(self):
+        self.client = Client()
+
+    def request(self, method, path, data, headers):
+        kwargs = {'data': json.dumps(data), 'content_type': 'application/json'} if data is not None else {}
+        response = getattr(self.client, method.lower())(path, headers=headers, **kwargs)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response.status_code, len(body)
+
+
+class HTTPTransport:
+    def __init__(self, base_url):
+        self.netloc = urlsplit(base_url).netloc
+
+    def request(self, method, path, data, headers):
+        conn = http.client.HTTPConnection(self.netloc)
+        body = json.dumps(data) if data is not None else None
+        headers = dict(headers, **({'Content-Type': 'application/json'} if body is not None else {}))
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            return response.status, len(response.read())
+        finally:
+            conn.close()
+
+
+def make_context(options):
+    call_command(
+        'generate_synthetic_data', users=options.users, groups=options.groups,
+        members_per_group=options.members_per_group, tasks_per_group=options.tasks_per_group,
+        personal_tasks=options.personal_tasks, password='synthetic', seed=options.seed, stdout=StringIO(),
+    )
+    # the busiest user: member of the most groups
+    user_id = (Group.members.through.objects.values('user_id').annotate(groups=Count('id'))
+               .order_by('-groups', 'user_id')[0]['user_id'])
+    user = User.objects.get(pk=user_id)
+    group = user.synco_groups.order_by('id')[0]
+    admin = User.objects.create_user(username='bench-admin', password='synthetic', is_staff=True)
+    headers = {'Authorization': auth_headers(user)['HTTP_AUTHORIZATION']}
+    # too large to apply in the request: the bulk endpoint queues a job, whose status the scenario polls
+    operations = [{'op': 'create', 'data': {'text': f'import {n}', 'group': group.pk}}
+                  for n in range(settings.SYNCO_BULK_SYNC_OPERATIONS + 1)]
+    job = Client().post(reverse('task_bulk'), {'operations': operations}, content_type='application/json',
+                        headers=headers).json()
+    return {
+        'user': user,
+        'group': group,
+        'task': Task.objects.filter(group=group).order_by('id')[0],
+        'outsider': User.objects.exclude(synco_groups=group).exclude(pk=admin.pk).order_by('id')[0],
+        'headers': headers,
+        'admin_headers': {'Authorization': auth_headers(admin)['HTTP_AUTHORIZATION']},
+        'sync_token': Client().get(reverse('task_changes'), headers=headers).json()['token'],
+        'job': job['id'],
+        # the group's snapshot version before the writes: the scenario's client is up to date
+        'snapshot_version': Client().get(reverse('group_snapshot', args=[group.pk]),
+                                         headers=headers).json()['version'],
+    }
+
+
+def scenarios(ctx):
+    """
+    (name, url name, method, request(i) -> (path, data, headers)). Reads come
+    first, so the writes after them don't change what the reads see.
+    """
+    group, task, headers = ctx['group'], ctx['task'], ctx['headers']
+
+    def get(url, params=None, auth=headers):
+        return lambda i: (url + ('?' + urlencode(params) if params else ''), None, auth)
+
+    def send(url, data, auth=headers):
+        return lambda i: (url, data(i), auth)
+
+    tasks_url, groups_url = reverse('task_list'), reverse('group_list')
+    task_url, group_url = reverse('task_detail', args=[task.pk]), reverse('group_detail', args=[group.pk])
+    members_url = reverse('group_members', args=[group.pk])
+    snapshot_url = reverse('group_snapshot', args=[group.pk])
+    return [
+        ('task_list', 'task_list', 'GET', get(tasks_url)),
+        ('task_list:group', 'task_list', 'GET', get(tasks_url, {'group': group.pk})),
+        ('task_list:fields', 'task_list', 'GET', get(tasks_url, {'fields': 'id,text,completed,priority,group'})),
+        ('task_changes', 'task_changes', 'GET', get(reverse('task_changes'), {'since': ctx['sync_token']})),
+        ('task_export', 'task_export', 'GET', get(reverse('task_export'), {'format': 'ndjson', 'group': group.pk})),
+        ('task_search', 'task_search', 'GET', get(reverse('task_search'), {'q': 'report'})),
+        ('task_detail', 'task_detail', 'GET', get(task_url)),
+        ('group_list', 'group_list', 'GET', get(groups_url)),
+        ('group_list:summary', 'group_list', 'GET', get(groups_url, {'view': 'summary'})),
+        ('group_detail', 'group_detail', 'GET', get(group_url)),
+        ('group_members', 'group_members', 'GET', get(members_url)),
+        ('group_snapshot', 'group_snapshot', 'GET', get(snapshot_url)),
+        ('group_snapshot:unchanged', 'group_snapshot', 'GET', get(snapshot_url, {'version': ctx['snapshot_version']})),
+        ('job_detail', 'job_detail', 'GET', get(reverse('job_detail', args=[ctx['job']]))),
+        ('metrics', 'metrics', 'GET', get(reverse('metrics'), auth=ctx['admin_headers'])),
+        ('task_list:create', 'task_list', 'POST',
+         send(tasks_url, lambda i: {'text': f'bench task {i}', 'group': group.pk, 'priority': 'medium'})),
+        ('task_detail:update', 'task_detail', 'PUT', send(task_url, lambda i: {'completed': i % 2 == 0})),
+        ('task_bulk', 'task_bulk', 'POST', send(reverse('task_bulk'), lambda i: {'operations': [
+            {'op': 'create', 'data': {'text': f'bulk {i}.{n}', 'group': group.pk}} for n in range(10)
+        ] + [{'op': 'update', 'id': task.pk, 'data': {'priority': 'high' if i % 2 else 'low'}}]})),
+        ('group_members:add', 'group_members', 'POST',
+         send(members_url, lambda i: {'username': ctx['outsider'].username})),
+        ('api_token_auth', 'api_token_auth', 'POST',
+         send(reverse('api_token_auth'), lambda i: {'username': ctx['user'].username, 'password': 'synthetic'},
+              auth={})),
+        ('register_user', 'register_user', 'POST',
+         send(reverse('register_user'), lambda i: {'username': f'bench-new-{time.time_ns()}', 'password': 'pw'},
+              auth={})),
+    ]
+
+
+def check_coverage(planned):
+    names = {pattern.name for pattern in task_urls.urlpatterns}
+    missing = names - {url_name for _, url_name, _, _ in planned}
+    if missing:
+        raise SystemExit(f'No benchmark scenario for: {", ".join(sorted(missing))}')
+
+
+def run_scenario(transport, method, make_request, iterations, warmup):
+    for i in range(warmup):
+        transport.request(method, *make_request(-1 - i))
+    samples, sizes, statuses = [], [], set()
+    with QueryCounter() as queries:
+        start = time.perf_counter()
+        for i in range(iterations):
+            path, data, headers = make_request(i)
+            began = time.perf_counter()
+            status, size = transport.request(method, path, data, headers)
+            samples.append((time.perf_counter() - began) * 1000)
+            sizes.append(size)
+            statuses.add(status)
+        elapsed = time.perf_counter() - start
+    return {
+        'iterations': iterations,
+        'requests_per_second': round(iterations / elapsed, 1),
+        'mean_ms': round(statistics.mean(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p90_ms': round(percentile(samples, 90), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'queries': round(queries.count / iterations, 2),
+        'response_bytes': round(statistics.mean(sizes)),
+        'statuses': sorted(statuses),
+    }
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(options, transport):
+    ctx = make_context(options)
+    planned = scenarios(ctx)
+    check_coverage(planned)
+    results = {}
+    for name, _, method, make_request in planned:
+        if options.only and name not in options.only:
+            continue
+        iterations = options.iterations
+        if name in SLOW_SCENARIOS:
+            iterations = max(1, int(iterations * SLOW_ITERATIONS))
+        results[name] = run_scenario(transport, method, make_request, iterations, options.warmup)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--groups', type=int, default=40)
+    parser.add_argument('--members-per-group', type=int, default=15)
+    parser.add_argument('--tasks-per-group', type=int, default=250)
+    parser.add_argument('--personal-tasks', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--only', nargs='*', help='Run only these scenarios.')
+    parser.add_argument('--live', action='store_true', help='Send real HTTP requests to a live server thread.')
+    parser.add_argument('--output', help='Also write the JSON report to this file.')
+    options = parser.parse_args()
+
+    with test_database():
+        meta = {'commit': commit(), 'vendor': connection.vendor, 'transport': 'http' if options.live else 'client',
+                'data': {name: getattr(options, name) for name in
+                         ('users', 'groups', 'members_per_group', 'tasks_per_group', 'personal_tasks', 'seed')}}
+        if options.live:
+            with live_server() as base_url:
+                results = run(options, HTTPTransport(base_url))
+        else:
+            results = run(options, TestClientTransport())
+        report('endpoints', {'meta': meta, 'scenarios': results}, output=options.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+GET /api/tasks/ latency while a storm of POST /api/register/ requests hashes
+passwords, with hashing on the bounded pool (tasks.hashing) and on the request
+threads (SYNCO_HASHER_WORKERS=0), against a quiet baseline.
+
+Reader and registration threads each play a WSGI worker thread. Inline, every
+registration thread takes a core for the hash and the readers queue for CPU;
+on the pool at most SYNCO_HASHER_WORKERS hashes run and the rest wait (or get
+503 once the queue is full), so the readers' p99 should stay near the baseline.
+Throughput of the storm itself is reported too: the pool trades it for latency.
+"""
+import argparse
+import itertools
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from benchmarks.harness import auth_headers, percentile, report, test_database
+
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection, connections
+from django.test import RequestFactory, override_settings
+
+from tasks.models import Group, Task
+
+handler = WSGIHandler()
+
+
+def call(request):
+    statuses = []
+    body = handler(request.environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(body)
+    body.close()
+    return int(statuses[0].split()[0])
+
+
+def load(url, headers, readers, seconds, storm_threads):
+    samples = []
+    registrations = Counter()
+    lock = threading.Lock()
+    stop = threading.Event()
+    names = itertools.count()
+    factory = RequestFactory(**headers)
+
+    def read():
+        local = []
+        while not stop.is_set():
+            start = time.perf_counter()
+            status = call(factory.get(url))
+            local.append((time.perf_counter() - start) * 1000)
+            assert status == 200, status
+        connections.close_all()
+        with lock:
+            samples.extend(local)
+
+    def register():
+        while not stop.is_set():
+            data = {'username': f'storm{next(names)}', 'password': 'correct horse battery'}
+            status = call(RequestFactory().post('/api/register/', data))
+            with lock:
+                registrations[status] += 1
+        connections.close_all()
+
+    threads = ([threading.Thread(target=read) for _ in range(readers)]
+               + [threading.Thread(target=register) for _ in range(storm_threads)])
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {
+        'reads': len(samples),
+        'read_mean_ms': round(statistics.mean(samples), 3),
+        'read_p50_ms': round(percentile(samples, 50), 3),
+        'read_p99_ms': round(percentile(samples, 99), 3),
+        'registered_per_second': round(registrations[201] / seconds, 1),
+        'registrations_turned_away': registrations[503],
+    }
+
+
+def run(readers, storm_threads, seconds, workers):
+    user = User.objects.create_user(username='bench', password='bench')
+    group = Group.objects.create(name='Benchmark')
+    group.members.add(user)
+    Task.objects.bulk_create(Task(group=group, text=f'task {i}', priority='medium') for i in range(200))
+    headers = auth_headers(user)
+    url = f'/api/tasks/?group={group.id}'
+    cases = {
+        'baseline': (0, workers),
+        f'storm, pool of {workers}': (storm_threads, workers),
+        'storm, inline': (storm_threads, 0),
+    }
+    results = {}
+    for name, (storm, pool_workers) in cases.items():
+        with override_settings(SYNCO_HASHER_WORKERS=pool_workers):
+            results[name] = load(url, headers, readers, seconds, storm)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--readers', type=int, default=2)
+    parser.add_argument('--storm-threads', type=int, default=16, help='Concurrent registration clients.')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of each case.')
+    parser.add_argument('--workers', type=int, default=1, help='SYNCO_HASHER_WORKERS for the pooled case.')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    if connection.vendor == 'sqlite':
+        # threads share the database: use a file, an in-memory one is per connection
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    with test_database():
+        report('registration_storm', {
+            'vendor': connection.vendor,
+            'cpus': os.cpu_count(),
+            'readers': args.readers,
+            'storm_threads': args.storm_threads,
+            **run(args.readers, args.storm_threads, args.seconds, args.workers),
+        }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+GET /api/tasks/search/ against a naive text__icontains scan, over 1M synthetic
+tasks split between the user's personal list, their groups and foreign groups.
+On PostgreSQL the search uses the GIN index, on SQLite the FTS5 table.
+"""
+import argparse
+import random
+
+from benchmarks.harness import auth_headers, measure, report, test_database
+
+from django.contrib.auth.models import User
+from django.test import Client
+
+from tasks.models import Group, Task
+from tasks.serializers import task_values_serializer
+
+WORDS = ('alpha bravo charlie delta echo foxtrot golf hotel india juliett kilo lima mike '
+         'november oscar papa quebec romeo sierra tango uniform victor whiskey xray yankee zulu').split()
+
+
+def run(task_count, iterations):
+    rng = random.Random(42)
+    user = User.objects.create_user(username='bench', password='bench')
+    own = [Group.objects.create(name=f'own {i}') for i in range(5)]
+    for group in own:
+        group.members.add(user)
+    foreign = [Group.objects.create(name=f'foreign {i}') for i in range(20)]
+
+    def task(i):
+        text = ' '.join(rng.choices(WORDS, k=6)) + (' needle' if i % 1000 == 0 else '')
+        bucket = i % 10
+        if bucket == 0:
+            return Task(user=user, text=text, priority='medium')
+        if bucket < 3:
+            return Task(group=own[i % len(own)], text=text, priority='medium')
+        return Task(group=foreign[i % len(foreign)], text=text, priority='medium')
+
+    batch = 10000
+    for start in range(0, task_count, batch):
+        Task.objects.bulk_create([task(i) for i in range(start, min(start + batch, task_count))],
+                                 batch_size=batch)
+
+    client = Client(**auth_headers(user))
+    visible = Task.objects.filter(user=user, group__isnull=True) | Task.objects.filter(group__in=own)
+    serializer = task_values_serializer()
+    results = {}
+    # a rare word, two common ones (ranking has to score every match, the scan stops
+    # after 50), and a miss (the scan reads every visible row)
+    for term in ('needle', 'alpha bravo', 'haystack'):
+        url = f'/api/tasks/search/?q={term}'
+        first = term.split()[0]
+
+        def scan():
+            # what a substring filter without an index costs
+            return serializer.to_representation(visible.filter(text__icontains=first).values(*serializer.columns)[:50])
+
+        assert client.get(url).status_code == 200
+        search = measure(lambda: client.get(url), iterations)
+        baseline = measure(scan, iterations)
+        results[term] = {'search': search, 'icontains_scan': baseline,
+                         'speedup': round(baseline['mean_ms'] / search['mean_ms'], 1)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tasks', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    with test_database():
+        report('search', run(args.tasks, args.iterations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+TaskSerializer over model instances against the values() fast path used by the
+list endpoints, for 100, 10k and 100k tasks. Times fetch plus serialization and
+checks that both produce the same output.
+"""
+import argparse
+
+from benchmarks.harness import measure, report, test_database
+
+from django.contrib.auth.models import User
+
+from tasks.models import Group, Task
+from tasks.serializers import TaskSerializer, task_values_serializer
+
+
+def run(sizes, iterations):
+    user = User.objects.create_user(username='bench', password='bench')
+    group = Group.objects.create(name='Benchmark')
+    fast = task_values_serializer()
+    results = {}
+    created = 0
+    for size in sorted(sizes):
+        Task.objects.bulk_create(
+            (Task(group=group if i % 2 else None, user=None if i % 2 else user,
+                  text=f'task {i}', priority='medium') for i in range(created, size)),
+            batch_size=1000,
+        )
+        created = size
+        tasks = Task.objects.order_by('id')
+
+        def model_path():
+            # a fresh queryset: list(tasks) would be served from the result cache after the first call
+            return TaskSerializer(list(tasks.all()), many=True).data
+
+        def values_path():
+            return fast.to_representation(list(tasks.values(*fast.columns)))
+
+        assert [dict(row) for row in model_path()] == values_path()
+        rounds = max(1, iterations * 100 // size)
+        slow, quick = measure(model_path, rounds, warmup=1), measure(values_path, rounds, warmup=1)
+        results[size] = {'serializer': slow, 'values': quick,
+                         'speedup': round(slow['mean_ms'] / quick['mean_ms'], 1)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000])
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+    with test_database():
+        report('serializers', run(args.sizes, args.iterations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Queries and latency per request with the token lookup cached (warm) and with
+its cache entry dropped before every request (cold, what TokenAuthentication costs).
+"""
+import argparse
+
+from benchmarks.harness import auth_headers, measure, report, test_database
+
+from django.contrib.auth.models import User
+from rest_framework.authtoken.models import Token
+from django.test import Client
+
+from tasks.authentication import invalidate_tokens
+from tasks.models import Group, Task
+
+
+def run(iterations):
+    user = User.objects.create_user(username='bench', password='bench')
+    group = Group.objects.create(name='Benchmark')
+    group.members.add(user)
+    task = Task.objects.create(group=group, text='task', priority='medium')
+
+    client = Client(**auth_headers(user))
+    key = Token.objects.get(user=user).key
+    results = {}
+    for name, url in [
+        ('task_list', f'/api/tasks/?group={group.id}'),
+        ('task_detail', f'/api/tasks/{task.id}/'),
+        ('group_detail', f'/api/groups/{group.id}/'),
+    ]:
+        def cold():
+            invalidate_tokens([key])
+            client.get(url)
+
+        cold_stats = measure(cold, iterations)
+        warm_stats = measure(lambda: client.get(url), iterations)
+        results[name] = {'cold': cold_stats, 'warm': warm_stats,
+                         'queries_saved': round(cold_stats['queries'] - warm_stats['queries'], 2)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+    with test_database():
+        report('token_auth', run(args.iterations))
+
+
+if __name__ == '__main__':
+    main()
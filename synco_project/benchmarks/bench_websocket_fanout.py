@@ -0,0 +1,83 @@
+"""
+WebSocket fan-out: open N idle subscribers to one group, commit task changes and
+time how long it takes until every socket has received the event.
+Uses the configured channel layer (in-memory unless REDIS_URL is set).
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+
+from benchmarks.harness import percentile, report, test_database
+
+from channels.db import database_sync_to_async
+from channels.testing.websocket import WebsocketCommunicator
+from django.contrib.auth.models import User
+
+from tasks.consumers import TaskEventsConsumer
+from tasks.models import Group, Task
+
+
+def make_fixture(connections):
+    user = User.objects.create_user(username=f'bench{connections}', password='bench')
+    group = Group.objects.create(name=f'Fan-out {connections}')
+    group.members.add(user)
+    return user, group
+
+
+async def open_subscriber(app, user):
+    communicator = WebsocketCommunicator(app, '/ws/tasks/')
+    communicator.scope['user'] = user
+    connected, _ = await communicator.connect(timeout=30)
+    assert connected
+    await communicator.send_json_to({'action': 'subscribe'})
+    await communicator.receive_json_from(timeout=30)
+    return communicator
+
+
+async def run(connections, events):
+    user, group = await database_sync_to_async(make_fixture)(connections)
+    app = TaskEventsConsumer.as_asgi()
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    subscribers = []
+    # connect in waves, like clients coming online
+    for offset in range(0, connections, 500):
+        wave = min(500, connections - offset)
+        subscribers += await asyncio.gather(*(open_subscriber(app, user) for _ in range(wave)))
+    connect_seconds = time.perf_counter() - start
+    per_connection_kb = (tracemalloc.get_traced_memory()[0] - before) / connections / 1024
+    tracemalloc.stop()
+
+    fanout_ms = []
+    for i in range(events):
+        start = time.perf_counter()
+        await database_sync_to_async(Task.objects.create)(group=group, text=f'event {i}', priority='medium')
+        await asyncio.gather(*(subscriber.receive_json_from(timeout=30) for subscriber in subscribers))
+        fanout_ms.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(subscriber.disconnect() for subscriber in subscribers))
+    return {
+        'connections': connections,
+        'connect_seconds': round(connect_seconds, 3),
+        'memory_per_idle_connection_kb': round(per_connection_kb, 1),
+        'events': events,
+        'fanout_p50_ms': round(percentile(fanout_ms, 50), 3),
+        'fanout_p99_ms': round(percentile(fanout_ms, 99), 3),
+        'deliveries_per_second': round(connections * events / (sum(fanout_ms) / 1000)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connections', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--events', type=int, default=20)
+    args = parser.parse_args()
+    with test_database():
+        report('websocket_fanout', [asyncio.run(run(n, args.events)) for n in args.connections])
+
+
+if __name__ == '__main__':
+    main()
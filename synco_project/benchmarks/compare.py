@@ -0,0 +1,61 @@
+"""
+Diff two JSON reports of benchmarks.bench_endpoints, e.g. from two commits:
+
+    python -m benchmarks.compare before.json after.json --threshold 15
+
+Prints p50 / p99 latency and queries per scenario with the relative change, and
+exits with status 1 if any p50 got slower by more than --threshold percent or any
+scenario runs more queries than before.
+"""
+import argparse
+import json
+import sys
+
+COLUMNS = ('p50_ms', 'p99_ms', 'queries')
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def change(old, new):
+    if not old:
+        return ''
+    return f'{(new - old) / old * 100:+.0f}%'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Allowed p50 slowdown in percent before failing.')
+    args = parser.parse_args(argv)
+    before, after = load(args.before), load(args.after)
+    print(f"{before['meta'].get('commit')} -> {after['meta'].get('commit')}")
+
+    regressions = []
+    header = f"{'scenario':<22}" + ''.join(f'{column:>26}' for column in COLUMNS)
+    print(header)
+    for name, new in after['scenarios'].items():
+        old = before['scenarios'].get(name)
+        if old is None:
+            print(f'{name:<22} (new)')
+            continue
+        cells = ''.join(
+            f'{f"{old[column]} -> {new[column]} {change(old[column], new[column])}":>26}' for column in COLUMNS
+        )
+        print(f'{name:<22}{cells}')
+        if old['p50_ms'] and (new['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100 > args.threshold:
+            regressions.append(f'{name}: p50 {old["p50_ms"]} -> {new["p50_ms"]} ms')
+        if new['queries'] > old['queries']:
+            regressions.append(f'{name}: {old["queries"]} -> {new["queries"]} queries')
+
+    for line in regressions:
+        print(f'REGRESSION {line}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
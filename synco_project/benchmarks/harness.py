@@ -0,0 +1,148 @@
+"""
+Shared helpers for the scripts in this package.
+
+Each benchmark runs against a throwaway test database created from the configured
+DATABASES entry, so it never touches real data. Run them from synco_project/:
+
+    python -m benchmarks.bench_conditional_get
+"""
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from unittest import mock
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'synco_project.settings')
+django.setup()
+
+from django.db import connection, connections, reset_queries  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.throttling import SimpleRateThrottle  # noqa: E402
+
+
+@contextmanager
+def test_database():
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    # record queries even with DEBUG off, measure() reports them
+    connection.force_debug_cursor = True
+    # a benchmark is one very busy token and client IP; measure the endpoints, not the rate limits
+    no_limits = mock.patch.object(SimpleRateThrottle, 'THROTTLE_RATES', defaultdict(lambda: None))
+    try:
+        with no_limits:
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def auth_headers(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    return {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def measure(fn, iterations=50, warmup=5):
+    """
+    Call fn() repeatedly and return latency stats in milliseconds plus queries per call.
+    """
+    for _ in range(warmup):
+        fn()
+    samples = []
+    queries = 0
+    for _ in range(iterations):
+        reset_queries()
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+        queries += len(connection.queries)
+    return {
+        'iterations': iterations,
+        'mean_ms': round(statistics.mean(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+        'queries': round(queries / iterations, 2),
+    }
+
+
+class QueryCounter:
+    """
+    Counts the queries run on every connection, from any thread (a live server's
+    too), without needing DEBUG.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        for conn in connections.all(initialized_only=True):
+            self._install(connection=conn)
+        connection_created.connect(self._install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self._install)
+        for conn in connections.all(initialized_only=True):
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+
+
+@contextmanager
+def live_server():
+    """
+    Serve the test database over real HTTP from a background thread, like
+    LiveServerTestCase does. Yields the base URL.
+    """
+    from django.test.testcases import LiveServerThread, _StaticFilesHandler
+
+    # an in-memory SQLite database only exists on this connection, share it
+    overrides = {}
+    for conn in connections.all():
+        if conn.vendor == 'sqlite' and conn.is_in_memory_db():
+            overrides[conn.alias] = conn
+            conn.inc_thread_sharing()
+    server = LiveServerThread('localhost', _StaticFilesHandler, connections_override=overrides, port=0)
+    server.daemon = True
+    server.start()
+    server.is_ready.wait()
+    if server.error:
+        raise server.error
+    try:
+        yield f'http://localhost:{server.port}'
+    finally:
+        server.terminate()
+        for conn in overrides.values():
+            conn.dec_thread_sharing()
+
+
+def report(name, results, output=None):
+    # output: also write the JSON to this path, e.g. to diff it with benchmarks.compare
+    document = {'benchmark': name, 'results': results}
+    json.dump(document, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    if output:
+        with open(output, 'w') as f:
+            json.dump(document, f, indent=2)
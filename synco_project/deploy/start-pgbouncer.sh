@@ -0,0 +1,76 @@
+#!/bin/sh
+# Run a command behind a PgBouncer on the same machine:
+#
+#     deploy/start-pgbouncer.sh daphne ... synco_project.asgi:application
+#
+# Under ASGI every request's sync code runs on a fresh thread, so Django can't keep
+# connections between requests (CONN_MAX_AGE is 0 in that mode, see settings.py) and
+# each request connects anew. Those connections go to this PgBouncer on 127.0.0.1,
+# which costs a local socket instead of a TCP/TLS/auth handshake with PostgreSQL and
+# a new backend process; PgBouncer keeps a small pool of real server connections.
+#
+# Pool mode is transaction: a server connection is only held for one transaction, so
+# the command is started with DB_DISABLE_SERVER_SIDE_CURSORS=True (named cursors don't
+# survive across transactions).
+#
+# Pool sizes come from the same per-mode environment as the DB_* settings, with
+# SYNCO_SERVER_MODE (asgi or wsgi) picking DB_POOL_SIZE_ASGI / DB_POOL_SIZE_WSGI
+# over DB_POOL_SIZE:
+#   DB_POOL_SIZE          server connections to PostgreSQL (asgi 20, wsgi 4)
+#   DB_POOL_MAX_CLIENTS   client connections from Django (asgi 200, wsgi 50)
+#   DB_POOL_PORT          local port (6432)
+# Without a pgbouncer binary on PATH the command connects to PostgreSQL directly.
+set -eu
+
+if ! command -v pgbouncer >/dev/null 2>&1; then
+    echo "start-pgbouncer: pgbouncer not found, connecting to PostgreSQL directly" >&2
+    exec "$@"
+fi
+
+mode=$(printf '%s' "${SYNCO_SERVER_MODE:-wsgi}" | tr '[:lower:]' '[:upper:]')
+
+# $1 for this mode, e.g. DB_POOL_SIZE_ASGI, else $1, else the default for the mode
+setting() {
+    eval "value=\${$1_$mode:-\${$1:-}}"
+    if [ -z "$value" ]; then
+        if [ "$mode" = ASGI ]; then value=$2; else value=$3; fi
+    fi
+    printf '%s' "$value"
+}
+
+pool_size=$(setting DB_POOL_SIZE 20 4)
+max_clients=$(setting DB_POOL_MAX_CLIENTS 200 50)
+port=$(setting DB_POOL_PORT 6432 6432)
+
+dir=$(mktemp -d)
+# readable by this user only: both files hold the password
+umask 077
+
+cat > "$dir/pgbouncer.ini" <<EOF
+[databases]
+${DB_NAME} = host=${DB_HOST} port=${DB_PORT:-5432} dbname=${DB_NAME} user=${DB_USER} password=${DB_PASSWORD}
+
+[pgbouncer]
+listen_addr = 127.0.0.1
+listen_port = ${port}
+unix_socket_dir =
+auth_type = plain
+auth_file = ${dir}/userlist.txt
+pool_mode = transaction
+default_pool_size = ${pool_size}
+max_client_conn = ${max_clients}
+server_tls_sslmode = prefer
+; psycopg2 sends it on connect, PgBouncer would refuse the connection otherwise
+ignore_startup_parameters = extra_float_digits
+EOF
+printf '"%s" "%s"\n' "$DB_USER" "$DB_PASSWORD" > "$dir/userlist.txt"
+
+pgbouncer "$dir/pgbouncer.ini" &
+bouncer=$!
+trap 'kill "$bouncer" 2>/dev/null; rm -rf "$dir"' EXIT
+trap 'exit 143' TERM INT
+
+# the command talks to PgBouncer, PgBouncer to DB_HOST:DB_PORT
+status=0
+DB_HOST=127.0.0.1 DB_PORT=$port DB_DISABLE_SERVER_SIDE_CURSORS=True "$@" || status=$?
+exit $status
@@ -2,6 +2,7 @@
 ASGI config for synco_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django, WebSockets (/ws/tasks/) to the task event consumer.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -12,5 +13,17 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'synco_project.settings')
+# selects the ASGI database connection settings
+os.environ.setdefault('SYNCO_SERVER_MODE', 'asgi')
 
-application = get_asgi_application()
+# set up Django before anything imports models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+
+from tasks.routing import TokenAuthMiddleware, websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': TokenAuthMiddleware(URLRouter(websocket_urlpatterns)),
+})
@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     # NEW: Place CorsMiddleware at the top for proper handling.
     'corsheaders.middleware.CorsMiddleware',
+    # per-endpoint timings for GET /api/metrics/, and ?profile=1 for staff
+    'tasks.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +84,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'synco_project.wsgi.application'
+ASGI_APPLICATION = 'synco_project.asgi.application'
 
 
 # Database
@@ -100,6 +103,30 @@ DATABASES = {
     }
 }
 
+# Connection reuse. asgi.py / wsgi.py set SYNCO_SERVER_MODE, and every DB_* knob below
+# can be given per mode (DB_CONN_MAX_AGE_ASGI, DB_CONNECT_TIMEOUT_WSGI, ...) or for both.
+#  - WSGI (gunicorn): a worker thread serves one request at a time, so it keeps its
+#    connection open for DB_CONN_MAX_AGE seconds: one connection per worker thread.
+#  - ASGI (daphne): Django runs every request's sync code in a fresh thread, so
+#    persistent connections would pile up one per thread. Connections close after
+#    each request (CONN_MAX_AGE 0) and are pooled by a local PgBouncer instead:
+#    deploy/start-pgbouncer.sh (see the Procfile) starts one in transaction pooling
+#    mode, with DB_DISABLE_SERVER_SIDE_CURSORS=True and pool sizes per mode.
+SYNCO_SERVER_MODE = os.environ.get('SYNCO_SERVER_MODE', 'wsgi')
+
+
+def _db_env(name, default):
+    return os.environ.get(f'{name}_{SYNCO_SERVER_MODE.upper()}', os.environ.get(name, default))
+
+
+DATABASES['default'].update({
+    'CONN_MAX_AGE': int(_db_env('DB_CONN_MAX_AGE', 600 if SYNCO_SERVER_MODE == 'wsgi' else 0)),
+    # ping a reused connection before the request uses it, so a dropped one is replaced
+    'CONN_HEALTH_CHECKS': _db_env('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+    'DISABLE_SERVER_SIDE_CURSORS': _db_env('DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True',
+    'OPTIONS': {'connect_timeout': int(_db_env('DB_CONNECT_TIMEOUT', 5))},
+})
+
 # Optional: Keep SQLite for local development
 if DEBUG:
     DATABASES = {
@@ -110,6 +137,126 @@ if DEBUG:
     }
 
 
+# Cache
+# Local memory by default; set REDIS_URL to share the cache between processes
+# (needs the redis package).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # least recently used entries are culled past this
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # request counters of tasks.throttling, written on every API call; kept apart
+    # so they never push token and membership entries out of 'default'
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        },
+        # shared, so the limits hold across worker processes
+        'throttle': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'KEY_PREFIX': 'throttle',
+        },
+    }
+
+# Channel layer for the task WebSocket (tasks.consumers).
+# The in-memory layer only reaches sockets in the same process; with REDIS_URL set,
+# events are shared by every worker (needs channels_redis).
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'tasks.layers.ProcessChannelLayer',
+    }
+}
+if os.environ.get('REDIS_URL'):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.environ.get('REDIS_URL')]},
+        }
+    }
+
+# Serve GET /api/tasks/ and GET /api/groups/ with the async views (tasks.async_views).
+# Worth it under ASGI (daphne); under WSGI every async view pays for its own event loop.
+SYNCO_ASYNC_READ_VIEWS = os.environ.get('SYNCO_ASYNC_READ_VIEWS', 'False') == 'True'
+
+# Let concurrent identical GET /api/tasks/ and GET /api/groups/ reads in one process
+# share a single query and payload (tasks.coalesce).
+SYNCO_COALESCE_LIST_READS = os.environ.get('SYNCO_COALESCE_LIST_READS', 'True') == 'True'
+
+# Seconds a user's cached group ids live; signals invalidate them on change anyway.
+SYNCO_MEMBERSHIP_CACHE_TIMEOUT = int(os.environ.get('SYNCO_MEMBERSHIP_CACHE_TIMEOUT', 600))
+
+# Seconds a cached API token lookup lives (tasks.authentication); deleting the token
+# or saving its user invalidates it sooner. Also bounds QuerySet.update() staleness.
+SYNCO_TOKEN_CACHE_TIMEOUT = int(os.environ.get('SYNCO_TOKEN_CACHE_TIMEOUT', 300))
+
+# Request metrics (tasks.profiling). Every request is timed; this share of them
+# also gets DB query and serializer timings, which cost a few microseconds per query.
+SYNCO_PROFILING_ENABLED = os.environ.get('SYNCO_PROFILING_ENABLED', 'True') == 'True'
+SYNCO_PROFILING_SAMPLE_RATE = float(os.environ.get('SYNCO_PROFILING_SAMPLE_RATE', 0.1))
+
+# Delta sync (GET /api/tasks/changes/)
+# overlap replayed on every delta, covers transactions that commit out of order
+SYNCO_SYNC_OVERLAP_SECONDS = 2
+# above this many changes the client is told to reload the full list instead
+SYNCO_SYNC_MAX_CHANGES = 500
+# tombstones older than this are removed by `manage.py purge_tombstones`
+SYNCO_TOMBSTONE_RETENTION_DAYS = 30
+
+# Largest batch accepted by POST /api/tasks/bulk/
+SYNCO_BULK_MAX_OPERATIONS = 10000
+# larger batches are applied by a background job instead of in the request
+SYNCO_BULK_SYNC_OPERATIONS = 1000
+
+# POSTs sent with an Idempotency-Key header (tasks.idempotency): retries with the same
+# key within this many seconds get the stored response instead of running again
+SYNCO_IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('SYNCO_IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+
+# POST / DELETE /api/groups/<pk>/members/ with {"usernames": [...]}: largest batch,
+# and removals above this many users are handed to a background job
+SYNCO_MEMBERS_MAX_BATCH = 5000
+SYNCO_MEMBERS_SYNC_REMOVALS = 500
+
+# Background jobs (tasks.jobs), run by `manage.py run_jobs`.
+# Seconds a worker may go without reporting progress before another one takes the job over
+SYNCO_JOB_LEASE_SECONDS = int(os.environ.get('SYNCO_JOB_LEASE_SECONDS', 300))
+# runs of a job whose worker died before it is marked failed
+SYNCO_JOB_MAX_ATTEMPTS = 3
+# finished jobs are deleted by the workers after this many days
+SYNCO_JOB_RETENTION_DAYS = 7
+# run jobs in the web process after the request commits, for development without a worker
+SYNCO_JOBS_EAGER = os.environ.get('SYNCO_JOBS_EAGER', 'False') == 'True'
+
+# Password hashing (tasks.hashing). Hashes run on a pool of this many threads, at most
+# that many cores at a time; 0 hashes on the request thread instead
+SYNCO_HASHER_WORKERS = int(os.environ.get('SYNCO_HASHER_WORKERS', 2))
+# hashes allowed to wait for the pool; past that registration and login answer 503
+SYNCO_HASHER_QUEUE = int(os.environ.get('SYNCO_HASHER_QUEUE', 32))
+# algorithm for new passwords: pbkdf2_sha256, scrypt, argon2 (needs argon2-cffi) or
+# bcrypt_sha256 (needs bcrypt). Existing hashes of the others still verify, and are
+# upgraded at the next login
+SYNCO_PASSWORD_HASHER = os.environ.get('SYNCO_PASSWORD_HASHER', 'pbkdf2_sha256')
+
+
+_PASSWORD_HASHERS = {
+    'pbkdf2_sha256': 'tasks.hashing.PBKDF2PasswordHasher',
+    'scrypt': 'tasks.hashing.ScryptPasswordHasher',
+    'argon2': 'tasks.hashing.Argon2PasswordHasher',
+    'bcrypt_sha256': 'tasks.hashing.BCryptSHA256PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[SYNCO_PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items() if name != SYNCO_PASSWORD_HASHER
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -157,7 +304,8 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        # TokenAuthentication with the token lookups cached
+        'tasks.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -165,5 +313,21 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
-    ]
+    ],
+    # per API token (tasks.throttling); a popup sends a few requests per user action
+    'DEFAULT_THROTTLE_CLASSES': [
+        'tasks.throttling.TokenBurstRateThrottle',
+        'tasks.throttling.TokenSustainedRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'token_burst': os.environ.get('SYNCO_THROTTLE_BURST', '120/min'),
+        'token_sustained': os.environ.get('SYNCO_THROTTLE_SUSTAINED', '3000/hour'),
+        # per client IP, on registration and obtain_auth_token
+        'register': os.environ.get('SYNCO_THROTTLE_REGISTER', '10/min'),
+        'login': os.environ.get('SYNCO_THROTTLE_LOGIN', '30/min'),
+    },
+    # proxies in front of the app that append to X-Forwarded-For: 0 when clients connect
+    # directly (the header is ignored, REMOTE_ADDR is the client), 1 behind the platform's
+    # proxy (its entry is the client). A client can put anything in the header itself.
+    'NUM_PROXIES': int(os.environ.get('SYNCO_NUM_PROXIES', 0)),
 }
\ No newline at end of file
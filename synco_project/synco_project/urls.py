@@ -16,11 +16,10 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework.authtoken.views import obtain_auth_token
 from tasks import views
 
 urlpatterns = [
     path('admin/', admin.site.urls), 
     path('api/', include('tasks.urls')),
-    path('api/api-token-auth/', obtain_auth_token, name='api_token_auth'),
+    path('api/api-token-auth/', views.obtain_auth_token, name='api_token_auth'),
 ]
\ No newline at end of file
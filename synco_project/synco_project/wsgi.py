@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'synco_project.settings')
+# selects the WSGI database connection settings
+os.environ.setdefault('SYNCO_SERVER_MODE', 'wsgi')
 
 application = get_wsgi_application()
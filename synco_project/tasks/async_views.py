@@ -0,0 +1,165 @@
+"""
+Async versions of the read-heavy endpoints, for deployments served over ASGI.
+
+GET runs natively with the async ORM, so a request waiting on the database does
+not hold a worker thread. It is throttled and coalesced like the sync views.
+Other methods fall through to the sync DRF views.
+urls.py picks these when settings.SYNCO_ASYNC_READ_VIEWS is on.
+"""
+import operator
+from functools import reduce
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework.exceptions import NotFound, Throttled, ValidationError
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import views
+from .authentication import acached_token
+from .filters import filter_tasks
+from .coalesce import list_reads
+from .conditional import add_etag, agroup_versions, atask_state, make_etag, not_modified
+from .membership import auser_group_ids
+from .models import Group, Task
+from .pagination import TaskCursorPagination
+from .serializers import GroupSerializer, task_values_serializer
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+async def _authenticate(request):
+    # the async twin of TokenAuthentication: "Authorization: Token <key>".
+    # Sets request.auth to the token, as DRF does
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != 'token':
+        return None
+    token = await acached_token(auth[1])
+    if token is None or not token.user.is_active:
+        return None
+    request.auth = token
+    return token.user
+
+
+async def _throttled(request):
+    # DRF's throttle check for the async views: a 429 response, or None to go ahead
+    waits = []
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not await sync_to_async(throttle.allow_request)(request, None):
+            waits.append(throttle.wait())
+    if not waits:
+        return None
+    exc = Throttled(max((wait for wait in waits if wait is not None), default=None))
+    response = _json({'detail': str(exc.detail)}, status=exc.status_code)
+    if exc.wait is not None:
+        response['Retry-After'] = str(exc.wait)
+    return response
+
+
+def _unauthorized():
+    response = _json({'detail': 'Authentication credentials were not provided.'}, status=401)
+    response['WWW-Authenticate'] = 'Token'
+    return response
+
+
+async def task_list(request):
+    if request.method != 'GET':
+        return await sync_to_async(views.task_list)(request)
+
+    request.user = await _authenticate(request)
+    if request.user is None:
+        return _unauthorized()
+    response = await _throttled(request)
+    if response is not None:
+        return response
+
+    group_id = request.GET.get('group')
+    personal_tasks = Task.objects.filter(user=request.user, group__isnull=True)
+    if request.GET.get('group__isnull') == 'True':
+        tasks = [personal_tasks]
+        scope = ('user', request.user.pk)
+    elif group_id:
+        if not group_id.isdigit() or int(group_id) not in await auser_group_ids(request.user):
+            return _json({"error": "Group not found or you are not a member."}, status=404)
+        tasks = [Task.objects.filter(group_id=group_id)]
+        scope = ('group', int(group_id))
+    else:
+        tasks = [personal_tasks]
+        group_ids = await auser_group_ids(request.user)
+        if group_ids:
+            tasks.append(Task.objects.filter(group_id__in=sorted(group_ids)))
+        scope = ('user', request.user.pk, group_ids)
+
+    try:
+        fields = views._requested_task_fields(request.GET)
+    except ValueError as e:
+        return _json({'error': f'Unknown fields: {e}'}, status=400)
+    ordering = TaskCursorPagination.get_ordering(request)
+    if ordering is None:
+        return _json({'error': f"Unknown ordering: {request.GET.get('ordering')}"}, status=400)
+    try:
+        tasks = filter_tasks(request.GET, tasks)
+    except ValidationError as e:
+        return _json(e.detail, status=400)
+
+    state = await atask_state(reduce(operator.or_, tasks))
+    etag = make_etag(request, *state)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    async def read_page():
+        serializer = task_values_serializer(views._fields_key(fields))
+        branches = [views._sortable(branch, ordering).values(*views._task_columns(serializer, ordering))
+                    for branch in tasks]
+        paginator = TaskCursorPagination()
+        page = await paginator.apaginate_queryset(branches, request, ordering=ordering)
+        return paginator.get_paginated_data(serializer.to_representation(page))
+
+    try:
+        data = await list_reads.ado(('tasks', scope, request.build_absolute_uri(), state), read_page)
+    except NotFound as e:
+        return _json({'detail': str(e.detail)}, status=404)
+    return add_etag(_json(data), etag)
+
+
+async def group_list(request):
+    if request.method != 'GET':
+        return await sync_to_async(views.group_list)(request)
+
+    request.user = await _authenticate(request)
+    if request.user is None:
+        return _unauthorized()
+    response = await _throttled(request)
+    if response is not None:
+        return response
+
+    view = request.GET.get('view', 'full')
+    if view not in views.GROUP_LIST_VIEWS:
+        return _json({'error': f'Unknown view: {view}'}, status=400)
+    group_ids = await auser_group_ids(request.user)
+    versions = await agroup_versions(group_ids)
+    state = await atask_state(Task.objects.filter(group_id__in=group_ids)) if view == 'summary' else ()
+    etag = make_etag(request, versions, *state)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    async def read_groups():
+        if view == 'summary':
+            rows = [row async for row in views._group_summaries(group_ids)]
+            return views._group_summary_serializer.to_representation(rows)
+        groups = Group.objects.filter(id__in=group_ids).prefetch_related(views._members_prefetch())
+        return GroupSerializer([group async for group in groups], many=True).data
+
+    data = await list_reads.ado(('groups', view, versions, state), read_groups)
+    return add_etag(_json(data), etag)
+
+
+# token-authenticated like the DRF views. Django 4.2's csrf_exempt decorator
+# wraps views in a sync function, so set its flag directly
+task_list.csrf_exempt = True
+group_list.csrf_exempt = True
@@ -0,0 +1,67 @@
+"""
+TokenAuthentication without the authtoken_token query on every request.
+
+Token -> (token, user) lookups are kept in the Django cache with a TTL; the cache
+backend bounds them (locmem culls at MAX_ENTRIES, Redis evicts under maxmemory).
+The handlers in tasks.signals drop an entry when its token is deleted or rotated
+(DRF rotates by deleting and re-creating) and when its user is saved, e.g. deactivated.
+Changes made with QuerySet.update() are only picked up when the entry expires.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def token_digest(key):
+    # the key is a credential, keep it out of cache key spaces
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _cache_key(key):
+    return 'synco:token:' + token_digest(key)
+
+
+def cached_token(key):
+    """
+    Return the Token (with its user loaded) for key, or None. Served from the cache,
+    only a miss reads the database; unknown keys are never cached.
+    """
+    token = cache.get(_cache_key(key))
+    if token is None:
+        token = Token.objects.select_related('user').filter(key=key).first()
+        if token is not None:
+            cache.set(_cache_key(key), token, settings.SYNCO_TOKEN_CACHE_TIMEOUT)
+    return token
+
+
+async def acached_token(key):
+    # cached_token for async code
+    token = await cache.aget(_cache_key(key))
+    if token is None:
+        token = await Token.objects.select_related('user').filter(key=key).afirst()
+        if token is not None:
+            await cache.aset(_cache_key(key), token, settings.SYNCO_TOKEN_CACHE_TIMEOUT)
+    return token
+
+
+def invalidate_tokens(keys):
+    keys = [_cache_key(key) for key in keys]
+    if keys:
+        cache.delete_many(keys)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # same header, errors and (user, token) result as TokenAuthentication
+
+    def authenticate_credentials(self, key):
+        token = cached_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
@@ -0,0 +1,175 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import status
+
+from .events import publish_task_changes
+from .models import Task, TaskTombstone
+from .serializers import BulkOperationSerializer, BulkTaskSerializer
+from .stats import STATE_ATTR, StatsChanges, task_state
+
+BATCH_SIZE = 1000
+
+
+def delete_tasks(tasks):
+    """
+    Delete the given Task instances with one DELETE per batch.
+    The post_delete signal does not fire, so the tombstones and the GroupStats
+    counters are handled here; call it inside a transaction.
+    """
+    changes = StatsChanges()
+    for task in tasks:
+        changes.add(getattr(task, STATE_ATTR, None) or task_state(task))
+    versions = changes.apply()
+    TaskTombstone.objects.bulk_create(
+        [TaskTombstone(task_id=task.pk, user_id=task.user_id, group_id=task.group_id,
+                       group_version=versions.get(task.group_id)) for task in tasks],
+        batch_size=BATCH_SIZE,
+    )
+    ids = [task.pk for task in tasks]
+    for start in range(0, len(ids), BATCH_SIZE):
+        # _raw_delete skips the collector: Task has no dependent rows to cascade to
+        Task.objects.filter(pk__in=ids[start:start + BATCH_SIZE])._raw_delete(Task.objects.db)
+
+
+def apply_task_operations(user, group_ids, operations):
+    """
+    Validate and apply a list of {op, id, data} task operations of user, a member
+    of group_ids, in one transaction. Returns one {status, ...} result per operation,
+    in order. Invalid or forbidden operations are reported and skipped, the others are applied.
+
+    Operations may carry a client_id (a UUID chosen by the client) instead of, or
+    besides, the id: a create records it on the task, and a create whose client_id
+    already exists answers 200 with that task instead of creating it again, so a
+    client can replay writes it is unsure about. Updates and deletes can name their
+    task by client_id, but not one created earlier in the same batch.
+    """
+    results = [None] * len(operations)
+
+    parsed = []
+    for index, raw in enumerate(operations):
+        op_serializer = BulkOperationSerializer(data=raw)
+        if op_serializer.is_valid():
+            parsed.append((index, op_serializer.validated_data))
+        else:
+            results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': op_serializer.errors}
+
+    # one query for every task the batch touches, one more if it names tasks by client_id
+    tasks = Task.objects.in_bulk([op['id'] for _, op in parsed if op['op'] != 'create' and 'id' in op])
+    client_ids = [op['client_id'] for _, op in parsed if 'client_id' in op]
+    tasks_by_client_id = {}
+    if client_ids:
+        tasks_by_client_id = {task.client_id: task for task in Task.objects.filter(client_id__in=client_ids)}
+
+    def can_write(task):
+        return task.user_id == user.pk or (task.group_id is not None and task.group_id in group_ids)
+
+    def target(op):
+        return tasks.get(op['id']) if 'id' in op else tasks_by_client_id.get(op['client_id'])
+
+    to_create, to_update, to_delete = [], [], {}
+    created_client_ids = set()
+    updated_fields = set()
+    for index, op in parsed:
+        if op['op'] == 'create':
+            existing = tasks_by_client_id.get(op.get('client_id'))
+            if existing is not None:
+                # a replay of a create that was applied already
+                if can_write(existing):
+                    results[index] = {'status': status.HTTP_200_OK, 'data': BulkTaskSerializer(existing).data}
+                else:
+                    results[index] = {'status': status.HTTP_409_CONFLICT,
+                                      'errors': {'client_id': ['This client_id belongs to another task.']}}
+                continue
+            if op.get('client_id') in created_client_ids:
+                results[index] = {'status': status.HTTP_400_BAD_REQUEST,
+                                  'errors': {'client_id': ['Duplicate client_id in this batch.']}}
+                continue
+            serializer = BulkTaskSerializer(data=op['data'])
+        else:
+            task = target(op)
+            if task is None or not can_write(task):
+                # don't tell apart missing tasks and other people's tasks
+                results[index] = ({'status': status.HTTP_404_NOT_FOUND, 'id': op['id']} if 'id' in op
+                                  else {'status': status.HTTP_404_NOT_FOUND, 'client_id': str(op['client_id'])})
+                continue
+            if op['op'] == 'delete':
+                to_delete[task.pk] = task
+                results[index] = {'status': status.HTTP_204_NO_CONTENT, 'id': task.pk}
+                continue
+            serializer = BulkTaskSerializer(task, data=op['data'], partial=True)
+
+        if not serializer.is_valid():
+            results[index] = {'status': status.HTTP_400_BAD_REQUEST, 'errors': serializer.errors}
+            continue
+        attrs = serializer.validated_data
+        group_id = attrs.get('group_id')
+        if group_id is not None and group_id not in group_ids:
+            results[index] = {'status': status.HTTP_403_FORBIDDEN,
+                              'errors': {'group': ['You are not a member of this group.']}}
+            continue
+
+        if op['op'] == 'create':
+            task = Task(**attrs, client_id=op.get('client_id'))
+            # same rule as task_list: group tasks have no owner
+            task.user_id = None if group_id else user.pk
+            to_create.append((index, task))
+            if task.client_id is not None:
+                created_client_ids.add(task.client_id)
+        else:
+            for name, value in attrs.items():
+                setattr(task, name, value)
+            updated_fields.update(attrs)
+            to_update.append((index, task))
+
+    with transaction.atomic():
+        # the counters move in the same transaction as the rows
+        changes = StatsChanges()
+        moved = []
+        for _, task in to_create:
+            changes.add(new=task_state(task))
+        for _, task in to_update:
+            old = getattr(task, STATE_ATTR, None)
+            changes.add(old, task_state(task))
+            if old is not None and old[0] != task.group_id:
+                moved.append((task, old[0]))
+            setattr(task, STATE_ATTR, task_state(task))
+        versions = changes.apply()
+        for _, task in to_create + to_update:
+            task.group_version = versions.get(task.group_id)
+        if moved:
+            # the scope each task left sees a delete, as in task_pre_save
+            TaskTombstone.objects.bulk_create(
+                [TaskTombstone(task_id=task.pk, user_id=task.user_id, group_id=group_id,
+                               group_version=versions.get(group_id))
+                 for task, group_id in moved if group_id is not None or task.user_id is not None],
+                batch_size=BATCH_SIZE,
+            )
+        if to_create:
+            Task.objects.bulk_create([task for _, task in to_create], batch_size=BATCH_SIZE)
+        if to_update:
+            # bulk_update skips auto_now
+            now = timezone.now()
+            # several operations on one task share its instance: write it, and bump its version, once
+            updated = list({task.pk: task for _, task in to_update}.values())
+            task_versions = {}
+            for task in updated:
+                task.updated_at = now
+                # bumped in the database like Task.save(); an undercount is safe, see there
+                task_versions[task.pk] = task.version + 1
+                task.version = F('version') + 1
+            Task.objects.bulk_update(updated, sorted(updated_fields | {'updated_at', 'group_version', 'version'}),
+                                     batch_size=BATCH_SIZE)
+            for task in updated:
+                task.version = task_versions[task.pk]
+        if to_delete:
+            delete_tasks(list(to_delete.values()))
+        # the bulk paths bypass the model signals
+        publish_task_changes(saved=[task for _, task in to_create + to_update],
+                             deleted=to_delete.values(), moved=moved)
+
+    for index, task in to_create:
+        results[index] = {'status': status.HTTP_201_CREATED, 'data': BulkTaskSerializer(task).data}
+    for index, task in to_update:
+        results[index] = {'status': status.HTTP_200_OK, 'data': BulkTaskSerializer(task).data}
+    return results
@@ -0,0 +1,95 @@
+"""
+Single-flight coalescing of identical list reads within one process.
+
+When several requests ask for the same page at the same moment (popups of one
+group reloading after a change), the first runs the query and serializes it;
+the others wait and reuse its payload. Nothing is kept once the call returns.
+
+Callers put the collection state (the ETag aggregate, read by each request on
+its own) into the key, so a request never joins a read that started before a
+change it could already see, e.g. right after its own write.
+The shared payload is handed to every waiter: treat it as read-only.
+"""
+import asyncio
+import threading
+
+from django.conf import settings
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.futures = {}
+        # requests served by another request's call, for tests and benchmarks
+        self.shared = 0
+
+    def do(self, key, func):
+        """
+        Return func(), or the result of the identical call already running under key
+        in another thread. Exceptions are shared the same way.
+        """
+        if not settings.SYNCO_COALESCE_LIST_READS:
+            return func()
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    async def ado(self, key, func):
+        """
+        do() for async code: func is a coroutine function, shared with the
+        identical calls on the same event loop.
+        """
+        if not settings.SYNCO_COALESCE_LIST_READS:
+            return await func()
+        key = (id(asyncio.get_running_loop()), key)
+        future = self.futures.get(key)
+        if future is not None:
+            self.shared += 1
+            # shield: a cancelled waiter must not cancel the leader's call
+            return await asyncio.shield(future)
+        future = self.futures[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await func()
+        except Exception as e:
+            future.set_exception(e)
+            # retrieved here so an unawaited failure is not logged
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.futures[key]
+            if not future.done():
+                # the leader was cancelled, let the waiters fail instead of hanging
+                future.cancel()
+
+
+list_reads = SingleFlight()
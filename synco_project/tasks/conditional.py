@@ -0,0 +1,79 @@
+import hashlib
+import re
+
+from django.db.models import Count, F, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers, quote_etag
+
+from .models import Group
+
+
+def make_etag(request, *parts):
+    # per user and per query string, so pages, projections and scopes never collide
+    raw = '|'.join(str(part) for part in (request.user.pk, request.get_full_path(), *parts))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def task_state(tasks):
+    # the state of a task collection for its ETag: row count and newest updated_at.
+    # one aggregate query, nothing serialized; a delete always changes the count,
+    # any create or update moves max(updated_at)
+    state = tasks.aggregate(count=Count('id'), last=Max('updated_at'))
+    return state['count'], state['last']
+
+
+async def atask_state(tasks):
+    state = await tasks.aaggregate(count=Count('id'), last=Max('updated_at'))
+    return state['count'], state['last']
+
+
+def group_versions(group_ids):
+    # sorted (id, version) pairs: the state of a group collection
+    return tuple(sorted(Group.objects.filter(id__in=group_ids).values_list('id', 'version')))
+
+
+async def agroup_versions(group_ids):
+    return tuple(sorted([row async for row in Group.objects.filter(id__in=group_ids).values_list('id', 'version')]))
+
+
+def group_etag(request, group):
+    return make_etag(request, group.pk, group.version)
+
+
+def task_etag(task):
+    # Task.version, which the conditional UPDATE of Task.save(if_version=...) checks
+    return quote_etag(str(task.version))
+
+
+def if_match_version(request):
+    """
+    The task version named by the If-Match header: None without one or for *.
+    ValueError for anything but a single strong ETag given by task_etag().
+    """
+    header = request.headers.get('If-Match')
+    if header is None or header.strip() == '*':
+        return None
+    match = re.fullmatch(r'\s*"(\d+)"\s*', header)
+    if match is None:
+        raise ValueError('If-Match must be a single task ETag, e.g. "3".')
+    return int(match.group(1))
+
+
+def not_modified(request, etag):
+    # a 304 response when the client's If-None-Match matches, otherwise None
+    response = get_conditional_response(request, etag=quote_etag(etag))
+    if response is not None:
+        add_etag(response, etag)
+    return response
+
+
+def add_etag(response, etag):
+    response['ETag'] = quote_etag(etag)
+    # responses are per user: let the browser keep them but always revalidate
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def bump_group_versions(group_ids):
+    if group_ids:
+        Group.objects.filter(id__in=list(group_ids)).update(version=F('version') + 1)
@@ -0,0 +1,68 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .events import group_channel, user_channel
+from .membership import user_group_ids
+
+
+class TaskEventsConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes task changes to the client as they are committed.
+
+    The client is subscribed to its personal tasks on connect and picks groups with
+    {"action": "subscribe", "groups": [1, 2]} (omit "groups" for all of its groups)
+    and {"action": "unsubscribe", "groups": [...]}. Changes arrive as
+    {"type": "tasks", "saved": [...], "deleted": [ids]}.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.subscribed = set()
+        await self.channel_layer.group_add(user_channel(self.user.pk), self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if not hasattr(self, 'subscribed'):
+            return
+        await self.channel_layer.group_discard(user_channel(self.user.pk), self.channel_name)
+        for group_id in self.subscribed:
+            await self.channel_layer.group_discard(group_channel(group_id), self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        action = content.get('action')
+        requested = content.get('groups')
+        if requested is not None and not isinstance(requested, list):
+            await self.send_json({'type': 'error', 'error': 'groups must be a list of ids.'})
+            return
+
+        if action == 'subscribe':
+            allowed = await database_sync_to_async(user_group_ids)(self.user)
+            wanted = set(allowed) if requested is None else {g for g in requested if g in allowed}
+            for group_id in wanted - self.subscribed:
+                await self.channel_layer.group_add(group_channel(group_id), self.channel_name)
+            self.subscribed |= wanted
+        elif action == 'unsubscribe':
+            dropped = set(self.subscribed) if requested is None else self.subscribed & set(requested)
+            await self._drop(dropped)
+        else:
+            await self.send_json({'type': 'error', 'error': 'Unknown action.'})
+            return
+        await self.send_json({'type': 'subscribed', 'groups': sorted(self.subscribed)})
+
+    async def _drop(self, group_ids):
+        for group_id in group_ids:
+            await self.channel_layer.group_discard(group_channel(group_id), self.channel_name)
+        self.subscribed -= set(group_ids)
+
+    # channel layer handlers, see tasks.events
+
+    async def task_changes(self, event):
+        # already JSON, see tasks.events.publish_task_changes
+        await self.send(text_data=event['text'])
+
+    async def membership_revoked(self, event):
+        await self._drop(self.subscribed & set(event['groups']))
+        await self.send_json({'type': 'subscribed', 'groups': sorted(self.subscribed)})
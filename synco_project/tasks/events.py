@@ -0,0 +1,92 @@
+import json
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+
+def group_channel(group_id):
+    return f'synco.group.{group_id}'
+
+
+def user_channel(user_id):
+    # personal tasks and per-user notices
+    return f'synco.user.{user_id}'
+
+
+def task_channel(task):
+    if task.group_id is not None:
+        return group_channel(task.group_id)
+    if task.user_id is not None:
+        return user_channel(task.user_id)
+    return None
+
+
+def previous_channel(task, old_group_id):
+    # the channel of a task before it moved out of old_group_id (None: it was personal)
+    if old_group_id is not None:
+        return group_channel(old_group_id)
+    if task.user_id is not None:
+        return user_channel(task.user_id)
+    return None
+
+
+def compact_task(task):
+    return {
+        'id': task.pk,
+        'text': task.text,
+        'completed': task.completed,
+        'priority': task.priority,
+        'group': task.group_id,
+        'version': task.version,
+        'updated_at': task.updated_at.isoformat() if task.updated_at else None,
+    }
+
+
+def _send_after_commit(messages):
+    layer = get_channel_layer()
+    if layer is None or not messages:
+        return
+
+    def send():
+        for channel, message in messages:
+            async_to_sync(layer.group_send)(channel, message)
+
+    # subscribers must never see a change that is rolled back
+    transaction.on_commit(send)
+
+
+def publish_task_changes(saved=(), deleted=(), moved=()):
+    """
+    Push the saved and deleted Task instances to the WebSocket subscribers of their
+    group (or owner, for personal tasks). One message per channel, however many tasks.
+    moved: (task, old group id) pairs of saved tasks that changed group; the old
+    channel's subscribers can no longer see them and get a delete.
+    """
+    batches = defaultdict(lambda: {'saved': [], 'deleted': []})
+    for task in saved:
+        channel = task_channel(task)
+        if channel:
+            batches[channel]['saved'].append(compact_task(task))
+    for task in deleted:
+        channel = task_channel(task)
+        if channel:
+            batches[channel]['deleted'].append(task.pk)
+    for task, old_group_id in moved:
+        channel = previous_channel(task, old_group_id)
+        if channel and channel != task_channel(task):
+            batches[channel]['deleted'].append(task.pk)
+    # encoded once here, not once per subscribed socket
+    _send_after_commit([
+        (channel, {'type': 'task.changes', 'text': json.dumps({'type': 'tasks', **batch})})
+        for channel, batch in batches.items()
+    ])
+
+
+def publish_membership_revoked(user_ids, group_ids):
+    # open sockets of removed members stop listening to those groups
+    group_ids = sorted(group_ids)
+    _send_after_commit([
+        (user_channel(user_id), {'type': 'membership.revoked', 'groups': group_ids}) for user_id in user_ids
+    ])
@@ -0,0 +1,77 @@
+import json
+
+from asgiref.sync import sync_to_async
+from rest_framework.renderers import BaseRenderer
+
+from .serializers import TaskSerializer, datetime_representation
+
+CHUNK_SIZE = 2000
+
+
+class NDJSONRenderer(BaseRenderer):
+    # lets ?format=ndjson (or Accept: application/x-ndjson) through content negotiation;
+    # the export view streams the body itself, this only renders error payloads
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode() + b'\n'
+
+
+def task_rows(queryset, fields=None):
+    """
+    Yield tasks as dicts shaped like TaskSerializer output, straight from values()
+    rows read through a server-side cursor: no model instances, no serializer.
+    """
+    fields = list(fields or TaskSerializer.Meta.fields)
+    rows = queryset.values(*fields).iterator(chunk_size=CHUNK_SIZE)
+    if 'created_at' not in fields:
+        yield from rows
+        return
+    for row in rows:
+        row['created_at'] = datetime_representation(row['created_at'])
+        yield row
+
+
+def _chunks(rows, encode):
+    # join rows into bigger writes instead of one tiny chunk per task
+    buffer = []
+    for row in rows:
+        buffer.append(encode(row))
+        if len(buffer) >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_ndjson(rows):
+    return _chunks(rows, lambda row: json.dumps(row) + '\n')
+
+
+def stream_json(rows):
+    yield '['
+    first = True
+    for chunk in _chunks(rows, lambda row: ',' + json.dumps(row)):
+        if first:
+            chunk = chunk[1:]
+            first = False
+        yield chunk
+    yield ']'
+
+
+async def async_chunks(chunks):
+    """
+    The chunks as an async iterator, for StreamingHttpResponse under ASGI, which
+    would otherwise read a sync iterator into one list before sending anything.
+    Each chunk is produced on the request's sync thread, where the cursor and its
+    connection live.
+    """
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
@@ -0,0 +1,31 @@
+from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
+
+from .models import Task
+
+
+class TaskFilter(filters.FilterSet):
+    """
+    ?completed=true|false, ?priority= (repeatable: ?priority=high&priority=medium)
+    and ?created_at_after= / ?created_at_before= (ISO 8601, inclusive).
+    Groups are not filtered here: ?group= / ?group__isnull=True pick the
+    membership-checked scope in the views.
+    """
+    completed = filters.BooleanFilter()
+    priority = filters.MultipleChoiceFilter(choices=Task.PRIORITY_CHOICES)
+    created_at = filters.IsoDateTimeFromToRangeFilter()
+
+    class Meta:
+        model = Task
+        fields = ['completed', 'priority', 'created_at']
+
+
+def filter_tasks(params, branches):
+    """
+    Apply TaskFilter to every branch of a task list.
+    Raises ValidationError with the per-parameter errors when params are invalid.
+    """
+    filterset = TaskFilter(params, queryset=Task.objects.none())
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return [filterset.filter_queryset(branch) for branch in branches]
@@ -0,0 +1,110 @@
+"""
+Password hashing on a small, bounded thread pool.
+
+A PBKDF2 hash of Django's default strength costs a few hundred milliseconds of
+CPU. Run on the request threads, a burst of sign-ups or logins takes every core
+and starves the task endpoints. The hashers below hand each hash to a pool of
+SYNCO_HASHER_WORKERS threads (hashlib and the hasher libraries release the GIL),
+so at most that many cores hash at once, and at most SYNCO_HASHER_QUEUE hashes wait.
+Past that, HashingBusy turns the request away with 503 and Retry-After
+instead of queueing it.
+
+Every hash goes through here: registration, obtain_auth_token, the admin login,
+and the dummy hash ModelBackend computes for unknown usernames.
+SYNCO_PASSWORD_HASHER in the settings picks the algorithm for new passwords.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+_local = threading.local()
+_lock = threading.Lock()
+_pool = None
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins at the moment, try again shortly.'
+    default_code = 'hashing_busy'
+    # seconds, sent as Retry-After by DRF's exception handler
+    wait = 1
+
+
+def _mark_worker():
+    _local.worker = True
+
+
+class HashingPool:
+    def __init__(self, workers, queue):
+        self.workers = workers
+        self.queue = queue
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='synco-hash', initializer=_mark_worker)
+        # hashes running or waiting; a full pool refuses instead of growing a backlog
+        self.slots = threading.BoundedSemaphore(workers + queue)
+
+    def run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        # the request thread only waits, it burns no CPU meanwhile
+        return future.result()
+
+
+def get_pool():
+    """
+    The process-wide HashingPool, or None when SYNCO_HASHER_WORKERS is 0
+    (hash on the calling thread). Rebuilt if the settings change.
+    """
+    global _pool
+    workers, queue = settings.SYNCO_HASHER_WORKERS, settings.SYNCO_HASHER_QUEUE
+    if workers <= 0:
+        return None
+    with _lock:
+        if _pool is None or (_pool.workers, _pool.queue) != (workers, queue):
+            if _pool is not None:
+                _pool.executor.shutdown(wait=False)
+            _pool = HashingPool(workers, queue)
+        return _pool
+
+
+def run_hash(func, *args):
+    # run func on the pool, or right here when already on it or when it is disabled
+    pool = get_pool()
+    if pool is None or getattr(_local, 'worker', False):
+        return func(*args)
+    return pool.run(func, *args)
+
+
+class PooledHasherMixin:
+    # encode() is also what verify() uses, so both run on the pool
+    def encode(self, *args, **kwargs):
+        return run_hash(lambda: super(PooledHasherMixin, self).encode(*args, **kwargs))
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class ScryptPasswordHasher(PooledHasherMixin, hashers.ScryptPasswordHasher):
+    pass
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    # needs argon2-cffi
+    def verify(self, password, encoded):
+        # argon2 checks without calling encode()
+        return run_hash(super().verify, password, encoded)
+
+
+class BCryptSHA256PasswordHasher(PooledHasherMixin, hashers.BCryptSHA256PasswordHasher):
+    # needs bcrypt
+    pass
@@ -0,0 +1,108 @@
+"""
+Idempotency-Key for POST requests.
+
+A client whose POST timed out can't tell whether it was applied, and a blind
+retry creates the task twice. Sent with an Idempotency-Key header (any string of
+up to 255 characters, e.g. a fresh UUID per logical request), the first request
+runs and its response is stored under the key in the same transaction as its
+writes. A retry with the same key gets that response back, marked
+Idempotent-Replayed: true, and writes nothing. Keys are per user and kept for
+SYNCO_IDEMPOTENCY_TTL_SECONDS.
+
+Only successful responses are stored: an error wrote nothing, so the request can
+be retried, corrected or not, under the same key. A key reused for a different
+request (method, path or body) is answered with 422.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.get_full_path().encode(), request.body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _cutoff():
+    return timezone.now() - timedelta(seconds=settings.SYNCO_IDEMPOTENCY_TTL_SECONDS)
+
+
+def _stored(user, key):
+    # the live record of this key, an expired one is dropped
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is not None and record.created_at < _cutoff():
+        record.delete()
+        return None
+    return record
+
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response({'error': f'This {HEADER} was already used for a different request.'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    headers = {'Idempotent-Replayed': 'true'}
+    if record.location:
+        headers['Location'] = record.location
+    return Response(record.response, status=record.status_code, headers=headers)
+
+
+def idempotent(view):
+    """
+    Honour the Idempotency-Key header on POST. Goes under @api_view and the
+    other DRF decorators, so the user is authenticated and the request throttled.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or key is None:
+            return view(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters long.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        fingerprint = _fingerprint(request)
+        record = _stored(request.user, key)
+        if record is not None:
+            return _replay(record, fingerprint)
+
+        with transaction.atomic():
+            response = view(request, *args, **kwargs)
+            if not status.is_success(response.status_code):
+                return response
+            try:
+                with transaction.atomic():
+                    # commits with the view's writes, or not at all
+                    IdempotencyKey.objects.create(
+                        user=request.user, key=key, fingerprint=fingerprint, status_code=response.status_code,
+                        response=response.data, location=response.get('Location', ''),
+                    )
+                return response
+            except IntegrityError:
+                # a concurrent request with this key committed first (PostgreSQL makes the
+                # INSERT wait for it): undo ours and answer with its response
+                transaction.set_rollback(True)
+
+        record = _stored(request.user, key)
+        if record is None:
+            return Response({'error': f'A concurrent request with this {HEADER} failed, retry.'},
+                            status=status.HTTP_409_CONFLICT)
+        return _replay(record, fingerprint)
+
+    return wrapper
+
+
+def purge_idempotency_keys():
+    return IdempotencyKey.objects.filter(created_at__lt=_cutoff()).delete()[0]
@@ -0,0 +1,188 @@
+"""
+Background jobs: a queue in the database (Job rows), worked off by `manage.py run_jobs`.
+
+The API enqueues work that is too slow for a request (deleting a group, large
+bulk imports, removing many members), answers 202 with the job, and clients poll
+GET /api/jobs/<pk>/. Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+so any number of them can share the queue. A job whose worker dies is claimed
+again once its lease runs out, so handlers must be safe to run twice.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .bulk import apply_task_operations
+from .membership import remove_members as remove_group_members, user_group_ids
+from .models import Group, Job, Task
+
+logger = logging.getLogger(__name__)
+
+# rows per DELETE; each chunk commits on its own so no lock is held for long
+CHUNK_SIZE = 1000
+
+# kind -> (handler, atomic)
+HANDLERS = {}
+
+
+def job_handler(kind, atomic=False):
+    """
+    Register the handler of a job kind: handler(job) returns the job's result.
+    atomic: run it in the transaction that records the result, so it is applied
+    exactly once; otherwise the handler commits as it goes and must be resumable.
+    """
+    def register(func):
+        HANDLERS[kind] = (func, atomic)
+        return func
+    return register
+
+
+def enqueue(kind, payload, user=None, total=None):
+    if kind not in HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    job = Job.objects.create(kind=kind, payload=payload, created_by=user, total=total)
+    if settings.SYNCO_JOBS_EAGER:
+        # no worker, e.g. in development: run it in this process once the request commits
+        transaction.on_commit(lambda: run_next_job(Job.objects.filter(pk=job.pk)))
+    return job
+
+
+def _lease():
+    return timezone.now() + timedelta(seconds=settings.SYNCO_JOB_LEASE_SECONDS)
+
+
+def claim_job(jobs=None):
+    """
+    Mark the oldest runnable job of jobs (default: all) as running and return it,
+    or None when there is nothing to do. Jobs left running by a lost worker are
+    runnable again after their lease, until they run out of attempts.
+    """
+    jobs = Job.objects.all() if jobs is None else jobs
+    while True:
+        now = timezone.now()
+        with transaction.atomic():
+            job = (jobs.filter(Q(status=Job.QUEUED) | Q(status=Job.RUNNING, locked_until__lt=now))
+                   .select_for_update(skip_locked=True).order_by('id').first())
+            if job is None:
+                return None
+            if job.attempts >= settings.SYNCO_JOB_MAX_ATTEMPTS:
+                _finish(job, Job.FAILED, error='The worker running this job stopped too many times.')
+                continue
+            job.status = Job.RUNNING
+            job.attempts += 1
+            job.started_at = job.started_at or now
+            job.locked_until = _lease()
+            job.save(update_fields=['status', 'attempts', 'started_at', 'locked_until'])
+            return job
+
+
+def run_job(job):
+    handler, atomic = HANDLERS.get(job.kind, (None, False))
+    try:
+        if handler is None:
+            raise LookupError(f'No handler for {job.kind} jobs.')
+        if atomic:
+            with transaction.atomic():
+                _finish(job, Job.SUCCEEDED, result=handler(job))
+        else:
+            _finish(job, Job.SUCCEEDED, result=handler(job))
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', job.pk, job.kind)
+        _finish(job, Job.FAILED, error=f'{type(e).__name__}: {e}')
+    return job
+
+
+def run_next_job(jobs=None):
+    # claim_job() then run_job(); the job that ran, or None
+    job = claim_job(jobs)
+    return run_job(job) if job is not None else None
+
+
+def _finish(job, status, result=None, error=''):
+    job.status = status
+    job.result = result
+    job.error = error
+    job.finished_at = timezone.now()
+    job.locked_until = None
+    job.save(update_fields=['status', 'result', 'error', 'progress', 'total', 'finished_at', 'locked_until'])
+
+
+def report_progress(job, progress, total=None):
+    # also renews the lease: a job that reports progress is not taken over
+    job.progress = progress
+    if total is not None:
+        job.total = total
+    job.locked_until = _lease()
+    job.save(update_fields=['progress', 'total', 'locked_until'])
+
+
+def purge_finished_jobs(days=None):
+    days = settings.SYNCO_JOB_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(finished_at__lt=cutoff).delete()[0]
+
+
+def _chunks(items):
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+@job_handler('delete_group')
+def delete_groups(job):
+    """
+    Delete groups and their tasks: payload {'group_ids': [...]}.
+    The view removed the members first, so nobody sees the groups any more and
+    their tasks are out of every sync scope; no tombstones are left. Tasks go in
+    chunks of raw DELETE ... WHERE group_id IN (...), without the cascade
+    collector loading them, then the emptied groups are deleted normally.
+    """
+    group_ids = job.payload['group_ids']
+    tasks = Task.objects.filter(group_id__in=group_ids)
+    if job.total is None:
+        report_progress(job, 0, total=tasks.count())
+    deleted = job.progress
+    while True:
+        with transaction.atomic():
+            ids = list(tasks.values_list('id', flat=True)[:CHUNK_SIZE])
+            if not ids:
+                break
+            tasks.filter(id__in=ids)._raw_delete(tasks.db)
+        deleted += len(ids)
+        report_progress(job, deleted)
+    # only GroupStats and any members added since are left to cascade to
+    Group.objects.filter(id__in=group_ids).delete()
+    return {'deleted_tasks': deleted}
+
+
+@job_handler('import_tasks', atomic=True)
+def import_tasks(job):
+    """
+    POST /api/tasks/bulk/ batches over SYNCO_BULK_SYNC_OPERATIONS: payload {'operations': [...]}.
+    Applied as one transaction, as the request would have been.
+    """
+    user = job.created_by
+    if user is None:
+        raise LookupError('The user who queued this import no longer exists.')
+    operations = job.payload['operations']
+    results = apply_task_operations(user, user_group_ids(user), operations)
+    job.progress = len(operations)
+    return {'results': results}
+
+
+@job_handler('remove_members')
+def remove_members(job):
+    """
+    Remove users from a group: payload {'group_id': ..., 'user_ids': [...], 'skipped': [...]},
+    skipped being the requested usernames that were not members.
+    One DELETE on the members table per chunk; the caches, the group version
+    and the open sockets are updated per chunk rather than per user.
+    """
+    removed = 0
+    for index, user_ids in enumerate(_chunks(job.payload['user_ids'])):
+        with transaction.atomic():
+            removed += remove_group_members(job.payload['group_id'], user_ids)
+        report_progress(job, min((index + 1) * CHUNK_SIZE, len(job.payload['user_ids'])))
+    return {'removed': removed, 'skipped': job.payload.get('skipped', [])}
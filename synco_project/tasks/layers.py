@@ -0,0 +1,25 @@
+import time
+
+from channels.layers import InMemoryChannelLayer
+
+
+class ProcessChannelLayer(InMemoryChannelLayer):
+    """
+    In-process channel layer for a single ASGI worker (and the tests).
+
+    InMemoryChannelLayer sweeps every channel and group for expired messages on
+    each receive(), so one event fanned out to N sockets costs O(N^2). Sweeping
+    at most once per interval keeps fan-out linear with thousands of idle sockets.
+    """
+
+    def __init__(self, sweep_interval=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+
+    def _clean_expired(self):
+        now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        super()._clean_expired()
@@ -0,0 +1,79 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from tasks.models import Group, Task
+from tasks.stats import recompute_group_stats
+
+WORDS = ('buy call check clean email finish fix plan prepare read review schedule send update write '
+         'budget client deadline draft invoice meeting milk notes presentation report slides ticket '
+         'today tomorrow weekly urgent team project design release backlog').split()
+
+
+class Command(BaseCommand):
+    help = 'Insert reproducible synthetic users, groups, memberships and tasks with bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--members-per-group', type=int, default=10)
+        parser.add_argument('--tasks-per-group', type=int, default=100)
+        parser.add_argument('--personal-tasks', type=int, default=10, help='Personal tasks per user.')
+        parser.add_argument('--password', default='synthetic',
+                            help='Password of every generated user (hashed once).')
+        parser.add_argument('--prefix', default='synthetic', help='Prefix of the generated names.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--tokens', action='store_true', help='Create an API token for every user.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        prefix = options['prefix']
+        batch_size = options['batch_size']
+        start = time.perf_counter()
+
+        def text():
+            return ' '.join(rng.choices(WORDS, k=rng.randint(2, 7)))
+
+        def task(**kwargs):
+            return Task(text=text(), completed=rng.random() < 0.3,
+                        priority=rng.choices(['low', 'medium', 'high'], weights=[3, 5, 2])[0], **kwargs)
+
+        with transaction.atomic():
+            password = make_password(options['password'])
+            users = User.objects.bulk_create(
+                [User(username=f'{prefix}-user-{i}', password=password) for i in range(options['users'])],
+                batch_size=batch_size,
+            )
+            # bulk_create skips Group's post_save, recompute_group_stats() adds the stats rows
+            groups = Group.objects.bulk_create(
+                [Group(name=f'{prefix} group {i}') for i in range(options['groups'])],
+                batch_size=batch_size,
+            )
+
+            members = min(options['members_per_group'], len(users))
+            memberships = [
+                Group.members.through(group_id=group.pk, user_id=user.pk)
+                for group in groups for user in rng.sample(users, members)
+            ]
+            Group.members.through.objects.bulk_create(memberships, batch_size=batch_size)
+
+            tasks = [task(group=group) for group in groups for _ in range(options['tasks_per_group'])]
+            tasks += [task(user=user) for user in users for _ in range(options['personal_tasks'])]
+            rng.shuffle(tasks)
+            Task.objects.bulk_create(tasks, batch_size=batch_size)
+            recompute_group_stats([group.pk for group in groups])
+
+            if options['tokens']:
+                Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users],
+                                          batch_size=batch_size)
+
+        self.stdout.write(
+            f'Created {len(users)} users, {len(groups)} groups, {len(memberships)} memberships and '
+            f'{len(tasks)} tasks in {time.perf_counter() - start:.1f}s.'
+        )
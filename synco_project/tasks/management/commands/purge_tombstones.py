@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from tasks.models import GroupStats, TaskTombstone
+
+
+class Command(BaseCommand):
+    help = 'Delete task tombstones older than the sync retention window.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SYNCO_TOMBSTONE_RETENTION_DAYS,
+                            help='Keep tombstones younger than this many days.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows deleted per statement.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        stale = TaskTombstone.objects.filter(deleted_at__lt=cutoff)
+        # snapshot patches from before these tombstones would miss their deletes:
+        # record the versions first, so those clients get a full snapshot instead
+        purged = stale.filter(group_version__isnull=False).order_by().values('group_id').annotate(
+            version=Max('group_version'))
+        for row in purged:
+            GroupStats.objects.filter(group_id=row['group_id']).update(
+                purged_version=Greatest('purged_version', row['version']))
+        total = 0
+        # delete in batches so a large backlog doesn't hold one long lock
+        while True:
+            ids = list(stale.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += TaskTombstone.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write(f'Deleted {total} tombstones older than {cutoff:%Y-%m-%d %H:%M}.')
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from tasks.stats import recompute_group_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-group task counters (GroupStats) from the tasks table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('groups', nargs='*', type=int,
+                            help='Ids of the groups to rebuild; all groups when omitted.')
+
+    def handle(self, *args, **options):
+        total = recompute_group_stats(options['groups'] or None)
+        self.stdout.write(f'Recomputed stats of {total} groups.')
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from tasks.idempotency import purge_idempotency_keys
+from tasks.jobs import purge_finished_jobs, run_next_job
+
+# seconds between purges of old finished jobs and expired idempotency keys
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (tasks.jobs). Start as many workers as needed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Exit as soon as the queue is empty instead of waiting for more jobs.')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to wait between polls of an empty queue.')
+
+    def handle(self, *args, **options):
+        last_purge = 0
+        while True:
+            # a long-lived worker: honour CONN_MAX_AGE and drop broken connections between jobs
+            close_old_connections()
+            job = run_next_job()
+            if job is not None:
+                self.stdout.write(f'{job} in {job.attempts} attempt(s).')
+                continue
+            if time.monotonic() - last_purge > PURGE_INTERVAL:
+                purge_finished_jobs()
+                purge_idempotency_keys()
+                last_purge = time.monotonic()
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,105 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .conditional import bump_group_versions
+from .events import publish_membership_revoked
+from .models import Group
+
+# per-request memo, stored on the request object so it dies with the request
+_MEMO_ATTR = '_synco_group_ids'
+
+
+def _cache_key(user_id):
+    return f'synco:user-groups:{user_id}'
+
+
+def user_group_ids(user):
+    """
+    Return the frozenset of group ids the user belongs to.
+    Served from the cache; only a miss touches the members table.
+    Kept correct by the signal handlers in tasks.signals.
+    """
+    key = _cache_key(user.pk)
+    group_ids = cache.get(key)
+    if group_ids is None:
+        group_ids = frozenset(
+            Group.members.through.objects.filter(user_id=user.pk).values_list('group_id', flat=True)
+        )
+        cache.set(key, group_ids, settings.SYNCO_MEMBERSHIP_CACHE_TIMEOUT)
+    return group_ids
+
+
+async def auser_group_ids(user):
+    # user_group_ids for async code
+    key = _cache_key(user.pk)
+    group_ids = await cache.aget(key)
+    if group_ids is None:
+        rows = Group.members.through.objects.filter(user_id=user.pk).values_list('group_id', flat=True)
+        group_ids = frozenset([group_id async for group_id in rows])
+        await cache.aset(key, group_ids, settings.SYNCO_MEMBERSHIP_CACHE_TIMEOUT)
+    return group_ids
+
+
+def request_group_ids(request):
+    # user_group_ids memoized on the request, so one request reads the cache once
+    group_ids = getattr(request, _MEMO_ATTR, None)
+    if group_ids is None:
+        group_ids = user_group_ids(request.user)
+        setattr(request, _MEMO_ATTR, group_ids)
+    return group_ids
+
+
+def is_member(request, group):
+    """
+    Return True if request.user belongs to group (a Group or a group id).
+    """
+    if group is None or not request.user.is_authenticated:
+        return False
+    group_id = group.pk if isinstance(group, Group) else int(group)
+    return group_id in request_group_ids(request)
+
+
+def invalidate_user_groups(user_ids):
+    """
+    Drop the cached group ids of the given users.
+    Done right away and again on commit, so a read racing the transaction
+    cannot leave the pre-commit membership in the cache.
+    """
+    keys = [_cache_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def add_members(group_id, user_ids):
+    """
+    Add users to a group with one INSERT; existing members are skipped.
+    Bypasses m2m_changed, so the caches and the group version are updated here,
+    once for the whole batch.
+    """
+    if not user_ids:
+        return
+    Membership = Group.members.through
+    with transaction.atomic(savepoint=False):
+        Membership.objects.bulk_create([Membership(group_id=group_id, user_id=user_id) for user_id in user_ids],
+                                       ignore_conflicts=True)
+        invalidate_user_groups(user_ids)
+        bump_group_versions([group_id])
+
+
+def remove_members(group_id, user_ids):
+    """
+    Remove users from a group with one DELETE and return how many were members.
+    Like add_members, but also tells the removed users' open sockets.
+    """
+    if not user_ids:
+        return 0
+    memberships = Group.members.through.objects.filter(group_id=group_id, user_id__in=user_ids)
+    with transaction.atomic(savepoint=False):
+        removed = memberships._raw_delete(memberships.db)
+        invalidate_user_groups(user_ids)
+        bump_group_versions([group_id])
+        publish_membership_revoked(user_ids, [group_id])
+    return removed
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.24 on 2026-10-18 15:40
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('tasks', 'Group')
+    GroupStats = apps.get_model('tasks', 'GroupStats')
+    Task = apps.get_model('tasks', 'Task')
+    counts = {
+        row['group_id']: row
+        for row in Task.objects.filter(group__isnull=False).order_by().values('group_id').annotate(
+            open_count=Count('id', filter=Q(completed=False)),
+            completed_count=Count('id', filter=Q(completed=True)),
+            high_priority_count=Count('id', filter=Q(completed=False, priority='high')),
+        )
+    }
+    empty = {'open_count': 0, 'completed_count': 0, 'high_priority_count': 0}
+    GroupStats.objects.bulk_create(
+        [
+            GroupStats(group_id=group_id, **{name: counts.get(group_id, empty)[name] for name in empty})
+            for group_id in Group.objects.values_list('id', flat=True)
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0011_group_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='tasks.group')),
+                ('open_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('high_priority_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Full-text search on Task.text, see tasks/search.py.
+# PostgreSQL gets a GIN expression index, SQLite an FTS5 table kept in sync by
+# triggers; other backends get nothing and the search endpoint is unavailable.
+
+from django.db import migrations
+
+FTS_TABLE = 'tasks_task_fts'
+INDEX_NAME = 'task_text_search_idx'
+
+# a migration that rebuilds tasks_task on SQLite loses these and has to create them again
+SQLITE_TRIGGERS = [
+    f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON tasks_task BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+    f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON tasks_task BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text); END",
+    f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF text ON tasks_task BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); END",
+]
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(text, content='tasks_task', content_rowid='id', "
+    f"tokenize='porter unicode61')",
+    *SQLITE_TRIGGERS,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+SQLITE_DROP_TRIGGERS = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+]
+
+SQLITE_DROP = [
+    *SQLITE_DROP_TRIGGERS,
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def postgres_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    # the same expression as tasks.search.search_vector()
+    return GinIndex(SearchVector('text', config='english'), name=INDEX_NAME)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('tasks', 'Task'), postgres_index())
+    elif vendor == 'sqlite':
+        for statement in SQLITE_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('tasks', 'Task'), postgres_index())
+    elif vendor == 'sqlite':
+        for statement in SQLITE_DROP:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0012_groupstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.24 on 2026-10-18 12:26
+
+from django.db import migrations, models
+from django.db.models.functions import Now
+import tasks.models
+
+
+def fix_invalid_priorities(apps, schema_editor):
+    # rows saved under the old 'priority' default; bump updated_at so clients refetch them
+    Task = apps.get_model('tasks', 'Task')
+    Task.objects.exclude(priority__in=['low', 'medium', 'high']).update(priority='medium', updated_at=Now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_task_text_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_invalid_priorities, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('completed', False)), fields=['group', 'created_at'], name='task_group_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('completed', False), ('group__isnull', True)), fields=['user', 'created_at'], name='task_user_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(models.F('group'), tasks.models.PriorityRank(), models.F('created_at'), condition=models.Q(('completed', False)), name='task_group_open_rank_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(models.F('user'), tasks.models.PriorityRank(), models.F('created_at'), condition=models.Q(('completed', False), ('group__isnull', True)), name='task_user_open_rank_idx'),
+        ),
+    ]
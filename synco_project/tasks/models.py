@@ -1,9 +1,30 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import F, Func, IntegerField, Q
 from django.contrib.auth.models import User
 
+
+class PriorityRank(Func):
+    """
+    Sortable rank of Task.priority: high 3, medium 2, low 1, anything else 0.
+    The literals are written into the SQL instead of bound as parameters, so the
+    ORDER BY repeats the indexed expression exactly and the database can use the
+    partial indexes on Task.
+    """
+    template = "CASE %(expressions)s WHEN 'high' THEN 3 WHEN 'medium' THEN 2 WHEN 'low' THEN 1 ELSE 0 END"
+    output_field = IntegerField()
+
+    def __init__(self):
+        super().__init__(F('priority'))
+
+
+PRIORITY_RANK = PriorityRank()
+
 class Group(models.Model):
     name = models.CharField(max_length=255)
     members = models.ManyToManyField(User, related_name='synco_groups') 
+    # bumped whenever the name or the members change, feeds the group ETags
+    version = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return self.name
@@ -15,12 +36,179 @@ class Task(models.Model):
         ('high', 'High'),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='tasks')
+    # both foreign keys are covered by the composite indexes in Meta
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, db_index=False)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='tasks', db_index=False)
     text = models.CharField(max_length=255)
     completed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='priority') 
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    priority = models.CharField(max_length=10, choices=PRIORITY_CHOICES, default='medium')
+    # GroupStats.task_version of the group at the task's last write, None for personal tasks
+    group_version = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    # id given by the client that created the task, so replaying the create is a no-op
+    client_id = models.UUIDField(null=True, blank=True, editable=False)
+    # bumped by every UPDATE of the row: the task's ETag, checked by PUT with If-Match
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['client_id'], name='task_client_id_unique', condition=Q(client_id__isnull=False),
+            ),
+        ]
+        indexes = [
+            # personal tasks: user=?, group IS NULL, newest first
+            models.Index(fields=['user', 'group', 'created_at'], name='task_user_group_created_idx'),
+            # group tasks, newest first
+            models.Index(fields=['group', 'created_at'], name='task_group_created_idx'),
+            # the popup's default view, open tasks only: ?completed=false
+            models.Index(
+                fields=['group', 'created_at'], name='task_group_open_idx', condition=Q(completed=False),
+            ),
+            models.Index(
+                fields=['user', 'created_at'], name='task_user_open_idx',
+                condition=Q(completed=False, group__isnull=True),
+            ),
+            # open tasks by priority: ?completed=false&ordering=-priority
+            models.Index(
+                'group', PRIORITY_RANK, 'created_at', name='task_group_open_rank_idx', condition=Q(completed=False),
+            ),
+            models.Index(
+                'user', PRIORITY_RANK, 'created_at', name='task_user_open_rank_idx',
+                condition=Q(completed=False, group__isnull=True),
+            ),
+            # snapshot patches: a group's tasks written since a version
+            models.Index(
+                fields=['group', 'group_version'], name='task_group_version_idx',
+                condition=Q(group_version__isnull=False),
+            ),
+        ]
+
+    def save(self, *args, if_version=None, **kwargs):
+        """
+        if_version: only write the row if it is still at that version. The check is
+        the UPDATE's own WHERE version = n, nothing is read first; raises
+        VersionConflict when no row matched.
+        """
+        self._if_version = if_version
+        # run the post_save handlers (GroupStats counters) in the same transaction as the row
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # the bump happens in the database, so concurrent writers never hand out the same number
+        values = [value for value in values if value[0].attname != 'version']
+        values.append((self._meta.get_field('version'), None, F('version') + 1))
+        if_version = getattr(self, '_if_version', None)
+        if if_version is not None:
+            base_qs = base_qs.filter(version=if_version)
+        updated = super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if if_version is not None and not updated:
+            raise VersionConflict(f'Task {pk_val} is no longer at version {if_version}.')
+        if updated:
+            # not read back: after an unconditional write a concurrent one can make this
+            # lower than the stored number, which fails a later If-Match instead of passing it
+            self.version = (self.version if if_version is None else if_version) + 1
+        return updated
+
+    def __str__(self):
+        return self.text
+
+class VersionConflict(Exception):
+    # Task.save(if_version=n) found the task at another version, or gone
+    pass
+
+
+class TaskTombstone(models.Model):
+    # left behind by a deleted Task so sync clients can learn about the delete.
+    # plain ids instead of foreign keys: the user or group may be gone too
+    task_id = models.BigIntegerField()
+    user_id = models.IntegerField(null=True, blank=True)
+    group_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # GroupStats.task_version the delete (or the move out of the group) was given
+    group_version = models.PositiveBigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['group_id', 'group_version'], name='tombstone_group_version_idx',
+                condition=Q(group_version__isnull=False),
+            ),
+        ]
+
+    def __str__(self):
+        return f'Task {self.task_id} deleted at {self.deleted_at}'
+
+class GroupStats(models.Model):
+    # denormalized task counts of a group, maintained by tasks.stats on every task write
+    group = models.OneToOneField(Group, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    open_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    # open tasks with priority 'high'
+    high_priority_count = models.IntegerField(default=0)
+    # version of the group's task snapshot (tasks.snapshots), bumped by every task write
+    task_version = models.PositiveBigIntegerField(default=0)
+    # tombstones up to this task_version have been purged, older clients get a full snapshot
+    purged_version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'Stats of group {self.group_id}'
+
+class Job(models.Model):
+    # a unit of background work, queued by the API and run by `manage.py run_jobs` (tasks.jobs)
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # units of work done out of total, e.g. tasks deleted; total is None until known
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # a running job whose worker stops renewing this is picked up again
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the workers' poll: unfinished jobs, oldest first
+            models.Index(fields=['id'], name='job_pending_idx', condition=Q(status__in=['queued', 'running'])),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} job {self.pk} ({self.status})'
+
+class IdempotencyKey(models.Model):
+    # the response to a POST sent with an Idempotency-Key header, replayed to retries (tasks.idempotency)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    # sha256 of the method, path and body: a key reused for another request is refused
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    location = models.CharField(max_length=2048, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_unique'),
+        ]
 
     def __str__(self):
-        return self.text
\ No newline at end of file
+        return f'Idempotency key {self.key!r} of user {self.user_id}'
@@ -0,0 +1,143 @@
+import base64
+from urllib import parse
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TaskCursorPagination(BasePagination):
+    # keyset pagination, newest first unless ?ordering= picks another of ORDERINGS.
+    # the cursor holds the last row's position instead of an offset, so tasks
+    # inserted while a client is paging never shift or repeat rows
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    page_size = 100
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    # ?ordering= value -> sort key; every key ends in id, so positions are unique.
+    # priority_rank is the Task.PRIORITY_RANK annotation
+    ORDERINGS = {
+        '-created_at': ('-created_at', '-id'),
+        'created_at': ('created_at', 'id'),
+        '-priority': ('-priority_rank', '-created_at', '-id'),
+        'priority': ('priority_rank', 'created_at', 'id'),
+    }
+    default_ordering = '-created_at'
+    # how a cursor stores each sort column
+    position_parsers = {'created_at': parse_datetime, 'id': int, 'priority_rank': int}
+
+    @classmethod
+    def get_ordering(cls, request):
+        """
+        The sort key requested with ?ordering=, or None when it is not one of ORDERINGS.
+        """
+        return cls.ORDERINGS.get(request.GET.get(cls.ordering_query_param, cls.default_ordering))
+
+    def paginate_queryset(self, queryset, request, view=None, ordering=None):
+        # queryset may also be a list of disjoint querysets; each one gets the
+        # cursor filter on its own and they are combined with UNION ALL, so every
+        # branch can be served by its own index
+        queryset = self.page_queryset(queryset, request, ordering)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, ordering=None):
+        # same as paginate_queryset, for the async views
+        queryset = self.page_queryset(queryset, request, ordering)
+        return self.set_page([task async for task in queryset.aiterator()])
+
+    def page_queryset(self, queryset, request, ordering=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = ordering or self.ORDERINGS[self.default_ordering]
+
+        position = self.decode_cursor(request)
+        branches = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        if position is not None:
+            keyset = self.keyset(position)
+            branches = [branch.filter(keyset) for branch in branches]
+
+        queryset = branches[0]
+        if len(branches) > 1:
+            queryset = queryset.union(*branches[1:], all=True)
+        # one extra row tells whether there is a next page
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def keyset(self, position):
+        # rows after position in self.ordering: (a, b, c) > (x, y, z) spelled out per column
+        keyset = Q()
+        equal = {}
+        for key, value in zip(self.ordering, position):
+            name = key.lstrip('-')
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            keyset |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return keyset
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.GET[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        # pages hold Task instances or values() rows
+        names = [key.lstrip('-') for key in self.ordering]
+        if isinstance(last, dict):
+            position = [last[name] for name in names]
+        else:
+            position = [getattr(last, name) for name in names]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position))
+
+    def encode_cursor(self, position):
+        position = '|'.join(value.isoformat() if hasattr(value, 'isoformat') else str(value) for value in position)
+        return base64.urlsafe_b64encode(position.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.GET.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = base64.urlsafe_b64decode(parse.unquote(encoded).encode('ascii')).decode('ascii').split('|')
+            if len(values) != len(self.ordering):
+                raise ValueError(encoded)
+            position = [self.position_parsers[key.lstrip('-')](value) for key, value in zip(self.ordering, values)]
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+
+class MemberCursorPagination(CursorPagination):
+    # usernames are unique, so they make a stable cursor on their own
+    ordering = 'username'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
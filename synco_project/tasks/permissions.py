@@ -1,18 +1,19 @@
 from rest_framework import permissions
+from .membership import is_member
 
 class IsOwnerOrGroupMember(permissions.BasePermission):
     # custom permission to only allow owners of an object or memebers of the group to edit the object
 
-    def has_object_permission(selff, requet, view, obj):
+    def has_object_permission(self, request, view, obj):
         # read permissions are allowed to any request
         if request.method in permissions.SAFE_METHODS:
             return True
-        
+
         # write permissions are only allowed to the owner of the snipper
-        if obj.user and obj.user == request.user:
+        if obj.user_id and obj.user_id == request.user.pk:
             return True
 
         # allow access if the user is a member of the group
-        if obj.group and request.user in obj.group.members.all():
+        if obj.group_id and is_member(request, obj.group_id):
             return True
         return False
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+Per-endpoint request metrics and on-demand profiles.
+
+ProfilingMiddleware times every request and records its response size. A
+sampled share of requests (SYNCO_PROFILING_SAMPLE_RATE) is also instrumented
+for DB query count and time and serializer time; unsampled requests pay for two
+clock reads only. The numbers live in this process and are exported in the
+Prometheus text format by the admin-only GET /api/metrics/, so every worker is
+its own scrape target.
+
+Staff can add ?profile=1 to any request to get a cProfile report instead of the
+response.
+"""
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+
+from .authentication import acached_token, cached_token
+
+REPORT_LINES = 60
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# the RequestStats of the sampled request being handled, None otherwise.
+# context variables follow the request into sync_to_async threads
+_current = ContextVar('synco_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'serializer_seconds', 'serializing')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.serializing = False
+
+
+def current_stats():
+    return _current.get()
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+class TimedRepresentationMixin:
+    """
+    Adds the time spent in to_representation() to the sampled request's serializer
+    time. Nested serializers are counted once, as part of the outermost one.
+    """
+
+    def to_representation(self, instance):
+        stats = _current.get()
+        if stats is None or stats.serializing:
+            return super().to_representation(instance)
+        stats.serializing = True
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_seconds += time.perf_counter() - start
+            stats.serializing = False
+
+
+class Metrics:
+    # per (endpoint, method) totals; one lock, the updates are a few additions
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = defaultdict(int)
+            self.duration_sum = defaultdict(float)
+            self.duration_buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+            self.response_bytes = defaultdict(int)
+            self.sampled = defaultdict(int)
+            self.queries = defaultdict(int)
+            self.db_seconds = defaultdict(float)
+            self.serializer_seconds = defaultdict(float)
+
+    def observe(self, key, seconds, size, stats):
+        with self.lock:
+            self.requests[key] += 1
+            self.duration_sum[key] += seconds
+            buckets = self.duration_buckets[key]
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    buckets[index] += 1
+            if size is not None:
+                self.response_bytes[key] += size
+            if stats is not None:
+                self.sampled[key] += 1
+                self.queries[key] += stats.queries
+                self.db_seconds[key] += stats.db_seconds
+                self.serializer_seconds[key] += stats.serializer_seconds
+
+    def render(self):
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        with self.lock:
+            lines = []
+
+            def family(name, kind, help_text, values):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                for key, value in sorted(values.items()):
+                    lines.append(f'{name}{{{_labels(key)}}} {value}')
+
+            family('synco_requests_total', 'counter', 'Requests handled.', self.requests)
+            lines.append('# HELP synco_request_duration_seconds Wall time per request.')
+            lines.append('# TYPE synco_request_duration_seconds histogram')
+            for key in sorted(self.requests):
+                labels = _labels(key)
+                for bound, count in zip(DURATION_BUCKETS, self.duration_buckets[key]):
+                    lines.append(f'synco_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'synco_request_duration_seconds_bucket{{{labels},le="+Inf"}} {self.requests[key]}')
+                lines.append(f'synco_request_duration_seconds_sum{{{labels}}} {self.duration_sum[key]}')
+                lines.append(f'synco_request_duration_seconds_count{{{labels}}} {self.requests[key]}')
+            family('synco_response_bytes_total', 'counter', 'Response body bytes (streamed responses excluded).',
+                   self.response_bytes)
+            family('synco_sampled_requests_total', 'counter',
+                   'Requests sampled for the DB and serializer figures below.', self.sampled)
+            family('synco_db_queries_total', 'counter', 'DB queries of sampled requests.', self.queries)
+            family('synco_db_query_seconds_total', 'counter', 'DB query time of sampled requests.',
+                   self.db_seconds)
+            family('synco_serializer_seconds_total', 'counter', 'Serializer time of sampled requests.',
+                   self.serializer_seconds)
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(key):
+    endpoint, method = key
+    return f'endpoint="{endpoint}",method="{method}"'
+
+
+metrics = Metrics()
+
+
+def _endpoint(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name or match.route if match else 'unmatched'
+
+
+def _wants_profile(request):
+    return request.GET.get('profile') == '1'
+
+
+def _token_key(request):
+    # middleware runs before DRF authenticates, so read the token header here
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2 or auth[0].lower() != 'token':
+        return None
+    return auth[1]
+
+
+def _is_staff_token(token):
+    return token is not None and token.user.is_active and token.user.is_staff
+
+
+def _is_staff(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    key = _token_key(request)
+    return key is not None and _is_staff_token(cached_token(key))
+
+
+async def _ais_staff(request):
+    # token only: the session user can't be loaded from async code on Django 4.2
+    key = _token_key(request)
+    return key is not None and _is_staff_token(await acached_token(key))
+
+
+def _profile_report(profile):
+    out = io.StringIO()
+    pstats.Stats(profile, stream=out).sort_stats('cumulative').print_stats(REPORT_LINES)
+    return HttpResponse(out.getvalue(), content_type='text/plain; charset=utf-8')
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if _wants_profile(request) and _is_staff(request):
+            profile = cProfile.Profile()
+            profile.runcall(self.get_response, request)
+            return _profile_report(profile)
+        if not settings.SYNCO_PROFILING_ENABLED:
+            return self.get_response(request)
+        stats, token = self._start()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._finish(token)
+        self._observe(request, response, time.perf_counter() - start, stats)
+        return response
+
+    async def __acall__(self, request):
+        if _wants_profile(request) and await _ais_staff(request):
+            # profiles this event loop thread: concurrent requests show up too
+            profile = cProfile.Profile()
+            profile.enable()
+            try:
+                await self.get_response(request)
+            finally:
+                profile.disable()
+            return _profile_report(profile)
+        if not settings.SYNCO_PROFILING_ENABLED:
+            return await self.get_response(request)
+        stats, token = self._start()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._finish(token)
+        self._observe(request, response, time.perf_counter() - start, stats)
+        return response
+
+    def _start(self):
+        sample_rate = settings.SYNCO_PROFILING_SAMPLE_RATE
+        if sample_rate < 1 and random.random() >= sample_rate:
+            return None, None
+        stats = RequestStats()
+        return stats, _current.set(stats)
+
+    def _finish(self, token):
+        if token is not None:
+            _current.reset(token)
+
+    def _observe(self, request, response, seconds, stats):
+        size = None if response.streaming else len(response.content)
+        metrics.observe((_endpoint(request), request.method), seconds, size, stats)
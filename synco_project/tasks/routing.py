@@ -0,0 +1,28 @@
+from urllib.parse import parse_qs
+
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.urls import path
+
+from .authentication import acached_token
+from .consumers import TaskEventsConsumer
+
+
+async def get_token_user(key):
+    token = await acached_token(key)
+    if token is None or not token.user.is_active:
+        return AnonymousUser()
+    return token.user
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    # browsers can't set headers on a WebSocket, so the DRF token comes in ?token=
+    async def __call__(self, scope, receive, send):
+        key = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+        scope = dict(scope, user=await get_token_user(key) if key else AnonymousUser())
+        return await super().__call__(scope, receive, send)
+
+
+websocket_urlpatterns = [
+    path('ws/tasks/', TaskEventsConsumer.as_asgi()),
+]
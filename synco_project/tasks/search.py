@@ -0,0 +1,59 @@
+"""
+Full-text search over Task.text.
+
+PostgreSQL matches to_tsvector(text) against websearch_to_tsquery(q), served by
+the GIN index task_text_search_idx and ranked with ts_rank. SQLite (the dev
+setup) uses the FTS5 table tasks_task_fts, kept in sync by triggers and ranked
+with bm25. Both are created by migration 0013 for the matching vendor only.
+"""
+import re
+
+from django.db import connection
+from django.db.models import F
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'tasks_task_fts'
+INDEX_NAME = 'task_text_search_idx'
+
+RESULT_LIMIT = 50
+MAX_RESULT_LIMIT = 200
+
+_TERM = re.compile(r'\w+')
+
+
+def search_vector():
+    # must stay identical to the indexed expression, or the GIN index is not used
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('text', config=SEARCH_CONFIG)
+
+
+def fts5_query(q):
+    # every word quoted: user input never reaches FTS5's query syntax, and all words must match
+    return ' '.join('"%s"' % term for term in _TERM.findall(q))
+
+
+def search_tasks(tasks, q):
+    """
+    Filter the Task queryset to the tasks matching q, best match first.
+    Returns None when q has nothing to search for.
+    """
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        if not _TERM.search(q):
+            return None
+        query = SearchQuery(q, config=SEARCH_CONFIG, search_type='websearch')
+        return tasks.annotate(document=search_vector()).filter(document=query).annotate(
+            rank=SearchRank(F('document'), query)
+        ).order_by('-rank', '-created_at', '-id')
+
+    query = fts5_query(q)
+    if not query:
+        return None
+    # joined rather than a subquery per row, bm25() needs the MATCH in the same query;
+    # it is lower for better matches
+    return tasks.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = tasks_task.id', f'{FTS_TABLE} MATCH %s'],
+        params=[query],
+        select={'rank': f'bm25({FTS_TABLE})'},
+    ).order_by('rank', '-created_at', '-id')
@@ -1,22 +1,145 @@
+import time
+from functools import lru_cache
+
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Task, Group
+from .models import Task, Group, Job
+from .profiling import TimedRepresentationMixin, current_stats
 from django.contrib.auth.models import User
 
-class UserSerializer(serializers.ModelSerializer):
+
+def datetime_representation(value):
+    # what serializers.DateTimeField.to_representation returns, without the field object
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    return value[:-6] + 'Z' if value.endswith('+00:00') else value
+
+
+def uuid_representation(value):
+    # serializers.UUIDField's default 'hex_verbose' format
+    return None if value is None else str(value)
+
+# field types whose to_representation is the identity (or the pk) for values() rows
+_PASSTHROUGH_FIELDS = (
+    serializers.IntegerField, serializers.CharField, serializers.BooleanField,
+    serializers.ChoiceField, serializers.PrimaryKeyRelatedField,
+)
+
+class ValuesSerializer:
+    """
+    Read-only fast path for list responses: turns values() rows into exactly what
+    serializer_class(many=True).data would return. How each field is represented
+    is worked out once here, not per row and field.
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        self.plan = []
+        for name, field in serializer_class().fields.items():
+            if fields is not None and name not in fields:
+                continue
+            if isinstance(field, serializers.DateTimeField):
+                convert = datetime_representation
+            elif isinstance(field, serializers.UUIDField):
+                convert = uuid_representation
+            elif isinstance(field, _PASSTHROUGH_FIELDS):
+                convert = None
+            else:
+                raise TypeError(f'{serializer_class.__name__}.{name} has no values() fast path')
+            self.plan.append((name, field.source, convert))
+        # the columns to ask values() for
+        self.columns = [source for _, source, _ in self.plan]
+
+    def to_representation(self, rows):
+        stats = current_stats()
+        start = time.perf_counter()
+        plan = self.plan
+        data = [
+            {name: row[source] if convert is None else convert(row[source]) for name, source, convert in plan}
+            for row in rows
+        ]
+        if stats is not None:
+            stats.serializer_seconds += time.perf_counter() - start
+        return data
+
+class UserSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username')
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
+    def __init__(self, *args, **kwargs):
+        # optional projection, e.g. TaskSerializer(tasks, many=True, fields=['id', 'text'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
     class Meta:
         model = Task
         # ✨ CORRECTED: 'due_date' is replaced with 'priority'
-        fields = ['id', 'text', 'completed', 'group', 'user', 'created_at', 'priority']
-        read_only_fields = ['user', 'created_at']
+        fields = ['id', 'text', 'completed', 'group', 'user', 'created_at', 'priority', 'version']
+        read_only_fields = ['user', 'created_at', 'version']
 
-class GroupSerializer(serializers.ModelSerializer):
+class GroupSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     members = UserSerializer(many=True, read_only=True)
     
     class Meta:
         model = Group
-        fields = ['id', 'name', 'members']
\ No newline at end of file
+        fields = ['id', 'name', 'members']
+class GroupSummarySerializer(serializers.Serializer):
+    # ?view=summary rows of the group list: no member expansion
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    member_count = serializers.IntegerField()
+    open_task_count = serializers.IntegerField()
+    completed_task_count = serializers.IntegerField()
+    high_priority_count = serializers.IntegerField()
+    last_activity_at = serializers.DateTimeField(allow_null=True)
+
+
+class SnapshotTaskSerializer(serializers.ModelSerializer):
+    # a task in a group snapshot (tasks.snapshots): the group is implied
+    class Meta:
+        model = Task
+        fields = ['id', 'client_id', 'text', 'completed', 'priority', 'created_at']
+        read_only_fields = fields
+
+
+class BulkTaskSerializer(TaskSerializer):
+    # plain group id instead of a related lookup per row: the bulk endpoint
+    # checks membership for the whole batch at once
+    group = serializers.IntegerField(source='group_id', required=False, allow_null=True)
+
+    class Meta(TaskSerializer.Meta):
+        # client_id is set by the create operation, not through data
+        fields = TaskSerializer.Meta.fields + ['client_id']
+        read_only_fields = TaskSerializer.Meta.read_only_fields + ['client_id']
+
+class BulkOperationSerializer(serializers.Serializer):
+    OPS = ('create', 'update', 'delete')
+
+    op = serializers.ChoiceField(choices=OPS)
+    id = serializers.IntegerField(required=False)
+    # chosen by the client, see tasks.bulk.apply_task_operations
+    client_id = serializers.UUIDField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['op'] != 'create' and 'id' not in attrs and 'client_id' not in attrs:
+            raise serializers.ValidationError({'id': f'This field or client_id is required for {attrs["op"]}.'})
+        return attrs
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'progress', 'total', 'result', 'error',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+
+@lru_cache(maxsize=64)
+def task_values_serializer(fields=None):
+    # compiled once per ?fields= projection (a tuple, or None for all fields)
+    return ValuesSerializer(TaskSerializer, fields)
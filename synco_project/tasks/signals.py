@@ -0,0 +1,125 @@
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+from django.contrib.auth.models import User
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_tokens
+from .conditional import bump_group_versions
+from .events import publish_membership_revoked, publish_task_changes
+from .membership import invalidate_user_groups
+from .models import Group, GroupStats, Task, TaskTombstone
+from .stats import STATE_ATTR, StatsChanges, task_state
+
+
+@receiver(m2m_changed, sender=Group.members.through)
+def group_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # forward side: instance is a Group and pk_set holds user ids,
+    # reverse side (user.synco_groups): instance is the User and pk_set holds group ids
+    if action == 'pre_clear':
+        # clear() does not report which rows it removes, remember them now
+        if reverse:
+            instance._synco_cleared_ids = list(instance.synco_groups.values_list('id', flat=True))
+        else:
+            instance._synco_cleared_ids = list(instance.members.values_list('id', flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_synco_cleared_ids', [])
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    user_ids, group_ids = ([instance.pk], pk_set) if reverse else (pk_set, [instance.pk])
+    invalidate_user_groups(user_ids)
+    bump_group_versions(group_ids)
+    if action != 'post_add':
+        publish_membership_revoked(user_ids, group_ids)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if created:
+        GroupStats.objects.create(group=instance)
+    else:
+        bump_group_versions([instance.pk])
+
+
+@receiver(pre_delete, sender=Group)
+def group_pre_delete(sender, instance, **kwargs):
+    # the cascade removes the member rows without m2m_changed
+    instance._synco_member_ids = list(instance.members.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Group)
+def group_post_delete(sender, instance, **kwargs):
+    invalidate_user_groups(getattr(instance, '_synco_member_ids', []))
+
+
+@receiver(post_init, sender=Task)
+def task_loaded(sender, instance, **kwargs):
+    # remember what the counters saw, so a save can apply the difference
+    if instance.pk is not None and not instance.get_deferred_fields() & {'group', 'completed', 'priority'}:
+        setattr(instance, STATE_ATTR, task_state(instance))
+
+
+@receiver(pre_save, sender=Task)
+def task_pre_save(sender, instance, update_fields=None, **kwargs):
+    # Task.save() runs this inside its transaction. The counters and the group's
+    # snapshot version move before the row is written, so it is saved with its group_version
+    old = None
+    if not instance._state.adding:
+        old = getattr(instance, STATE_ATTR, None)
+        if old is None:
+            # an instance loaded with deferred fields: read the stored state once
+            old = Task.objects.filter(pk=instance.pk).values_list('group_id', 'completed', 'priority').first()
+    changes = StatsChanges()
+    changes.add(old, task_state(instance))
+    versions = changes.apply()
+    instance.group_version = versions.get(instance.group_id)
+    if update_fields is not None and 'group_version' not in update_fields:
+        instance._synco_write_version = True
+    if old is not None and old[0] != instance.group_id:
+        # the old channel's subscribers see a delete once the row is saved
+        instance._synco_moved_from = old[0]
+        if old[0] is not None or instance.user_id is not None:
+            # the scope it left sees a delete: the old group's deltas and snapshot,
+            # or the owner's personal list (group_id None) for a task moved into a group
+            TaskTombstone.objects.create(task_id=instance.pk, user_id=instance.user_id, group_id=old[0],
+                                         group_version=versions.get(old[0]))
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created, **kwargs):
+    if getattr(instance, '_synco_write_version', False):
+        # save(update_fields=...) left group_version out
+        del instance._synco_write_version
+        Task.objects.filter(pk=instance.pk).update(group_version=instance.group_version)
+    setattr(instance, STATE_ATTR, task_state(instance))
+    moved = []
+    if hasattr(instance, '_synco_moved_from'):
+        moved.append((instance, instance._synco_moved_from))
+        del instance._synco_moved_from
+    publish_task_changes(saved=[instance], moved=moved)
+
+
+@receiver(post_delete, sender=Task)
+def task_post_delete(sender, instance, **kwargs):
+    # the deletion collector runs this inside its transaction
+    changes = StatsChanges()
+    changes.add(getattr(instance, STATE_ATTR, None) or task_state(instance))
+    versions = changes.apply()
+    # leave a tombstone for GET /api/tasks/changes/ and the group's snapshot
+    TaskTombstone.objects.create(task_id=instance.pk, user_id=instance.user_id, group_id=instance.group_id,
+                                 group_version=versions.get(instance.group_id))
+    publish_task_changes(deleted=[instance])
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # covers rotation (delete + create) and the cascade from a deleted user
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    # cached tokens carry a copy of the user, e.g. a stale is_active
+    if not created:
+        invalidate_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
@@ -0,0 +1,57 @@
+"""
+Versioned snapshots of a group's tasks, for clients that keep a copy offline.
+
+The version of a group's snapshot is GroupStats.task_version: every task write
+bumps it (tasks.stats) and stamps the written task, or the tombstone of a task
+deleted or moved out of the group, with the new value. A client sends the version
+it holds and gets back one of:
+
+    {"status": "unchanged", "version": 12}
+    {"status": "patch", "version": 14, "changed": [...], "deleted": [ids]}
+    {"status": "full", "version": 14, "tasks": [...]}
+
+A patch holds the tasks written and the ids removed since the client's version;
+apply both by id. The version is read before the tasks, so a document can already
+contain writes of a later version, which the next patch repeats: harmless.
+"""
+from django.conf import settings
+
+from .models import GroupStats, Task, TaskTombstone
+from .serializers import SnapshotTaskSerializer, ValuesSerializer
+
+UNCHANGED = 'unchanged'
+PATCH = 'patch'
+FULL = 'full'
+
+_serializer = ValuesSerializer(SnapshotTaskSerializer)
+
+
+def _rows(tasks, limit=None):
+    rows = tasks.order_by('id').values(*_serializer.columns)
+    return _serializer.to_representation(rows if limit is None else rows[:limit])
+
+
+def build_snapshot(group_id, since=None):
+    """
+    The snapshot document of group_id for a client holding version `since` (None: no copy).
+    Patches are only sent while the tombstones they need are kept, and while they
+    are smaller than SYNCO_SYNC_MAX_CHANGES; the full document otherwise.
+    """
+    # groups created with bulk_create have no stats row until recompute_group_stats()
+    stats, _ = GroupStats.objects.get_or_create(group_id=group_id)
+    version = stats.task_version
+    if since == version:
+        return {'status': UNCHANGED, 'version': version}
+
+    if since is not None and stats.purged_version <= since < version:
+        limit = settings.SYNCO_SYNC_MAX_CHANGES
+        changed = _rows(Task.objects.filter(group_id=group_id, group_version__gt=since), limit + 1)
+        deleted = list(TaskTombstone.objects.filter(group_id=group_id, group_version__gt=since)
+                       .values_list('task_id', flat=True)[:limit + 1])
+        if len(changed) + len(deleted) <= limit:
+            # a task moved out of the group and back is in both
+            changed_ids = {row['id'] for row in changed}
+            deleted = sorted({task_id for task_id in deleted if task_id not in changed_ids})
+            return {'status': PATCH, 'version': version, 'changed': changed, 'deleted': deleted}
+
+    return {'status': FULL, 'version': version, 'tasks': _rows(Task.objects.filter(group_id=group_id))}
@@ -0,0 +1,89 @@
+"""
+Per-group task counters (GroupStats), and the version of each group's task snapshot.
+
+Every task write adjusts them with F() updates inside the transaction of the write:
+Task.save() and delete() through the handlers in tasks.signals, the bulk paths
+through StatsChanges directly. The same UPDATE bumps GroupStats.task_version and
+keeps the row locked until commit, so the versions of a group commit in order.
+recompute_group_stats() rebuilds the counters from the tasks.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Group, GroupStats, Task
+
+COUNTERS = ('open_count', 'completed_count', 'high_priority_count')
+
+# the task_state() a Task was loaded or last saved with
+STATE_ATTR = '_synco_stats_state'
+
+
+def task_state(task):
+    # the fields the counters depend on
+    return task.group_id, task.completed, task.priority
+
+
+def _counters(state):
+    _, completed, priority = state
+    if completed:
+        return {'completed_count': 1}
+    return {'open_count': 1, 'high_priority_count': int(priority == 'high')}
+
+
+class StatsChanges:
+    """
+    Net counter changes per group, collected over any number of task writes and
+    applied with one UPDATE per touched group.
+    """
+
+    def __init__(self):
+        self.deltas = defaultdict(Counter)
+
+    def add(self, old=None, new=None):
+        # old / new: task_state() before and after the write, None for a create / delete
+        for state, sign in ((old, -1), (new, 1)):
+            if state is None or state[0] is None:
+                continue
+            for name, value in _counters(state).items():
+                self.deltas[state[0]][name] += sign * value
+
+    def apply(self):
+        """
+        Apply the changes and bump the task_version of every group written to, even
+        when its counters did not move. Returns {group_id: new task_version}.
+        """
+        # in group order, so concurrent writers lock the rows in the same order
+        group_ids = sorted(self.deltas)
+        for group_id in group_ids:
+            changes = {name: F(name) + value for name, value in self.deltas[group_id].items() if value}
+            GroupStats.objects.filter(group_id=group_id).update(task_version=F('task_version') + 1, **changes)
+        self.deltas.clear()
+        if not group_ids:
+            return {}
+        return dict(GroupStats.objects.filter(group_id__in=group_ids).values_list('group_id', 'task_version'))
+
+
+def recompute_group_stats(group_ids=None):
+    """
+    Rebuild the counters of the given groups (default: all) from the tasks table.
+    Returns the number of groups rebuilt.
+    """
+    groups = Group.objects.all() if group_ids is None else Group.objects.filter(id__in=group_ids)
+    tasks = Task.objects.filter(group__in=groups)
+    with transaction.atomic():
+        # writers block on the locked rows until the rebuilt counts are in
+        list(GroupStats.objects.select_for_update().filter(group__in=groups).values_list('pk', flat=True))
+        rows = {group_id: GroupStats(group_id=group_id) for group_id in groups.values_list('id', flat=True)}
+        counts = tasks.order_by().values('group_id').annotate(
+            open_count=Count('id', filter=Q(completed=False)),
+            completed_count=Count('id', filter=Q(completed=True)),
+            high_priority_count=Count('id', filter=Q(completed=False, priority='high')),
+        )
+        for row in counts:
+            for name in COUNTERS:
+                setattr(rows[row['group_id']], name, row[name])
+        GroupStats.objects.bulk_create(rows.values(), update_conflicts=True, unique_fields=['group'],
+                                       update_fields=COUNTERS, batch_size=1000)
+    return len(rows)
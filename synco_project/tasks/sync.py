@@ -0,0 +1,43 @@
+import base64
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+
+class InvalidSyncToken(ValueError):
+    pass
+
+
+def encode_token(moment):
+    # opaque to clients: base64 of the moment in microseconds since the epoch
+    micros = int(moment.timestamp() * 1_000_000)
+    return base64.urlsafe_b64encode(str(micros).encode('ascii')).decode('ascii')
+
+
+def decode_token(token):
+    try:
+        micros = int(base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii'))
+        return datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        raise InvalidSyncToken(token)
+
+
+def new_token():
+    return encode_token(timezone.now())
+
+
+def changes_window_start(since):
+    """
+    Lower bound for updated_at / deleted_at when syncing from `since`.
+    Timestamps are taken before commit, so a slow transaction can become visible
+    after a faster, later one; replaying a short overlap catches those rows.
+    Clients apply changes by id, so seeing a row twice is harmless.
+    """
+    return since - timedelta(seconds=settings.SYNCO_SYNC_OVERLAP_SECONDS)
+
+
+def token_expired(since):
+    # tombstones older than the retention window are gone, so a delta would miss deletes
+    retention = timedelta(days=settings.SYNCO_TOMBSTONE_RETENTION_DAYS)
+    return since < timezone.now() - retention
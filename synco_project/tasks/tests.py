@@ -1,3 +1,1613 @@
-from django.test import TestCase
+import asyncio
+import json
+import random
+import threading
+import tracemalloc
+import warnings
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.db import database_sync_to_async
+from channels.testing.websocket import WebsocketCommunicator
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from synco_project.asgi import application
+
+from . import async_views, idempotency
+from .coalesce import SingleFlight, list_reads
+from .events import group_channel
+from .hashing import get_pool, run_hash
+from .idempotency import purge_idempotency_keys
+from .jobs import claim_job, enqueue
+from .models import PRIORITY_RANK, Task, Group, GroupStats, IdempotencyKey, Job, TaskTombstone, VersionConflict
+from .membership import is_member, user_group_ids
+from .profiling import metrics as request_metrics
+from .routing import get_token_user
+from .serializers import GroupSerializer, TaskSerializer, ValuesSerializer, task_values_serializer
+from .sync import encode_token
+from .throttling import IPRateThrottle, TokenRateThrottle
+
+
+class SyncoTestCase(APITestCase):
+    # the locmem caches outlive the per-test transaction, start every test empty
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+
+
+class TaskListPaginationTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Project')
+        self.group.members.add(self.user)
+        Task.objects.bulk_create(
+            Task(group=self.group, text=f'task {i}', priority='medium') for i in range(25)
+        )
+        self.url = reverse('task_list')
+
+    def collect_ids(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(task['id'] for task in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_are_bounded_and_cover_every_task(self):
+        response = self.client.get(self.url, {'group': self.group.id, 'page_size': 10})
+        self.assertEqual(len(response.data['results']), 10)
+        ids = self.collect_ids(f'{self.url}?group={self.group.id}&page_size=10')
+        expected = list(Task.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_cursor_is_stable_when_tasks_are_inserted(self):
+        first = self.client.get(self.url, {'group': self.group.id, 'page_size': 10})
+        seen = [task['id'] for task in first.data['results']]
+        Task.objects.create(group=self.group, text='late arrival')
+        seen += self.collect_ids(first.data['next'])
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(self.url, {'page_size': 100000})
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertIsNone(response.data['next'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_fields_projection(self):
+        response = self.client.get(self.url, {'fields': 'id,text,completed,priority'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'text', 'completed', 'priority'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(self.url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TaskListQueryPlanTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='bob', password='pw')
+        self.client.force_authenticate(self.user)
+        groups = [Group.objects.create(name=f'group {i}') for i in range(5)]
+        for group in groups:
+            group.members.add(self.user)
+            Task.objects.bulk_create(Task(group=group, text='t') for _ in range(20))
+        Task.objects.bulk_create(Task(user=self.user, text='mine') for _ in range(20))
+
+    def test_default_listing_uses_the_composite_indexes(self):
+        user_group_ids(self.user)  # warm the membership cache
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('task_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 100)
+        # the ETag aggregate, then the page itself
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+        sql = ctx.captured_queries[1]['sql']
+        self.assertNotIn('DISTINCT', sql)
+        self.assertIn('UNION ALL', sql)
+        explain = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+        with connection.cursor() as cursor:
+            cursor.execute(explain + sql)
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        self.assertIn('task_user_group_created_idx', plan)
+        self.assertIn('task_group_created_idx', plan)
+
+
+class MembershipQueryTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='carol', password='pw')
+        self.other = User.objects.create_user(username='dave', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Big group')
+        # plenty of members: the membership check must not load them
+        extra = User.objects.bulk_create(User(username=f'student{i}') for i in range(200))
+        self.group.members.add(self.user, *extra)
+        self.task = Task.objects.create(group=self.group, text='shared')
+
+    def test_is_member_reads_the_members_table_once(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(is_member(request, self.group))
+            self.assertTrue(is_member(request, self.group.id))
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        # a later request is served from the cache
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(0):
+            self.assertTrue(is_member(request, self.group))
+
+        request = RequestFactory().get('/')
+        request.user = self.other
+        self.assertFalse(is_member(request, self.group))
+
+    def test_query_counts_per_endpoint(self):
+        cases = [
+            # (method, url, data, expected status, expected queries)
+            # (the first one fills the membership cache, the others hit it;
+            # task writes add a savepoint pair, the GroupStats update and the read of the new task_version)
+            ('post', reverse('task_list'), {'text': 'new', 'group': self.group.id}, 201, 7),
+            ('get', reverse('task_list') + f'?group={self.group.id}', None, 200, 2),
+            ('put', reverse('task_detail', args=[self.task.id]), {'completed': True}, 200, 6),
+            ('get', reverse('group_detail', args=[self.group.id]), None, 200, 2),
+            ('post', reverse('group_members', args=[self.group.id]), {'username': 'dave'}, 200, 4),
+        ]
+        for method, url, data, expected_status, expected_queries in cases:
+            with self.subTest(method=method, url=url):
+                with self.assertNumQueries(expected_queries):
+                    response = getattr(self.client, method)(url, data, format='json')
+                self.assertEqual(response.status_code, expected_status)
+
+    def test_non_member_cannot_modify_group_task(self):
+        self.client.force_authenticate(self.other)
+        response = self.client.put(reverse('task_detail', args=[self.task.id]), {'completed': True}, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(reverse('task_list'), {'text': 'x', 'group': self.group.id}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class MembershipCacheTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='erin', password='pw')
+        self.student = User.objects.create_user(username='frank', password='pw')
+        self.group = Group.objects.create(name='Class')
+        self.group.members.add(self.owner)
+        self.task = Task.objects.create(group=self.group, text='homework')
+
+    def student_can_see_group(self):
+        self.client.force_authenticate(self.student)
+        response = self.client.get(reverse('group_list'))
+        return any(group['id'] == self.group.id for group in response.data)
+
+    def change_membership(self, method):
+        self.client.force_authenticate(self.owner)
+        url = reverse('group_members', args=[self.group.id])
+        response = getattr(self.client, method)(url, {'username': 'frank'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_group_members_endpoint_never_leaves_stale_membership(self):
+        self.assertFalse(self.student_can_see_group())
+        self.change_membership('post')
+        self.assertTrue(self.student_can_see_group())
+        self.client.force_authenticate(self.student)
+        response = self.client.put(reverse('task_detail', args=[self.task.id]), {'completed': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.change_membership('delete')
+        self.assertFalse(self.student_can_see_group())
+        self.client.force_authenticate(self.student)
+        response = self.client.put(reverse('task_detail', args=[self.task.id]), {'completed': False}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_reverse_side_clear_and_group_delete_invalidate(self):
+        self.assertEqual(user_group_ids(self.owner), {self.group.id})
+        self.owner.synco_groups.clear()
+        self.assertEqual(user_group_ids(self.owner), set())
+
+        self.owner.synco_groups.add(self.group)
+        self.assertEqual(user_group_ids(self.owner), {self.group.id})
+        self.group.delete()
+        self.assertEqual(user_group_ids(self.owner), set())
+
+    def test_group_list_does_not_touch_the_members_table_when_cached(self):
+        self.client.force_authenticate(self.owner)
+        self.client.get(reverse('group_list'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('task_list'))
+        self.assertFalse(any('tasks_group_members' in q['sql'] for q in ctx.captured_queries))
+
+
+class TaskChangesTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='gina', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Sync')
+        self.group.members.add(self.user)
+        self.url = reverse('task_changes')
+
+    def sync(self, token):
+        response = self.client.get(self.url, {'since': token})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_delta_contains_created_updated_and_deleted_tasks(self):
+        kept = Task.objects.create(group=self.group, text='kept')
+        doomed = Task.objects.create(user=self.user, text='doomed')
+        with self.settings(SYNCO_SYNC_OVERLAP_SECONDS=0):
+            token = self.client.get(self.url).data['token']
+            created = Task.objects.create(group=self.group, text='new')
+            self.client.put(reverse('task_detail', args=[kept.id]), {'completed': True}, format='json')
+            self.client.delete(reverse('task_detail', args=[doomed.id]))
+
+            data = self.sync(token)
+            self.assertFalse(data['reset'])
+            self.assertEqual({task['id'] for task in data['changed']}, {created.id, kept.id})
+            self.assertEqual(data['deleted'], [doomed.id])
+
+            data = self.sync(data['token'])
+            self.assertEqual(data['changed'], [])
+            self.assertEqual(data['deleted'], [])
+
+    def test_other_groups_are_not_leaked(self):
+        other = Group.objects.create(name='Not mine')
+        token = self.client.get(self.url).data['token']
+        Task.objects.create(group=other, text='secret').delete()
+        Task.objects.create(group=other, text='secret too')
+        data = self.sync(token)
+        self.assertEqual((data['changed'], data['deleted']), ([], []))
+        self.assertEqual(self.client.get(self.url, {'since': token, 'group': other.id}).status_code, 404)
+
+    def test_bad_expired_and_oversized_deltas(self):
+        self.assertEqual(self.client.get(self.url, {'since': '???'}).status_code, 400)
+        old = encode_token(timezone.now() - timedelta(days=365))
+        self.assertTrue(self.sync(old)['reset'])
+
+        token = self.client.get(self.url).data['token']
+        Task.objects.bulk_create(Task(group=self.group, text='bulk') for _ in range(5))
+        with self.settings(SYNCO_SYNC_MAX_CHANGES=3):
+            self.assertTrue(self.sync(token)['reset'])
+
+    def test_tasks_moved_out_of_the_personal_list(self):
+        saved = Task.objects.create(user=self.user, text='saved')
+        bulk = Task.objects.create(user=self.user, text='bulk')
+        with self.settings(SYNCO_SYNC_OVERLAP_SECONDS=0):
+            token = self.client.get(self.url, {'group__isnull': 'True'}).data['token']
+            self.client.put(reverse('task_detail', args=[saved.id]), {'group': self.group.id}, format='json')
+            self.client.post(reverse('task_bulk'), {'operations': [
+                {'op': 'update', 'id': bulk.id, 'data': {'group': self.group.id}},
+            ]}, format='json')
+            personal = self.client.get(self.url, {'since': token, 'group__isnull': 'True'}).data
+            self.assertEqual((personal['changed'], sorted(personal['deleted'])), ([], [saved.id, bulk.id]))
+            # the unscoped delta has them as changed, not deleted
+            data = self.sync(token)
+            self.assertEqual({task['id'] for task in data['changed']}, {saved.id, bulk.id})
+            self.assertEqual(data['deleted'], [])
+
+    def test_purge_tombstones(self):
+        Task.objects.create(user=self.user, text='a').delete()
+        Task.objects.create(user=self.user, text='b').delete()
+        TaskTombstone.objects.filter(task_id__in=TaskTombstone.objects.values('task_id')[:1]).update(
+            deleted_at=timezone.now() - timedelta(days=90))
+        call_command('purge_tombstones', stdout=StringIO())
+        self.assertEqual(TaskTombstone.objects.count(), 1)
+
+
+class TaskBulkTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='hank', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Import')
+        self.group.members.add(self.user)
+        self.other_group = Group.objects.create(name='Elsewhere')
+        self.url = reverse('task_bulk')
+
+    def bulk(self, operations):
+        response = self.client.post(self.url, {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [result['status'] for result in response.data['results']], response.data['results']
+
+    def test_mixed_operations_report_each_result(self):
+        mine = Task.objects.create(user=self.user, text='mine')
+        shared = Task.objects.create(group=self.group, text='shared')
+        foreign = Task.objects.create(group=self.other_group, text='foreign')
+        statuses, results = self.bulk([
+            {'op': 'create', 'data': {'text': 'new', 'group': self.group.id, 'priority': 'high'}},
+            {'op': 'create', 'data': {'text': 'nope', 'group': self.other_group.id}},
+            {'op': 'create', 'data': {}},
+            {'op': 'update', 'id': shared.id, 'data': {'completed': True}},
+            {'op': 'update', 'id': foreign.id, 'data': {'completed': True}},
+            {'op': 'delete', 'id': mine.id},
+            {'op': 'explode'},
+        ])
+        self.assertEqual(statuses, [201, 403, 400, 200, 404, 204, 400])
+        created = Task.objects.get(pk=results[0]['data']['id'])
+        self.assertEqual((created.group_id, created.user_id), (self.group.id, None))
+        shared.refresh_from_db()
+        self.assertTrue(shared.completed)
+        foreign.refresh_from_db()
+        self.assertFalse(foreign.completed)
+        self.assertFalse(Task.objects.filter(pk=mine.id).exists())
+        self.assertTrue(TaskTombstone.objects.filter(task_id=mine.id).exists())
+
+    @override_settings(SYNCO_BULK_SYNC_OPERATIONS=5000)
+    def test_large_import_uses_a_constant_number_of_queries(self):
+        user_group_ids(self.user)
+        operations = [{'op': 'create', 'data': {'text': f'row {i}', 'group': self.group.id}} for i in range(2500)]
+        with CaptureQueriesContext(connection) as ctx:
+            statuses, _ = self.bulk(operations)
+        self.assertEqual(statuses, [201] * 2500)
+        # a couple dozen batched INSERTs (SQLite caps each at 999 parameters, 10 per row), not one per row
+        self.assertLess(len(ctx.captured_queries), 35)
+        self.assertEqual(Task.objects.filter(group=self.group).count(), 2500)
+
+    def test_operations_must_be_a_list(self):
+        response = self.client.post(self.url, {'operations': 'all of them'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='ivy', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Polling')
+        self.group.members.add(self.user)
+        self.task = Task.objects.create(group=self.group, text='watch me')
+
+    def assert_revalidates(self, url, change):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        # nothing changed: one cheap query at most, no body
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+        self.assertLessEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(second.content, b'')
+
+        change()
+        third = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], etag)
+
+    def test_task_list_etag_follows_creates_updates_and_deletes(self):
+        url = reverse('task_list') + f'?group={self.group.id}'
+        self.assert_revalidates(url, lambda: Task.objects.create(group=self.group, text='new'))
+        self.assert_revalidates(url, lambda: self.client.put(
+            reverse('task_detail', args=[self.task.id]), {'completed': True}, format='json'))
+        self.assert_revalidates(url, lambda: self.client.delete(reverse('task_detail', args=[self.task.id])))
+
+    def test_group_etags_follow_renames_and_members(self):
+        other = User.objects.create_user(username='jack', password='pw')
+        self.assert_revalidates(reverse('group_list'), lambda: Group.objects.get(pk=self.group.pk).members.add(other))
+        self.assert_revalidates(reverse('group_detail', args=[self.group.id]), lambda: self.client.put(
+            reverse('group_detail', args=[self.group.id]), {'name': 'Renamed'}, format='json'))
+
+    def test_etag_is_per_query(self):
+        response = self.client.get(reverse('task_list'), {'group': self.group.id})
+        other = self.client.get(reverse('task_list'), {'group': self.group.id, 'fields': 'id'},
+                                HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(other.status_code, 200)
+
+
+class TaskEventsTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='kate', password='pw')
+        self.outsider = User.objects.create_user(username='liam', password='pw')
+        self.group = Group.objects.create(name='Live')
+        self.group.members.add(self.user)
+        self.token = Token.objects.create(user=self.user).key
+
+    async def connect(self, token):
+        communicator = WebsocketCommunicator(application, f'/ws/tasks/?token={token}')
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    def commit(self, fn):
+        # TestCase never commits, run the on_commit hooks by hand
+        with self.captureOnCommitCallbacks(execute=True):
+            return fn()
+
+    async def test_subscribers_receive_committed_changes(self):
+        communicator, connected = await self.connect(self.token)
+        self.assertTrue(connected)
+        await communicator.send_json_to({'action': 'subscribe'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'subscribed', 'groups': [self.group.id]})
+
+        task = await database_sync_to_async(self.commit)(
+            lambda: Task.objects.create(group=self.group, text='pushed', priority='high'))
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['type'], 'tasks')
+        self.assertEqual([t['id'] for t in event['saved']], [task.id])
+        self.assertEqual(event['saved'][0]['text'], 'pushed')
+
+        task_id = task.id
+        await database_sync_to_async(self.commit)(task.delete)
+        event = await communicator.receive_json_from()
+        self.assertEqual(event['deleted'], [task_id])
+
+        # removed members stop receiving the group's events
+        await database_sync_to_async(self.commit)(lambda: self.group.members.remove(self.user))
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'subscribed', 'groups': []})
+        await database_sync_to_async(self.commit)(lambda: Task.objects.create(group=self.group, text='quiet'))
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+    async def test_cannot_subscribe_to_foreign_groups_or_connect_anonymously(self):
+        _, connected = await self.connect('bogus')
+        self.assertFalse(connected)
+
+        token = await database_sync_to_async(lambda: Token.objects.create(user=self.outsider).key)()
+        communicator, connected = await self.connect(token)
+        self.assertTrue(connected)
+        await communicator.send_json_to({'action': 'subscribe', 'groups': [self.group.id]})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'subscribed', 'groups': []})
+        await communicator.disconnect()
+
+    def test_moved_tasks_are_deleted_from_the_old_channel(self):
+        other = Group.objects.create(name='Other')
+        other.members.add(self.user)
+        task = Task.objects.create(group=self.group, text='moving')
+
+        def published(change):
+            with mock.patch('tasks.events._send_after_commit') as send:
+                change()
+            return {channel: json.loads(message['text']) for messages in send.call_args_list
+                    for channel, message in messages.args[0]}
+
+        task.group = other
+        events = published(task.save)
+        self.assertEqual(events[group_channel(self.group.id)]['deleted'], [task.id])
+        self.assertEqual([t['id'] for t in events[group_channel(other.id)]['saved']], [task.id])
+
+        # through the bulk endpoint, back to the first group
+        self.client.force_authenticate(self.user)
+        events = published(lambda: self.client.post(reverse('task_bulk'), {'operations': [
+            {'op': 'update', 'id': task.id, 'data': {'group': self.group.id}},
+        ]}, format='json'))
+        self.assertEqual(events[group_channel(other.id)]['deleted'], [task.id])
+        self.assertEqual([t['id'] for t in events[group_channel(self.group.id)]['saved']], [task.id])
+
+
+class AsyncReadViewTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='mia', password='pw')
+        self.group = Group.objects.create(name='Async')
+        self.group.members.add(self.user)
+        Task.objects.bulk_create(Task(group=self.group, text=f'g{i}', priority='low') for i in range(15))
+        Task.objects.bulk_create(Task(user=self.user, text=f'p{i}', priority='high') for i in range(5))
+        self.auth = {'Authorization': f'Token {Token.objects.create(user=self.user).key}'}
+        self.factory = AsyncRequestFactory()
+
+    async def call(self, view, path, data=None, **headers):
+        response = await view(self.factory.get(path, data, headers={**self.auth, **headers}))
+        return response, json.loads(response.content) if response.content else None
+
+    def sync_get(self, path, data=None):
+        return self.client.get(path, data, headers=self.auth).json()
+
+    async def test_async_task_list_matches_the_sync_view(self):
+        url = reverse('task_list')
+        for params in [{}, {'group': self.group.id}, {'group__isnull': 'True'},
+                       {'fields': 'id,text', 'page_size': 7},
+                       {'ordering': '-priority', 'completed': 'false', 'page_size': 7},
+                       {'priority': ['low', 'medium']}]:
+            with self.subTest(params=params):
+                response, data = await self.call(async_views.task_list, url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(data, await sync_to_async(self.sync_get)(url, params))
+
+        # follow the cursor
+        _, data = await self.call(async_views.task_list, url, {'page_size': 7})
+        _, second = await self.call(async_views.task_list, data['next'])
+        self.assertEqual(len(second['results']), 7)
+        response, _ = await self.call(async_views.task_list, url, {'priority': 'urgent'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_async_group_list_and_etag(self):
+        url = reverse('group_list')
+        response, data = await self.call(async_views.group_list, url)
+        self.assertEqual(data, await sync_to_async(self.sync_get)(url))
+        response, _ = await self.call(async_views.group_list, url, **{'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        _, data = await self.call(async_views.group_list, url, {'view': 'summary'})
+        self.assertEqual(data, await sync_to_async(self.sync_get)(url, {'view': 'summary'}))
+
+    async def test_async_views_require_a_token(self):
+        response = await async_views.task_list(self.factory.get(reverse('task_list')))
+        self.assertEqual(response.status_code, 401)
+        response, _ = await self.call(async_views.task_list, reverse('task_list'), {'group': 999})
+        self.assertEqual(response.status_code, 404)
+
+
+class TaskExportTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='nora', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Export')
+        self.group.members.add(self.user)
+        self.url = reverse('task_export')
+
+    def add_tasks(self, count):
+        Task.objects.bulk_create(
+            (Task(group=self.group, text=f'task number {i}', priority='low') for i in range(count)),
+            batch_size=1000,
+        )
+
+    def test_json_export_matches_the_serializer(self):
+        self.add_tasks(5)
+        Task.objects.create(user=self.user, text='personal')
+        response = self.client.get(self.url, {'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        exported = json.loads(b''.join(response.streaming_content))
+        expected = TaskSerializer(Task.objects.order_by('-created_at', '-id'), many=True).data
+        self.assertEqual(exported, json.loads(json.dumps(expected)))
+
+    def test_ndjson_export_with_projection(self):
+        self.add_tasks(3)
+        response = self.client.get(self.url, {'format': 'ndjson', 'fields': 'id,text', 'group': self.group.id})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(set(json.loads(lines[0])), {'id', 'text'})
+
+    def test_empty_export_is_valid_json(self):
+        response = self.client.get(self.url, {'format': 'json'})
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), [])
+
+    def peak_memory(self):
+        response = self.client.get(self.url, {'format': 'ndjson'})
+        tracemalloc.start()
+        consumed = sum(1 for chunk in response.streaming_content)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.assertGreater(consumed, 0)
+        return peak
+
+    def test_peak_memory_does_not_grow_with_the_export(self):
+        self.add_tasks(2000)
+        small = self.peak_memory()
+        self.add_tasks(18000)
+        large = self.peak_memory()
+        # ten times the rows, about the same peak: rows are streamed, not collected
+        self.assertLess(large, small * 2)
+
+
+class TaskExportASGITests(TransactionTestCase):
+    # the ASGI handler runs the view on its own thread and connection, which only sees committed rows
+    def setUp(self):
+        cache.clear()
+        caches['throttle'].clear()
+        self.user = User.objects.create_user(username='nora', password='pw')
+        self.token = Token.objects.create(user=self.user).key
+        Task.objects.bulk_create(Task(user=self.user, text=f'task number {i}') for i in range(3))
+
+    async def test_export_streams_under_asgi(self):
+        # through the ASGI application, as daphne serves it
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http', 'method': 'GET', 'path': reverse('task_export'), 'query_string': b'format=ndjson',
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Token {self.token}'.encode())],
+        })
+        with warnings.catch_warnings():
+            # raised when a sync iterator is read into one list before anything is sent
+            warnings.filterwarnings('error', 'StreamingHttpResponse must consume synchronous iterators')
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output()
+            body = []
+            while True:
+                message = await communicator.receive_output()
+                body.append(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(len(b''.join(body).decode().splitlines()), 3)
+
+
+class ValuesSerializerTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Project')
+        self.group.members.add(self.user)
+        Task.objects.create(user=self.user, text='personal', priority='low')
+        Task.objects.create(group=self.group, text='shared', completed=True, priority='high')
+
+    def test_matches_the_model_serializer(self):
+        tasks = list(Task.objects.order_by('id'))
+        for fields in (None, ('id', 'text'), ('created_at', 'group', 'user'), ('priority',)):
+            serializer = task_values_serializer(fields)
+            rows = Task.objects.order_by('id').values(*serializer.columns)
+            expected = TaskSerializer(tasks, many=True, fields=fields).data
+            self.assertEqual(serializer.to_representation(rows), [dict(task) for task in expected])
+
+    def test_task_list_output_is_unchanged(self):
+        response = self.client.get(reverse('task_list'))
+        tasks = Task.objects.order_by('-created_at', '-id')
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(TaskSerializer(tasks, many=True).data)))
+
+    def test_unsupported_fields_fail_at_compile_time(self):
+        with self.assertRaises(TypeError):
+            ValuesSerializer(GroupSerializer)
+
+    def test_group_list_query_count_does_not_grow_with_groups(self):
+        url = reverse('group_list')
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for i in range(10):
+            group = Group.objects.create(name=f'group {i}')
+            group.members.add(self.user, User.objects.create_user(username=f'member{i}'))
+        cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 11)
+        self.assertEqual(len(many), len(few))
+
+
+class GroupSummaryTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Project')
+        self.group.members.add(self.user, *[User.objects.create_user(username=f'member{i}') for i in range(4)])
+        self.empty = Group.objects.create(name='Empty')
+        self.empty.members.add(self.user)
+        Task.objects.create(group=self.group, text='open')
+        Task.objects.create(group=self.group, text='done', completed=True)
+        self.url = reverse('group_list')
+
+    def test_summary_counts_in_one_query(self):
+        self.client.get(self.url, {'view': 'summary'})  # warm the membership cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'view': 'summary'})
+        summary = {group['name']: group for group in response.data}
+        self.assertEqual(summary['Project']['member_count'], 5)
+        self.assertEqual(summary['Project']['open_task_count'], 1)
+        self.assertIsNotNone(summary['Project']['last_activity_at'])
+        self.assertEqual(summary['Empty'], {'id': self.empty.id, 'name': 'Empty', 'member_count': 1,
+                                            'open_task_count': 0, 'completed_task_count': 0,
+                                            'high_priority_count': 0, 'last_activity_at': None})
+        # versions, task state for the ETag, then the summary itself
+        self.assertEqual(len(queries), 3)
+
+    def test_summary_etag_follows_tasks(self):
+        etag = self.client.get(self.url, {'view': 'summary'})['ETag']
+        task = Task.objects.get(text='open')
+        task.completed = True
+        task.save()
+        response = self.client.get(self.url, {'view': 'summary'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[1]['open_task_count'], 0)
+
+    def test_unknown_view(self):
+        self.assertEqual(self.client.get(self.url, {'view': 'huge'}).status_code, 400)
+
+    def test_members_are_paginated(self):
+        url = reverse('group_members', args=[self.group.id])
+        response = self.client.get(url, {'page_size': 2})
+        names = [member['username'] for member in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            names += [member['username'] for member in response.data['results']]
+        self.assertEqual(names, ['alice', 'member0', 'member1', 'member2', 'member3'])
+
+        outsider = User.objects.create_user(username='mallory')
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class GroupStatsTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client.force_authenticate(self.user)
+        self.groups = [Group.objects.create(name=f'group {i}') for i in range(3)]
+        for group in self.groups:
+            group.members.add(self.user)
+
+    def real_counts(self):
+        counts = {}
+        for group in self.groups:
+            tasks = Task.objects.filter(group=group)
+            counts[group.id] = (tasks.filter(completed=False).count(), tasks.filter(completed=True).count(),
+                                tasks.filter(completed=False, priority='high').count())
+        return counts
+
+    def stored_counts(self):
+        return {
+            stats.group_id: (stats.open_count, stats.completed_count, stats.high_priority_count)
+            for stats in GroupStats.objects.filter(group__in=self.groups)
+        }
+
+    def random_fields(self, rng):
+        return {'completed': rng.random() < 0.4, 'priority': rng.choice(['low', 'medium', 'high']),
+                'group': rng.choice(self.groups).id}
+
+    def test_counters_match_real_counts_after_random_workload(self):
+        rng = random.Random(1337)
+        for step in range(150):
+            # far faster than any client, keep it under the per-token rate limit
+            caches['throttle'].clear()
+            ids = list(Task.objects.filter(group__in=self.groups).values_list('id', flat=True))
+            action = rng.choice(['create', 'update', 'delete', 'bulk'] if ids else ['create', 'bulk'])
+            if action == 'create':
+                response = self.client.post(reverse('task_list'), {'text': f'step {step}', **self.random_fields(rng)},
+                                            format='json')
+                self.assertEqual(response.status_code, 201)
+            elif action == 'update':
+                fields = self.random_fields(rng)
+                data = {name: fields[name] for name in rng.sample(sorted(fields), rng.randint(1, 3))}
+                response = self.client.put(reverse('task_detail', args=[rng.choice(ids)]), data, format='json')
+                self.assertEqual(response.status_code, 200)
+            elif action == 'delete':
+                response = self.client.delete(reverse('task_detail', args=[rng.choice(ids)]))
+                self.assertEqual(response.status_code, 204)
+            else:
+                operations = [{'op': 'create', 'data': {'text': 'bulk', **self.random_fields(rng)}}]
+                if ids:
+                    target = rng.choice(ids)
+                    operations += [{'op': 'update', 'id': target, 'data': self.random_fields(rng)},
+                                   {'op': 'delete', 'id': rng.choice(ids)}]
+                response = self.client.post(reverse('task_bulk'), {'operations': operations}, format='json')
+                self.assertEqual(response.status_code, 200)
+        self.assertTrue(Task.objects.exists())
+        self.assertEqual(self.stored_counts(), self.real_counts())
+
+    def test_recompute_command_repairs_drift(self):
+        Task.objects.create(group=self.groups[0], text='a', priority='high')
+        Task.objects.create(group=self.groups[1], text='b', completed=True)
+        GroupStats.objects.update(open_count=99, completed_count=-3)
+        GroupStats.objects.filter(group=self.groups[2]).delete()
+        out = StringIO()
+        call_command('recompute_group_stats', stdout=out)
+        self.assertIn('Recomputed stats of 3 groups', out.getvalue())
+        self.assertEqual(self.stored_counts(), self.real_counts())
+
+
+class TaskSearchTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Project')
+        self.group.members.add(self.user)
+        foreign = Group.objects.create(name='Foreign')
+        self.personal = Task.objects.create(user=self.user, text='buy milk for the office')
+        self.shared = Task.objects.create(group=self.group, text='milk milk milk: restock the fridge')
+        Task.objects.create(group=self.group, text='write the report')
+        Task.objects.create(group=foreign, text='milk the secret cow')
+        Task.objects.create(user=User.objects.create_user(username='bob'), text='milk for bob')
+        self.url = reverse('task_search')
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [task['id'] for task in response.data['results']]
+
+    def test_results_are_ranked_and_scoped(self):
+        self.assertEqual(self.search(q='milk'), [self.shared.id, self.personal.id])
+        self.assertEqual(self.search(q='milk', group=self.group.id), [self.shared.id])
+        self.assertEqual(self.search(q='milk office'), [self.personal.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.shared.text = 'restock the fridge'
+        self.shared.save()
+        self.assertEqual(self.search(q='milk'), [self.personal.id])
+        self.assertEqual(self.search(q='fridge'), [self.shared.id])
+        self.client.delete(reverse('task_detail', args=[self.personal.id]))
+        self.assertEqual(self.search(q='milk'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search(q='(fridge -milk"', fields='id,text'), [self.shared.id])
+        self.assertEqual(len(self.search(q='milk', page_size=1)), 1)
+        self.assertEqual(self.client.get(self.url, {'q': '  "* '}).status_code, 400)
+
+
+class TokenCacheTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.token = Token.objects.create(user=self.user)
+        self.url = reverse('group_list')
+
+    def get(self, token=None):
+        return self.client.get(self.url, headers={'Authorization': f'Token {(token or self.token).key}'})
+
+    def test_repeated_requests_skip_the_token_query(self):
+        self.assertEqual(self.get().status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get().status_code, 200)
+        self.assertFalse([query for query in queries if 'authtoken_token' in query['sql']])
+
+        cache.clear()
+        with CaptureQueriesContext(connection) as cold:
+            self.get()
+        self.assertEqual(len(cold) - len(queries), 2)  # the token query and the membership query
+
+    def test_deleted_or_rotated_tokens_are_rejected(self):
+        self.get()
+        self.token.delete()
+        self.assertEqual(self.get().status_code, 401)
+        rotated = Token.objects.create(user=self.user)
+        self.assertEqual(self.get(rotated).status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get().status_code, 401)
+
+    async def test_async_paths_share_the_cache(self):
+        self.assertEqual(await get_token_user(self.token.key), self.user)
+        # gone from the table without the signals: only the cache can still know it
+        await sync_to_async(Token.objects.filter(pk=self.token.pk)._raw_delete)(connection.alias)
+        response = await async_views.group_list(
+            AsyncRequestFactory().get(self.url, headers={'Authorization': f'Token {self.token.key}'})
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(SYNCO_PROFILING_SAMPLE_RATE=1.0)
+class ProfilingTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        request_metrics.reset()
+        self.user = User.objects.create_user(username='alice', password='pw')
+        self.admin = User.objects.create_user(username='root', password='pw', is_staff=True)
+        self.group = Group.objects.create(name='Project')
+        self.group.members.add(self.user, self.admin)
+        Task.objects.create(group=self.group, text='task')
+
+    def auth(self, user):
+        return {'Authorization': f'Token {Token.objects.get_or_create(user=user)[0].key}'}
+
+    def test_metrics_per_endpoint(self):
+        headers = self.auth(self.user)
+        for _ in range(3):
+            self.client.get(reverse('group_list'), headers=headers)
+        self.client.get(reverse('task_list'), headers=headers)
+        response = self.client.get(reverse('metrics'), headers=self.auth(self.admin))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('synco_requests_total{endpoint="group_list",method="GET"} 3', body)
+        self.assertIn('synco_request_duration_seconds_bucket{endpoint="task_list",method="GET",le="+Inf"} 1', body)
+        samples = dict(line.rsplit(' ', 1) for line in body.splitlines() if not line.startswith('#'))
+        self.assertGreater(int(samples['synco_db_queries_total{endpoint="group_list",method="GET"}']), 0)
+        self.assertGreater(float(samples['synco_serializer_seconds_total{endpoint="group_list",method="GET"}']), 0)
+        self.assertGreater(int(samples['synco_response_bytes_total{endpoint="task_list",method="GET"}']), 0)
+
+    def test_metrics_and_profiles_are_staff_only(self):
+        self.assertEqual(self.client.get(reverse('metrics'), headers=self.auth(self.user)).status_code, 403)
+        response = self.client.get(reverse('group_list'), {'profile': '1'}, headers=self.auth(self.user))
+        self.assertEqual(response['Content-Type'], 'application/json')
+        response = self.client.get(reverse('group_list'), {'profile': '1'}, headers=self.auth(self.admin))
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn('cumulative', response.content.decode())
+
+    @override_settings(SYNCO_PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_only_timed(self):
+        self.client.get(reverse('group_list'), headers=self.auth(self.user))
+        body = request_metrics.render()
+        self.assertIn('synco_requests_total{endpoint="group_list",method="GET"} 1', body)
+        self.assertNotIn('synco_sampled_requests_total{endpoint="group_list"', body)
+
+
+class SyntheticDataTests(SyncoTestCase):
+    def generate(self, prefix):
+        call_command('generate_synthetic_data', users=12, groups=3, members_per_group=4, tasks_per_group=20,
+                     personal_tasks=2, prefix=prefix, seed=7, tokens=True, stdout=StringIO())
+        # the tasks of this run, newest first
+        return list(Task.objects.order_by('-id')[:84].values_list('text', 'priority', 'completed'))
+
+    def test_generates_the_requested_data_reproducibly(self):
+        first = self.generate('a')
+        self.assertEqual(User.objects.filter(username__startswith='a-user-').count(), 12)
+        self.assertEqual(Token.objects.count(), 12)
+        groups = Group.objects.filter(name__startswith='a group')
+        self.assertEqual(Group.members.through.objects.filter(group__in=groups).count(), 12)
+        self.assertEqual(Task.objects.count(), 3 * 20 + 12 * 2)
+        for stats in GroupStats.objects.filter(group__in=groups):
+            self.assertEqual(stats.open_count + stats.completed_count, 20)
+        self.assertEqual(self.generate('b'), first)
+
+
+class TaskFilterOrderingTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='nora', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Filters')
+        self.group.members.add(self.user)
+        rng = random.Random(7)
+        tasks = [
+            Task(group=self.group if i % 3 else None, user=None if i % 3 else self.user, text=f'task {i}',
+                 priority=rng.choice(['low', 'medium', 'high']), completed=rng.random() < 0.3)
+            for i in range(40)
+        ]
+        Task.objects.bulk_create(tasks)
+        # distinct, shuffled timestamps; a few ties to exercise the id tiebreak
+        self.start = timezone.now() - timedelta(days=1)
+        for task in tasks:
+            task.created_at = self.start + timedelta(minutes=rng.randrange(30))
+        Task.objects.bulk_update(tasks, ['created_at'])
+        self.url = reverse('task_list')
+
+    def collect(self, params):
+        ids, data = [], self.client.get(self.url, params).data
+        while True:
+            ids.extend(task['id'] for task in data['results'])
+            if not data['next']:
+                return ids
+            data = self.client.get(data['next']).data
+
+    def expected(self, rank_sign, tasks=Task.objects.all()):
+        rank = {'low': 1, 'medium': 2, 'high': 3}
+        return [task.id for task in sorted(
+            tasks, key=lambda task: (rank[task.priority], task.created_at, task.id), reverse=rank_sign < 0,
+        )]
+
+    def test_priority_ordering_across_pages(self):
+        self.assertEqual(self.collect({'ordering': '-priority', 'page_size': 6}), self.expected(-1))
+        self.assertEqual(self.collect({'ordering': 'priority', 'page_size': 6}), self.expected(1))
+        open_tasks = Task.objects.filter(group=self.group, completed=False)
+        self.assertEqual(
+            self.collect({'ordering': '-priority', 'completed': 'false', 'group': self.group.id, 'page_size': 4}),
+            self.expected(-1, open_tasks),
+        )
+        ids = self.collect({'ordering': 'created_at', 'page_size': 7})
+        self.assertEqual(ids, list(Task.objects.order_by('created_at', 'id').values_list('id', flat=True)))
+
+    def test_filters(self):
+        def ids(**params):
+            return set(self.collect({'page_size': 500, **params}))
+
+        self.assertEqual(ids(completed='true'), set(Task.objects.filter(completed=True).values_list('id', flat=True)))
+        self.assertEqual(
+            ids(priority=['high', 'low']),
+            set(Task.objects.filter(priority__in=['high', 'low']).values_list('id', flat=True)),
+        )
+        after, before = self.start + timedelta(minutes=10), self.start + timedelta(minutes=20)
+        self.assertEqual(
+            ids(created_at_after=after.isoformat(), created_at_before=before.isoformat()),
+            set(Task.objects.filter(created_at__range=(after, before)).values_list('id', flat=True)),
+        )
+        self.assertEqual(
+            ids(group__isnull='True', completed='false'),
+            set(Task.objects.filter(user=self.user, completed=False).values_list('id', flat=True)),
+        )
+
+    def test_invalid_parameters_are_rejected(self):
+        for params in [{'priority': 'urgent'}, {'created_at_after': 'yesterday'},
+                       {'ordering': 'text'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+        # a cursor from another ordering does not decode
+        data = self.client.get(self.url, {'page_size': 5}).data
+        self.assertEqual(self.client.get(data['next'] + '&ordering=-priority').status_code, 404)
+
+    def test_export_is_filtered_and_ordered(self):
+        response = self.client.get(reverse('task_export'), {'format': 'json', 'ordering': '-priority',
+                                                           'completed': 'false'})
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['id'] for row in rows], self.expected(-1, Task.objects.filter(completed=False)))
+
+    def test_priority_defaults_to_medium(self):
+        response = self.client.post(self.url, {'text': 'no priority given'})
+        self.assertEqual(response.data['priority'], 'medium')
+        self.assertEqual(Task(text='unsaved').priority, 'medium')
+
+    def test_open_task_listings_use_the_partial_indexes(self):
+        plan = (Task.objects.filter(group=self.group, completed=False).annotate(priority_rank=PRIORITY_RANK)
+                .order_by('-priority_rank', '-created_at')[:10].explain())
+        self.assertIn('task_group_open_rank_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        plan = (Task.objects.filter(user=self.user, group=None, completed=False).annotate(priority_rank=PRIORITY_RANK)
+                .order_by('-priority_rank', '-created_at')[:10].explain())
+        self.assertIn('task_user_open_rank_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+@mock.patch.object(TokenRateThrottle, 'THROTTLE_RATES', {'token_burst': '3/min', 'token_sustained': '100/hour'})
+class ThrottleTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice', password='pw')
+        self.bob = User.objects.create_user(username='bob', password='pw')
+        self.tokens = {user: Token.objects.create(user=user).key for user in (self.alice, self.bob)}
+
+    def get(self, user, url=None):
+        return self.client.get(url or reverse('task_list'), headers={'Authorization': f'Token {self.tokens[user]}'})
+
+    def test_requests_are_limited_per_token(self):
+        for _ in range(3):
+            self.assertEqual(self.get(self.alice).status_code, 200)
+        response = self.get(self.alice, reverse('group_list'))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        # other tokens keep their own budget
+        self.assertEqual(self.get(self.bob).status_code, 200)
+
+    async def test_async_views_are_throttled(self):
+        factory = AsyncRequestFactory()
+        headers = {'Authorization': f'Token {self.tokens[self.alice]}'}
+        statuses = [(await async_views.task_list(factory.get(reverse('task_list'), headers=headers))).status_code
+                    for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+
+class CoalescingTests(SyncoTestCase):
+    def test_concurrent_calls_share_one_result(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def read():
+            calls.append(1)
+            release.wait(5)
+            return {'results': []}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('key', read))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for _ in range(500):
+            if flight.shared == 4:
+                break
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+        # nothing is kept once the call is over
+        self.assertEqual(flight.do('key', lambda: 'fresh'), 'fresh')
+
+    def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight()
+        with self.assertRaises(ZeroDivisionError):
+            flight.do('key', lambda: 1 / 0)
+        self.assertEqual(flight.do('key', lambda: 1), 1)
+
+    async def test_identical_async_reads_share_one_page_query(self):
+        user = await User.objects.acreate(username='zoe')
+        group = await Group.objects.acreate(name='Shared')
+        await group.members.aadd(user)
+        await Task.objects.abulk_create(Task(group=group, text=f't{i}') for i in range(10))
+        token = await Token.objects.acreate(user=user)
+        factory = AsyncRequestFactory()
+
+        def request():
+            return async_views.task_list(factory.get(reverse('task_list'), {'group': group.id},
+                                                     headers={'Authorization': f'Token {token.key}'}))
+
+        shared = list_reads.shared
+        responses = await asyncio.gather(*[request() for _ in range(4)])
+        self.assertEqual(list_reads.shared - shared, 3)
+        bodies = {response.content for response in responses}
+        self.assertEqual(len(bodies), 1)
+        self.assertEqual(len(json.loads(bodies.pop())['results']), 10)
+
+        # a read that can see a newer state never joins an older one
+        await Task.objects.acreate(group=group, text='new')
+        response = await request()
+        self.assertEqual(len(json.loads(response.content)['results']), 11)
+
+
+class JobTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='olga', password='pw')
+        self.peer = User.objects.create_user(username='pete', password='pw')
+        self.group = Group.objects.create(name='Doomed')
+        self.group.members.add(self.owner, self.peer)
+        self.other = Group.objects.create(name='Survivor')
+        self.other.members.add(self.owner)
+        Task.objects.bulk_create(Task(group=self.group, text=f't{i}') for i in range(2500))
+        Task.objects.bulk_create(Task(group=self.other, text=f's{i}') for i in range(10))
+        self.client.force_authenticate(self.owner)
+
+    def run_jobs(self):
+        call_command('run_jobs', '--once', stdout=StringIO())
+
+    def job(self, response):
+        self.assertEqual(response.status_code, 202)
+        return self.client.get(response['Location']).data
+
+    def test_group_delete_runs_in_the_background(self):
+        response = self.client.delete(reverse('group_detail', args=[self.group.id]))
+        job = self.job(response)
+        self.assertEqual((job['kind'], job['status']), ('delete_group', 'queued'))
+        # gone for the members right away, the rows go later
+        self.assertEqual(user_group_ids(self.peer), set())
+        self.assertEqual(Task.objects.filter(group=self.group).count(), 2500)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_jobs()
+        # chunked raw DELETEs, never one statement per task
+        self.assertLess(len(ctx.captured_queries), 40)
+        job = self.client.get(reverse('job_detail', args=[job['id']])).data
+        self.assertEqual((job['status'], job['progress'], job['total']), ('succeeded', 2500, 2500))
+        self.assertFalse(Group.objects.filter(pk=self.group.id).exists())
+        self.assertFalse(GroupStats.objects.filter(group_id=self.group.id).exists())
+        self.assertFalse(Task.objects.filter(group_id=self.group.id).exists())
+        self.assertEqual(Task.objects.filter(group=self.other).count(), 10)
+
+    @override_settings(SYNCO_BULK_SYNC_OPERATIONS=100)
+    def test_large_imports_are_queued(self):
+        operations = [{'op': 'create', 'data': {'text': f'row {i}', 'group': self.other.id}} for i in range(150)]
+        operations.append({'op': 'create', 'data': {'text': 'nope', 'group': 999}})
+        open_before = GroupStats.objects.get(group=self.other).open_count
+        job = self.job(self.client.post(reverse('task_bulk'), {'operations': operations}, format='json'))
+        self.run_jobs()
+        job = self.client.get(reverse('job_detail', args=[job['id']])).data
+        self.assertEqual(job['status'], 'succeeded')
+        self.assertEqual([result['status'] for result in job['result']['results']], [201] * 150 + [403])
+        self.assertEqual(Task.objects.filter(group=self.other).count(), 160)
+        self.assertEqual(GroupStats.objects.get(group=self.other).open_count, open_before + 150)
+        # jobs are only visible to whoever started them
+        self.client.force_authenticate(self.peer)
+        self.assertEqual(self.client.get(reverse('job_detail', args=[job['id']])).status_code, 404)
+
+    @override_settings(SYNCO_MEMBERS_SYNC_REMOVALS=10)
+    def test_member_removal_job(self):
+        students = [User(username=f'student{i}') for i in range(30)]
+        User.objects.bulk_create(students)
+        self.group.members.add(*User.objects.filter(username__startswith='student'))
+        user_group_ids(self.peer)
+        url = reverse('group_members', args=[self.group.id])
+        usernames = ['olga', 'pete', 'nobody'] + [f'student{i}' for i in range(20)]
+        job = self.job(self.client.delete(url, {'usernames': usernames}, format='json'))
+        self.run_jobs()
+        job = self.client.get(reverse('job_detail', args=[job['id']])).data
+        self.assertEqual(job['result'], {'removed': 21, 'skipped': ['olga', 'nobody']})
+        self.assertEqual(user_group_ids(self.peer), set())
+        self.assertEqual(self.group.members.count(), 11)
+
+    def test_failures_and_lost_workers(self):
+        job = enqueue('import_tasks', {'operations': []})
+        with self.assertLogs('tasks.jobs', 'ERROR'):
+            self.run_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('no longer exists', job.error)
+
+        # a worker died while running it: claimed again after the lease, failed after the last attempt
+        job = Job.objects.create(kind='delete_group', payload={'group_ids': []}, status=Job.RUNNING, attempts=1,
+                                 locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(claim_job().pk, job.pk)
+        self.assertIsNone(claim_job())
+        Job.objects.filter(pk=job.pk).update(attempts=3, locked_until=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(claim_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+
+class MemberBatchTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.teacher = User.objects.create_user(username='tess', password='pw')
+        self.group = Group.objects.create(name='Class of 300')
+        self.group.members.add(self.teacher)
+        User.objects.bulk_create(User(username=f'kid{i}') for i in range(300))
+        self.client.force_authenticate(self.teacher)
+        self.url = reverse('group_members', args=[self.group.id])
+        user_group_ids(self.teacher)
+
+    def test_onboarding_a_class_is_one_request(self):
+        usernames = [f'kid{i}' for i in range(300)]
+        kid = User.objects.get(username='kid7')
+        self.assertEqual(user_group_ids(kid), set())
+        version = Group.objects.get(pk=self.group.pk).version
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, {'usernames': usernames + ['tess', 'ghost', 'kid0']}, format='json')
+        self.assertEqual(response.status_code, 200)
+        statuses = {result['username']: result['status'] for result in response.data['results']}
+        self.assertEqual(len(response.data['results']), 302)
+        self.assertEqual((statuses['kid0'], statuses['tess'], statuses['ghost']), (201, 200, 404))
+        self.assertEqual(self.group.members.count(), 301)
+        # caches and the version moved once for the batch
+        self.assertEqual(user_group_ids(kid), {self.group.id})
+        self.assertEqual(Group.objects.get(pk=self.group.pk).version, version + 1)
+
+    def test_batch_removal(self):
+        self.group.members.add(*User.objects.filter(username__startswith='kid'))
+        user_group_ids(User.objects.get(username='kid1'))
+        with mock.patch('tasks.membership.publish_membership_revoked') as publish:
+            response = self.client.delete(self.url, {'usernames': ['kid1', 'kid2', 'tess', 'ghost']}, format='json')
+        self.assertEqual([result['status'] for result in response.data['results']], [204, 204, 400, 404])
+        publish.assert_called_once()
+        self.assertEqual(sorted(publish.call_args.args[0]), sorted(
+            User.objects.filter(username__in=['kid1', 'kid2']).values_list('id', flat=True)))
+        self.assertEqual(user_group_ids(User.objects.get(username='kid1')), set())
+        self.assertEqual(self.group.members.count(), 299)
+
+        response = self.client.delete(self.url, {'username': 'kid1'}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_bad_batches(self):
+        for usernames in ['kid1', [1, 2], ['']]:
+            with self.subTest(usernames=usernames):
+                response = self.client.post(self.url, {'usernames': usernames}, format='json')
+                self.assertEqual(response.status_code, 400)
+        with override_settings(SYNCO_MEMBERS_MAX_BATCH=10):
+            response = self.client.post(self.url, {'usernames': [f'kid{i}' for i in range(11)]}, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    def test_bad_username(self):
+        for username in [None, '', {'name': 'kid1'}, ['kid1'], 1]:
+            with self.subTest(username=username):
+                for method in (self.client.post, self.client.delete):
+                    response = method(self.url, {'username': username}, format='json')
+                    self.assertEqual(response.status_code, 400)
+
+
+class PasswordHashingTests(SyncoTestCase):
+    def register(self, username, ip='10.0.0.1'):
+        return self.client.post(reverse('register_user'), {'username': username, 'password': 'long enough'},
+                                REMOTE_ADDR=ip)
+
+    def login(self, username, ip='10.0.0.1'):
+        return self.client.post(reverse('api_token_auth'), {'username': username, 'password': 'long enough'},
+                                REMOTE_ADDR=ip)
+
+    def test_register_and_login(self):
+        self.assertEqual(self.register('carol').status_code, 201)
+        user = User.objects.get(username='carol')
+        self.assertEqual(identify_hasher(user.password).algorithm, 'pbkdf2_sha256')
+        response = self.login('carol')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['token'], Token.objects.get(user=user).key)
+
+    def test_hashes_run_on_the_pool(self):
+        self.assertTrue(run_hash(lambda: threading.current_thread().name).startswith('synco-hash'))
+        with override_settings(SYNCO_HASHER_WORKERS=0):
+            self.assertEqual(run_hash(lambda: threading.current_thread()), threading.current_thread())
+
+    @mock.patch.object(IPRateThrottle, 'THROTTLE_RATES', {'register': '2/min', 'login': '2/min'})
+    def test_throttled_per_ip(self):
+        self.assertEqual([self.register(f'user{i}').status_code for i in range(3)], [201, 201, 429])
+        self.assertEqual(self.register('user3', ip='10.0.0.2').status_code, 201)
+        statuses = [self.login('user0').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(self.login('user0', ip='10.0.0.2').status_code, 200)
+
+    @mock.patch.object(IPRateThrottle, 'THROTTLE_RATES', {'register': '2/min', 'login': '2/min'})
+    def test_forwarded_for_does_not_pick_the_bucket(self):
+        statuses = [self.client.post(reverse('register_user'), {'username': f'user{i}', 'password': 'long enough'},
+                                     REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'203.0.113.{i}').status_code
+                    for i in range(4)]
+        self.assertEqual(statuses, [201, 201, 429, 429])
+
+    @override_settings(SYNCO_HASHER_WORKERS=1, SYNCO_HASHER_QUEUE=0)
+    def test_full_pool_turns_requests_away(self):
+        started, release = threading.Event(), threading.Event()
+        pool = get_pool()
+        busy = threading.Thread(target=pool.run, args=(lambda: started.set() or release.wait(),))
+        busy.start()
+        started.wait()
+        try:
+            response = self.register('dave')
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            self.assertFalse(User.objects.filter(username='dave').exists())
+        finally:
+            release.set()
+            busy.join()
+        self.assertEqual(self.register('dave').status_code, 201)
+
+    @override_settings(PASSWORD_HASHERS=['tasks.hashing.ScryptPasswordHasher', 'tasks.hashing.PBKDF2PasswordHasher'])
+    def test_configured_hasher(self):
+        self.assertEqual(self.register('erin').status_code, 201)
+        self.assertTrue(User.objects.get(username='erin').password.startswith('scrypt$'))
+        # older hashes still verify, and are upgraded on login
+        User.objects.create(username='frank', password=make_password('long enough', hasher='pbkdf2_sha256'))
+        self.assertEqual(self.login('frank').status_code, 200)
+        self.assertTrue(User.objects.get(username='frank').password.startswith('scrypt$'))
+
+
+class GroupSnapshotTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='ivy', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Flat')
+        self.other = Group.objects.create(name='Office')
+        self.group.members.add(self.user)
+        self.other.members.add(self.user)
+        self.dishes = Task.objects.create(group=self.group, text='dishes')
+        self.trash = Task.objects.create(group=self.group, text='trash')
+
+    def snapshot(self, version=None, group=None):
+        params = {} if version is None else {'version': version}
+        response = self.client.get(reverse('group_snapshot', args=[(group or self.group).id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_unchanged_patch_and_full(self):
+        full = self.snapshot()
+        self.assertEqual(full['status'], 'full')
+        self.assertEqual([task['text'] for task in full['tasks']], ['dishes', 'trash'])
+        self.assertEqual(set(full['tasks'][0]), {'id', 'client_id', 'text', 'completed', 'priority', 'created_at'})
+        with self.assertNumQueries(1):
+            self.assertEqual(self.snapshot(full['version']), {'status': 'unchanged', 'version': full['version']})
+
+        self.dishes.completed = True
+        self.dishes.save()
+        trash_id = self.trash.id
+        self.trash.delete()
+        laundry = Task.objects.create(group=self.group, text='laundry')
+        Task.objects.create(group=self.other, text='elsewhere')
+        patch = self.snapshot(full['version'])
+        self.assertEqual(patch['status'], 'patch')
+        self.assertEqual(patch['version'], full['version'] + 3)
+        self.assertEqual([task['id'] for task in patch['changed']], [self.dishes.id, laundry.id])
+        self.assertTrue(patch['changed'][0]['completed'])
+        self.assertEqual(patch['deleted'], [trash_id])
+
+        # a version the server never issued, e.g. after a restore
+        self.assertEqual(self.snapshot(patch['version'] + 10)['status'], 'full')
+        with self.settings(SYNCO_SYNC_MAX_CHANGES=2):
+            self.assertEqual(self.snapshot(full['version'])['status'], 'full')
+
+    def test_moved_tasks_leave_the_old_group(self):
+        version, other_version = self.snapshot()['version'], self.snapshot(group=self.other)['version']
+        response = self.client.put(reverse('task_detail', args=[self.dishes.id]), {'group': self.other.id},
+                                   format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.snapshot(version)['deleted'], [self.dishes.id])
+        self.assertEqual([task['id'] for task in self.snapshot(other_version, self.other)['changed']],
+                         [self.dishes.id])
+        # the delta sync of the old group sees it go too, the user-wide one only sees the change
+        changes = reverse('task_changes')
+        token = encode_token(timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.client.get(changes, {'since': token, 'group': self.group.id}).data['deleted'],
+                         [self.dishes.id])
+        self.assertEqual(self.client.get(changes, {'since': token}).data['deleted'], [])
+
+    def test_bulk_writes_are_versioned(self):
+        version = self.snapshot()['version']
+        response = self.client.post(reverse('task_bulk'), {'operations': [
+            {'op': 'create', 'data': {'text': 'mop', 'group': self.group.id}},
+            {'op': 'update', 'id': self.dishes.id, 'data': {'text': 'dishes!'}},
+            {'op': 'update', 'id': self.trash.id, 'data': {'group': self.other.id}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        patch = self.snapshot(version)
+        self.assertEqual(patch['version'], version + 1)
+        self.assertEqual([task['text'] for task in patch['changed']], ['dishes!', 'mop'])
+        self.assertEqual(patch['deleted'], [self.trash.id])
+
+    def test_purged_tombstones_force_a_full_snapshot(self):
+        version = self.snapshot()['version']
+        self.trash.delete()
+        self.assertEqual(self.snapshot(version)['status'], 'patch')
+        TaskTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=90))
+        call_command('purge_tombstones', stdout=StringIO())
+        self.assertEqual(self.snapshot(version)['status'], 'full')
+        self.assertEqual(self.snapshot(version + 1)['status'], 'unchanged')
+
+    def test_members_only(self):
+        stranger = Group.objects.create(name='Not mine')
+        response = self.client.get(reverse('group_snapshot', args=[stranger.id]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('group_snapshot', args=[self.group.id]), {'version': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ClientIdTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='jo', password='pw')
+        self.client.force_authenticate(self.user)
+        self.group = Group.objects.create(name='Shared')
+        self.group.members.add(self.user)
+
+    def bulk(self, *operations):
+        response = self.client.post(reverse('task_bulk'), {'operations': list(operations)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_replayed_writes_apply_once(self):
+        client_id = '0b7f7c56-8a53-4c4e-9a8b-7f5d0e3d2c11'
+        create = {'op': 'create', 'client_id': client_id, 'data': {'text': 'offline', 'group': self.group.id}}
+        first, = self.bulk(create)
+        self.assertEqual(first['status'], 201)
+        self.assertEqual(first['data']['client_id'], client_id)
+        replay, update = self.bulk(create, {'op': 'update', 'client_id': client_id, 'data': {'completed': True}})
+        self.assertEqual((replay['status'], replay['data']['id']), (200, first['data']['id']))
+        self.assertEqual(update['status'], 200)
+        task = Task.objects.get(client_id=client_id)
+        self.assertTrue(task.completed)
+
+        delete, again = self.bulk({'op': 'delete', 'client_id': client_id}, {'op': 'delete', 'client_id': client_id})
+        self.assertEqual(delete['status'], 204)
+        self.assertEqual(Task.objects.filter(group=self.group).count(), 0)
+        missing, = self.bulk({'op': 'delete', 'client_id': client_id})
+        self.assertEqual(missing, {'status': 404, 'client_id': client_id})
+
+    def test_client_ids_of_other_users(self):
+        client_id = '6f1d2a40-1111-4a4a-8b8b-000000000001'
+        Task.objects.create(user=User.objects.create_user(username='kim', password='pw'), text='theirs',
+                            client_id=client_id)
+        result, duplicate_a, duplicate_b = self.bulk(
+            {'op': 'create', 'client_id': client_id, 'data': {'text': 'mine'}},
+            {'op': 'create', 'client_id': '6f1d2a40-1111-4a4a-8b8b-000000000002', 'data': {'text': 'a'}},
+            {'op': 'create', 'client_id': '6f1d2a40-1111-4a4a-8b8b-000000000002', 'data': {'text': 'b'}},
+        )
+        self.assertEqual(result['status'], 409)
+        self.assertEqual((duplicate_a['status'], duplicate_b['status']), (201, 400))
+        self.assertEqual(self.bulk({'op': 'update', 'client_id': client_id, 'data': {'text': 'x'}})[0]['status'], 404)
+
+
+class IdempotencyKeyTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='jo', password='pw')
+        self.client.force_authenticate(self.user)
+        self.url = reverse('task_list')
+
+    def post(self, data, key='retry-1'):
+        return self.client.post(self.url, data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_gets_the_stored_response(self):
+        first = self.post({'text': 'once'})
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(1):
+            retry = self.post({'text': 'once'})
+        self.assertEqual((retry.status_code, retry.data), (201, first.data))
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 1)
+        # keys are per request: another key, or none, creates again
+        self.assertEqual(self.post({'text': 'once'}, key='retry-2').status_code, 201)
+        self.assertEqual(self.client.post(self.url, {'text': 'once'}, format='json').status_code, 201)
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 3)
+
+    def test_key_reused_for_another_request(self):
+        self.post({'text': 'once'})
+        self.assertEqual(self.post({'text': 'other'}).status_code, 422)
+        self.assertEqual(self.post({'text': 'x'}, key='').status_code, 400)
+        # another user's keys are their own
+        self.client.force_authenticate(User.objects.create_user(username='kim', password='pw'))
+        self.assertEqual(self.post({'text': 'other'}).status_code, 201)
+
+    def test_errors_are_not_stored(self):
+        self.assertEqual(self.post({'text': ''}).status_code, 400)
+        self.assertEqual(self.post({'text': 'fixed'}).status_code, 201)
+
+    def test_expired_keys(self):
+        self.post({'text': 'once'})
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.post({'text': 'once'}).status_code, 201)
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 2)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_idempotency_keys(), 1)
+
+    def test_concurrent_request_with_the_same_key(self):
+        # the other request commits its key after our lookup: ours is undone and answers with its response
+        original = idempotency._stored
+        calls = []
+
+        def stored(user, key):
+            calls.append(key)
+            if len(calls) == 1:
+                other = Task.objects.create(user=user, text='first')
+                IdempotencyKey.objects.create(user=user, key=key, fingerprint='same', status_code=201,
+                                              response={'id': other.id})
+                return None
+            return original(user, key)
+
+        with mock.patch.object(idempotency, '_stored', stored), \
+                mock.patch.object(idempotency, '_fingerprint', return_value='same'):
+            response = self.post({'text': 'once'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'id': Task.objects.get(user=self.user).id})
+
+    def test_bulk_and_groups(self):
+        operations = {'operations': [{'op': 'create', 'data': {'text': 'bulk'}}]}
+        for _ in range(2):
+            response = self.client.post(reverse('task_bulk'), operations, format='json', HTTP_IDEMPOTENCY_KEY='b')
+            self.assertEqual(response.status_code, 200)
+        for _ in range(2):
+            response = self.client.post(reverse('group_list'), {'name': 'Once'}, format='json',
+                                        HTTP_IDEMPOTENCY_KEY='g')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Task.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Group.objects.filter(name='Once').count(), 1)
+
+
+class TaskVersionTests(SyncoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='jo', password='pw')
+        self.client.force_authenticate(self.user)
+        self.task = Task.objects.create(user=self.user, text='milk')
+        self.url = reverse('task_detail', args=[self.task.id])
+
+    def put(self, data, **headers):
+        return self.client.put(self.url, data, format='json', **headers)
+
+    def test_etag_is_the_version(self):
+        response = self.client.get(self.url)
+        self.assertEqual((response['ETag'], response.data['version']), ('"0"', 0))
+        response = self.put({'completed': True}, HTTP_IF_MATCH='"0"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response['ETag'], response.data['version']), ('"1"', 1))
+        # writes without If-Match still bump it
+        self.assertEqual(self.put({'text': 'oat milk'})['ETag'], '"2"')
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.version, self.task.text, self.task.completed), (2, 'oat milk', True))
+
+    def test_stale_version_is_refused(self):
+        self.put({'completed': True})
+        response = self.put({'text': 'lost update'}, HTTP_IF_MATCH='"0"')
+        self.assertEqual(response.status_code, 412)
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.text, self.task.version), ('milk', 1))
+        self.assertEqual(self.put({'text': 'x'}, HTTP_IF_MATCH='W/"1"').status_code, 400)
+        self.assertEqual(self.put({'text': 'any'}, HTTP_IF_MATCH='*').status_code, 200)
+
+    def test_checked_by_the_update(self):
+        # no read of the version before the write: the same queries as an unconditional PUT
+        with CaptureQueriesContext(connection) as unconditional:
+            self.put({'completed': True})
+        with CaptureQueriesContext(connection) as conditional:
+            self.put({'completed': False}, HTTP_IF_MATCH='"1"')
+        self.assertEqual(len(conditional.captured_queries), len(unconditional.captured_queries))
+        update, = [q['sql'] for q in conditional.captured_queries if q['sql'].startswith('UPDATE "tasks_task"')]
+        self.assertIn('"version" = 1', update.replace('"tasks_task".', ''))
+
+    def test_concurrent_writer_between_read_and_write(self):
+        mine = Task.objects.get(pk=self.task.pk)
+        Task.objects.get(pk=self.task.pk).save()
+        mine.completed = True
+        with self.assertRaises(VersionConflict):
+            mine.save(if_version=mine.version)
+        # the rolled back write left the counters alone
+        self.assertFalse(Task.objects.get(pk=self.task.pk).completed)
+
+    def test_bulk_updates_bump_the_version(self):
+        response = self.client.post(reverse('task_bulk'), {'operations': [
+            {'op': 'update', 'id': self.task.id, 'data': {'completed': True}},
+        ]}, format='json')
+        self.assertEqual(response.data['results'][0]['data']['version'], 1)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.version, 1)
+
+    def test_bulk_updates_of_one_task(self):
+        response = self.client.post(reverse('task_bulk'), {'operations': [
+            {'op': 'update', 'id': self.task.id, 'data': {'completed': True}},
+            {'op': 'update', 'id': self.task.id, 'data': {'text': 'oat milk'}},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['data']['version'] for r in response.data['results']], [1, 1])
+        self.task.refresh_from_db()
+        self.assertEqual((self.task.version, self.task.completed, self.task.text), (1, True, 'oat milk'))
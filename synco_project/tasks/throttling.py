@@ -0,0 +1,50 @@
+"""
+Rate limits for the API: per token, and per client IP on the endpoints that hash
+a password (registration and obtain_auth_token).
+
+Counters live in the 'throttle' cache (per process with locmem, shared with
+REDIS_URL). Requests without a token fall back to the user id for session
+logins; anonymous requests are left to the views' own throttles.
+"""
+from django.core.cache import caches
+from rest_framework.throttling import SimpleRateThrottle
+
+from .authentication import token_digest
+
+
+class TokenRateThrottle(SimpleRateThrottle):
+    cache = caches['throttle']
+
+    def get_cache_key(self, request, view):
+        auth = getattr(request, 'auth', None)
+        if auth is not None and hasattr(auth, 'key'):
+            ident = 'token:' + token_digest(auth.key)
+        elif request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            return None
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+
+class TokenBurstRateThrottle(TokenRateThrottle):
+    scope = 'token_burst'
+
+
+class TokenSustainedRateThrottle(TokenRateThrottle):
+    scope = 'token_sustained'
+
+
+class IPRateThrottle(SimpleRateThrottle):
+    # keyed on REMOTE_ADDR, or with NUM_PROXIES set on the X-Forwarded-For entry added by our proxy
+    cache = caches['throttle']
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': self.get_ident(request)}
+
+
+class RegisterRateThrottle(IPRateThrottle):
+    scope = 'register'
+
+
+class LoginRateThrottle(IPRateThrottle):
+    scope = 'login'
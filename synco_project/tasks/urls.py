@@ -1,14 +1,24 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-from rest_framework.authtoken.views import obtain_auth_token
+from . import async_views, views
+
+# the read-heavy list endpoints can be served by their async versions under ASGI
+list_views = async_views if settings.SYNCO_ASYNC_READ_VIEWS else views
 
 urlpatterns = [
-    path('tasks/', views.task_list, name='task_list'),
+    path('tasks/', list_views.task_list, name='task_list'),
+    path('tasks/changes/', views.task_changes, name='task_changes'),
+    path('tasks/bulk/', views.task_bulk, name='task_bulk'),
+    path('tasks/export/', views.task_export, name='task_export'),
+    path('tasks/search/', views.task_search, name='task_search'),
     path('tasks/<int:pk>/', views.task_detail, name='task_detail'),
-    path('groups/', views.group_list, name='group_list'),
+    path('groups/', list_views.group_list, name='group_list'),
     path('groups/<int:pk>/', views.group_detail, name='group_detail'), 
-    path('api-token-auth/', obtain_auth_token, name='api_token_auth'),
+    path('groups/<int:pk>/snapshot/', views.group_snapshot, name='group_snapshot'),
+    path('api-token-auth/', views.obtain_auth_token, name='api_token_auth'),
     path('register/', views.register_user, name='register_user'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('jobs/<int:pk>/', views.job_detail, name='job_detail'),
 
     # URL for managing group members
     path('groups/<int:pk>/members/', views.group_members, name='group_members'),
@@ -1,39 +1,197 @@
+import operator
+from functools import reduce
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework.decorators import api_view, permission_classes
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, IntegerField, Max, OuterRef, Prefetch, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.authtoken import views as authtoken_views
+from rest_framework.decorators import api_view, permission_classes, renderer_classes, throttle_classes
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Task, Group
-from .serializers import TaskSerializer, GroupSerializer
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from .models import PRIORITY_RANK, Task, Group, Job, TaskTombstone, VersionConflict
+from .filters import filter_tasks
+from .serializers import (TaskSerializer, GroupSerializer, GroupSummarySerializer, JobSerializer, UserSerializer,
+                          ValuesSerializer, task_values_serializer)
 from .permissions import IsOwnerOrGroupMember
+from .pagination import MemberCursorPagination, TaskCursorPagination
+from .membership import add_members, is_member, remove_members, request_group_ids
+from .jobs import enqueue
+from .profiling import metrics as request_metrics
+from .bulk import apply_task_operations
+from .snapshots import build_snapshot
+from .search import MAX_RESULT_LIMIT, RESULT_LIMIT, search_tasks
+from .export import NDJSONRenderer, async_chunks, stream_json, stream_ndjson, task_rows
+from .coalesce import list_reads
+from .conditional import (add_etag, group_etag, group_versions, if_match_version, make_etag, not_modified, task_etag,
+                          task_state)
+from .idempotency import idempotent
+from .throttling import LoginRateThrottle, RegisterRateThrottle
+from .sync import InvalidSyncToken, changes_window_start, decode_token, new_token, token_expired
 from django.db.models import Q
 
+
+def _requested_task_fields(params):
+    # parse the optional ?fields=id,text,... projection, None means all fields
+    raw = params.get('fields')
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = set(fields) - set(TaskSerializer.Meta.fields)
+    if unknown:
+        raise ValueError(', '.join(sorted(unknown)))
+    return fields
+
+
+def _fields_key(fields):
+    # hashable form of a projection, for task_values_serializer
+    return None if fields is None else tuple(fields)
+
+
+def _task_columns(serializer, ordering):
+    # the serializer's columns plus the sort columns the cursor is built from
+    columns = list(serializer.columns)
+    columns += [column for column in _sort_columns(ordering) if column not in columns]
+    return columns
+
+
+def _sort_columns(ordering):
+    return [key.lstrip('-') for key in ordering]
+
+
+def _sortable(tasks, ordering):
+    # the priority orderings sort on the indexed PRIORITY_RANK expression
+    if 'priority_rank' in _sort_columns(ordering):
+        return tasks.annotate(priority_rank=PRIORITY_RANK)
+    return tasks
+
+
+def _unknown_ordering(request):
+    return Response({'error': f"Unknown ordering: {request.query_params.get('ordering')}"},
+                    status=status.HTTP_400_BAD_REQUEST)
+
+
+def _task_scope(request):
+    # Q for the tasks selected by ?group= / ?group__isnull=True (default: all visible
+    # tasks), or None when the user is not a member of the requested group.
+    # Works on Task and TaskTombstone, which share user_id / group_id
+    group_id = request.query_params.get('group')
+    personal = Q(user_id=request.user.pk, group_id__isnull=True)
+    if request.query_params.get('group__isnull') == 'True':
+        return personal
+    if group_id:
+        if not group_id.isdigit() or not is_member(request, group_id):
+            return None
+        return Q(group_id=group_id)
+    return personal | Q(group_id__in=sorted(request_group_ids(request)))
+
+
+def _members_prefetch():
+    # only what UserSerializer returns
+    return Prefetch('members', queryset=User.objects.only('id', 'username'))
+
+
+GROUP_LIST_VIEWS = ('full', 'summary')
+
+_group_summary_serializer = ValuesSerializer(GroupSummarySerializer)
+
+
+def _per_group(queryset, aggregate):
+    # correlated subquery computing aggregate over queryset's rows of the outer group
+    rows = queryset.filter(group_id=OuterRef('pk')).order_by().values('group_id')
+    return Subquery(rows.annotate(value=aggregate).values('value'))
+
+
+def _count_per_group(queryset):
+    return Coalesce(_per_group(queryset, Count('*')), Value(0), output_field=IntegerField())
+
+
+def _group_summaries(group_ids):
+    """
+    values() rows for ?view=summary, all computed in one query. The task counts
+    come from GroupStats, the rest from correlated subqueries, so the members and
+    tasks joins never multiply each other.
+    """
+    return Group.objects.filter(id__in=group_ids).order_by('name', 'id').values(
+        'id', 'name',
+        member_count=_count_per_group(Group.members.through.objects.all()),
+        open_task_count=Coalesce('stats__open_count', 0),
+        completed_task_count=Coalesce('stats__completed_count', 0),
+        high_priority_count=Coalesce('stats__high_priority_count', 0),
+        last_activity_at=_per_group(Task.objects.all(), Max('updated_at')),
+    )
+
+
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def task_list(request):
     """
     List tasks based on group selection, or create a new task.
+    A create sent with an Idempotency-Key header runs once (tasks.idempotency).
+    Lists are cursor-paginated, newest first unless ?ordering= is created_at, -priority
+    or priority; pass ?fields=a,b to limit the returned fields. See TaskFilter for
+    the ?completed=, ?priority= and ?created_at_after= / ?created_at_before= filters.
     """
     if request.method == 'GET':
         group_id = request.query_params.get('group')
         is_personal_group = request.query_params.get('group__isnull') == 'True'
 
+        personal_tasks = Task.objects.filter(user=request.user, group__isnull=True)
         if is_personal_group:
-            tasks = Task.objects.filter(user=request.user, group__isnull=True)
+            tasks = [personal_tasks]
+            scope = ('user', request.user.pk)
         elif group_id:
-            try:
-                group = Group.objects.get(id=group_id, members=request.user)
-                tasks = Task.objects.filter(group=group)
-            except Group.DoesNotExist:
+            if not group_id.isdigit() or not is_member(request, group_id):
                 return Response({"error": "Group not found or you are not a member."},
                                 status=status.HTTP_404_NOT_FOUND)
+            tasks = [Task.objects.filter(group_id=group_id)]
+            # the same for every member, so their reads can be coalesced
+            scope = ('group', int(group_id))
         else:
-            personal_tasks = Task.objects.filter(user=request.user, group__isnull=True)
-            group_tasks = Task.objects.filter(group__members=request.user)
-            tasks = (personal_tasks | group_tasks).distinct()
+            # personal and group tasks never overlap, so a UNION ALL of two indexed
+            # branches replaces the OR over the members join and its DISTINCT.
+            # the group ids come from the membership cache, not the members table
+            tasks = [personal_tasks]
+            group_ids = request_group_ids(request)
+            if group_ids:
+                tasks.append(Task.objects.filter(group_id__in=sorted(group_ids)))
+            scope = ('user', request.user.pk, group_ids)
+
+        try:
+            fields = _requested_task_fields(request.query_params)
+        except ValueError as e:
+            return Response({'error': f'Unknown fields: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        ordering = TaskCursorPagination.get_ordering(request)
+        if ordering is None:
+            return _unknown_ordering(request)
+        tasks = filter_tasks(request.query_params, tasks)
+
+        # an unchanged collection is answered before anything is fetched or serialized
+        state = task_state(reduce(operator.or_, tasks))
+        etag = make_etag(request, *state)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        def read_page():
+            # read-only, so rows come from values() and skip model instances and the
+            # per-field serializer machinery; the cursor always needs the sort columns
+            serializer = task_values_serializer(_fields_key(fields))
+            branches = [_sortable(branch, ordering).values(*_task_columns(serializer, ordering)) for branch in tasks]
+            paginator = TaskCursorPagination()
+            page = paginator.paginate_queryset(branches, request, ordering=ordering)
+            return paginator.get_paginated_data(serializer.to_representation(page))
 
-        serializer = TaskSerializer(tasks.order_by('-created_at'), many=True)
-        return Response(serializer.data)
+        # concurrent identical reads of an unchanged collection share one query
+        data = list_reads.do(('tasks', scope, request.build_absolute_uri(), state), read_page)
+        return add_etag(Response(data), etag)
 
     elif request.method == 'POST':
         # Corrected all typos in this block
@@ -42,7 +200,7 @@ def task_list(request):
             # if the group is provided set the task's group and set user to null
             group = serializer.validated_data.get('group')
             if group:
-                if request.user not in group.members.all():
+                if not is_member(request, group):
                     return Response({'error': 'You do not have permission to add tasks to this group.'},
                                     status=status.HTTP_403_FORBIDDEN)
                 # set user to null if task belongs to a group
@@ -52,27 +210,189 @@ def task_list(request):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def task_changes(request):
+    """
+    Return the tasks created, updated or deleted since ?since=<token>, and a new token.
+    Without a token only a fresh token is returned; take it before loading the full list.
+    Accepts the same ?group= / ?group__isnull=True scoping as task_list.
+    """
+    # take the new token before reading, anything later shows up in the next delta
+    token = new_token()
+    since = request.query_params.get('since')
+    if not since:
+        return Response({'token': token, 'reset': True, 'changed': [], 'deleted': []})
+    try:
+        since = decode_token(since)
+    except InvalidSyncToken:
+        return Response({'error': 'Invalid sync token.'}, status=status.HTTP_400_BAD_REQUEST)
+    if token_expired(since):
+        return Response({'token': token, 'reset': True, 'changed': [], 'deleted': []})
+
+    scope = _task_scope(request)
+    if scope is None:
+        return Response({"error": "Group not found or you are not a member."},
+                        status=status.HTTP_404_NOT_FOUND)
+
+    start = changes_window_start(since)
+    limit = settings.SYNCO_SYNC_MAX_CHANGES
+    changed = list(Task.objects.filter(scope, updated_at__gt=start).order_by('updated_at', 'id')[:limit + 1])
+    deleted = list(TaskTombstone.objects.filter(scope, deleted_at__gt=start)
+                   .values_list('task_id', flat=True)[:limit + 1])
+    if len(changed) + len(deleted) > limit:
+        # cheaper for the client to reload everything
+        return Response({'token': token, 'reset': True, 'changed': [], 'deleted': []})
+
+    # a task moved between groups leaves a tombstone in the old one
+    changed_ids = {task.pk for task in changed}
+    return Response({
+        'token': token,
+        'reset': False,
+        'changed': TaskSerializer(changed, many=True).data,
+        'deleted': [task_id for task_id in deleted if task_id not in changed_ids],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([JSONRenderer, NDJSONRenderer])
+def task_export(request):
+    """
+    Stream every task visible to the user as ?format=json (one array) or ?format=ndjson
+    (one task per line). Same ?group= / ?group__isnull=True / ?fields= / ?ordering= options
+    and filters as task_list, without pagination. Memory use does not grow with the number of tasks.
+    """
+    scope = _task_scope(request)
+    if scope is None:
+        return Response({"error": "Group not found or you are not a member."},
+                        status=status.HTTP_404_NOT_FOUND)
+    try:
+        fields = _requested_task_fields(request.query_params)
+    except ValueError as e:
+        return Response({'error': f'Unknown fields: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+    ordering = TaskCursorPagination.get_ordering(request)
+    if ordering is None:
+        return _unknown_ordering(request)
+
+    tasks, = filter_tasks(request.query_params, [Task.objects.filter(scope)])
+    rows = task_rows(_sortable(tasks, ordering).order_by(*ordering), fields)
+    if request.accepted_renderer.format == 'ndjson':
+        chunks, content_type = stream_ndjson(rows), 'application/x-ndjson'
+    else:
+        chunks, content_type = stream_json(rows), 'application/json'
+    if isinstance(request._request, ASGIRequest):
+        chunks = async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="tasks.{request.accepted_renderer.format}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def task_search(request):
+    """
+    Full-text search: the tasks whose text matches ?q=, best match first.
+    Same ?group= / ?group__isnull=True / ?fields= options as task_list;
+    ?page_size= caps the number of results (default 50, at most 200).
+    """
+    scope = _task_scope(request)
+    if scope is None:
+        return Response({"error": "Group not found or you are not a member."},
+                        status=status.HTTP_404_NOT_FOUND)
+    try:
+        fields = _requested_task_fields(request.query_params)
+    except ValueError as e:
+        return Response({'error': f'Unknown fields: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(max(int(request.query_params.get('page_size', RESULT_LIMIT)), 1), MAX_RESULT_LIMIT)
+    except ValueError:
+        limit = RESULT_LIMIT
+
+    tasks = search_tasks(Task.objects.filter(scope), request.query_params.get('q', ''))
+    if tasks is None:
+        return Response({'error': 'A search query (?q=) is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    serializer = task_values_serializer(_fields_key(fields))
+    rows = list(tasks.values(*serializer.columns)[:limit])
+    return Response({'results': serializer.to_representation(rows)})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def task_bulk(request):
+    """
+    Apply a list of task operations in one transaction:
+    {"operations": [{"op": "create", "data": {...}}, {"op": "update", "id": 1, "data": {...}},
+                    {"op": "delete", "id": 2}]}
+    Operations can carry a client_id, for clients replaying offline writes (see apply_task_operations).
+    Returns one result per operation, in the same order. Batches of more than
+    SYNCO_BULK_SYNC_OPERATIONS are queued instead: 202 with the job, whose result holds them.
+    """
+    operations = request.data.get('operations') if isinstance(request.data, dict) else None
+    if not isinstance(operations, list):
+        return Response({'error': 'A list of operations is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(operations) > settings.SYNCO_BULK_MAX_OPERATIONS:
+        return Response({'error': f'At most {settings.SYNCO_BULK_MAX_OPERATIONS} operations per request.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if len(operations) > settings.SYNCO_BULK_SYNC_OPERATIONS:
+        return _job_accepted(request, enqueue('import_tasks', {'operations': operations}, user=request.user,
+                                              total=len(operations)))
+    try:
+        results = apply_task_operations(request.user, request_group_ids(request), operations)
+    except IntegrityError:
+        # another request created a task with one of these client_ids meanwhile;
+        # a retry finds it and answers 200 for that create
+        return Response({'error': 'A concurrent request wrote the same tasks, retry the batch.'},
+                        status=status.HTTP_409_CONFLICT)
+    return Response({'results': results})
+
+def _with_task_etag(response, task):
+    # the version alone: the same representation for every user who may see the task
+    response['ETag'] = task_etag(task)
+    return response
+
 # The task_detail view is correct
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated, IsOwnerOrGroupMember])
 def task_detail(request, pk):
     """
     Retrieve, update, or delete a task.
+    The ETag is the task's version. A PUT with If-Match: "<version>" is only applied
+    if the task is still at that version, 412 otherwise.
     """
     try:
         task = Task.objects.get(pk=pk)
     except Task.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
+    # function views don't run object permissions on their own
+    if not IsOwnerOrGroupMember().has_object_permission(request, None, task):
+        return Response({'error': 'You do not have permission to modify this task.'},
+                        status=status.HTTP_403_FORBIDDEN)
+
     if request.method == 'GET':
         serializer = TaskSerializer(task)
-        return Response(serializer.data)
+        return _with_task_etag(Response(serializer.data), task)
 
     elif request.method == 'PUT':
+        try:
+            if_version = if_match_version(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = TaskSerializer(task, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
+            new_group = serializer.validated_data.get('group')
+            if new_group and new_group.pk != task.group_id and not is_member(request, new_group):
+                return Response({'error': 'You do not have permission to move tasks to this group.'},
+                                status=status.HTTP_403_FORBIDDEN)
+            for name, value in serializer.validated_data.items():
+                setattr(task, name, value)
+            try:
+                # compared by the UPDATE itself, so no write between our read and it is lost
+                task.save(if_version=if_version)
+            except VersionConflict:
+                return Response({'error': 'The task was changed or deleted since that version, reload it.'},
+                                status=status.HTTP_412_PRECONDITION_FAILED)
+            return _with_task_etag(Response(serializer.data), task)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'DELETE':
@@ -81,14 +401,35 @@ def task_detail(request, pk):
 
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def group_list(request):
     """
     List all groups for the authenticated user, or create a new group.
+    ?view=summary lists counts instead of members; members are on groups/<pk>/members/.
     """
     if request.method == 'GET':
-        groups = Group.objects.filter(members=request.user).distinct()
-        serializer = GroupSerializer(groups, many=True)
-        return Response(serializer.data)
+        view = request.query_params.get('view', 'full')
+        if view not in GROUP_LIST_VIEWS:
+            return Response({'error': f'Unknown view: {view}'}, status=status.HTTP_400_BAD_REQUEST)
+        group_ids = request_group_ids(request)
+        versions = group_versions(group_ids)
+        # task counts and activity change without bumping the group version
+        state = task_state(Task.objects.filter(group_id__in=group_ids)) if view == 'summary' else ()
+        etag = make_etag(request, versions, *state)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        def read_groups():
+            if view == 'summary':
+                return _group_summary_serializer.to_representation(list(_group_summaries(group_ids)))
+            # one query for all members instead of one per group
+            groups = Group.objects.filter(id__in=group_ids).prefetch_related(_members_prefetch())
+            return GroupSerializer(groups, many=True).data
+
+        # the same for every user of these groups, concurrent identical reads share one query
+        data = list_reads.do(('groups', view, versions, state), read_groups)
+        return add_etag(Response(data), etag)
 
     elif request.method == 'POST':
         # ✨ CORRECTED: Use GroupSerializer here to create a new group
@@ -111,13 +452,17 @@ def group_detail(request, pk):
     except Group.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    if request.user not in group.members.all():
+    if not is_member(request, group):
         return Response({'error': 'You do not have permission to access this group.'},
                         status=status.HTTP_403_FORBIDDEN)
 
     if request.method == 'GET':
+        etag = group_etag(request, group)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
         serializer = GroupSerializer(group)
-        return Response(serializer.data)
+        return add_etag(Response(serializer.data), etag)
 
     elif request.method == 'PUT':
         serializer = GroupSerializer(group, data=request.data, partial=True)
@@ -127,12 +472,33 @@ def group_detail(request, pk):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'DELETE':
-        group.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        # without members the group is gone for everyone at once; its tasks are
+        # deleted in the background (tasks.jobs.delete_groups)
+        with transaction.atomic():
+            group.members.clear()
+            job = enqueue('delete_group', {'group_ids': [group.pk]}, user=request.user)
+        return _job_accepted(request, job)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def group_snapshot(request, pk):
+    """
+    The group's tasks as a versioned snapshot, for clients that cache them offline.
+    ?version=<n> is the version the client holds; the answer is "unchanged", a "patch"
+    from n or the "full" document, always with the current version (tasks.snapshots).
+    """
+    if not is_member(request, pk):
+        return Response({"error": "Group not found or you are not a member."},
+                        status=status.HTTP_404_NOT_FOUND)
+    version = request.query_params.get('version')
+    if version is not None and not version.isdigit():
+        return Response({'error': 'Invalid version.'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(build_snapshot(pk, int(version) if version is not None else None))
 
 # New: User Registration View
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([RegisterRateThrottle])
 def register_user(request):
     username = request.data.get('username')
     password = request.data.get('password')
@@ -142,41 +508,134 @@ def register_user(request):
     if User.objects.filter(username=username).exists():
         return Response({'error': 'Username already exists.'}, status=status.HTTP_400_BAD_REQUEST)
 
-    user = User.objects.create_user(username=username, password=password)
-    user.save()
+    # create_user() hashes on the pool (tasks.hashing), 503 when it is full
+    User.objects.create_user(username=username, password=password)
     return Response({'message': 'User created successfully.'}, status=status.HTTP_201_CREATED)
 
+class ObtainAuthToken(authtoken_views.ObtainAuthToken):
+    # DRF's login view, throttled per IP: every attempt costs a password hash
+    throttle_classes = [LoginRateThrottle]
+
+
+obtain_auth_token = ObtainAuthToken.as_view()
+
 # New: Group Members Management View
-@api_view(['POST', 'DELETE'])
+@api_view(['GET', 'POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def group_members(request, pk):
+    """
+    List a group's members (cursor-paginated by username), or add / remove them:
+    {"username": "..."} for one user, {"usernames": [...]} for a batch, answered
+    with one result per username. Removals of more than SYNCO_MEMBERS_SYNC_REMOVALS
+    users run as a background job (202).
+    """
     try:
         group = Group.objects.get(pk=pk)
     except Group.DoesNotExist:
         return Response({'error': 'Group not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-    if request.user not in group.members.all():
+    if request.method == 'GET':
+        if not is_member(request, group):
+            return Response({'error': 'You do not have permission to access this group.'},
+                            status=status.HTTP_403_FORBIDDEN)
+        paginator = MemberCursorPagination()
+        page = paginator.paginate_queryset(group.members.only('id', 'username'), request)
+        return paginator.get_paginated_response(UserSerializer(page, many=True).data)
+
+    if not is_member(request, group):
         return Response({'error': 'You do not have permission to modify this group.'},
                         status=status.HTTP_403_FORBIDDEN)
 
+    if 'usernames' in request.data:
+        usernames = request.data['usernames']
+        if not isinstance(usernames, list) or not all(isinstance(name, str) and name for name in usernames):
+            return Response({'error': 'usernames must be a list of usernames.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(usernames) > settings.SYNCO_MEMBERS_MAX_BATCH:
+            return Response({'error': f'At most {settings.SYNCO_MEMBERS_MAX_BATCH} usernames per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        results = _change_members(request, group, usernames)
+        if isinstance(results, Job):
+            return _job_accepted(request, results)
+        return Response({'results': results})
+
     username = request.data.get('username')
-    if not username:
+    if not isinstance(username, str) or not username:
         return Response({'error': 'Username is required.'}, status=status.HTTP_400_BAD_REQUEST)
+    result, = _change_members(request, group, [username])
+    if 'error' in result:
+        return Response({'error': result['error']}, status=result['status'])
+    verb = 'added to' if request.method == 'POST' else 'removed from'
+    return Response({'message': f'User "{username}" {verb} group successfully.'}, status=status.HTTP_200_OK)
 
-    try:
-        member_to_modify = User.objects.get(username=username)
-    except User.DoesNotExist:
-        return Response({'error': 'User not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+def _change_members(request, group, usernames):
+    """
+    Add (POST) or remove (DELETE) the users named in usernames: one query resolves
+    them and their membership, one statement applies the change, and the caches and
+    events are updated once. Returns one {username, status[, error]} per distinct
+    username, in order, or the queued Job for a large removal.
+    """
+    usernames = list(dict.fromkeys(usernames))
+    memberships = Group.members.through.objects.filter(group_id=group.pk, user_id=OuterRef('pk'))
+    users = {
+        username: (user_id, member)
+        for username, user_id, member in User.objects.filter(username__in=usernames)
+        .annotate(member=Exists(memberships)).values_list('username', 'id', 'member')
+    }
+
+    results, changed = [], []
+    for username in usernames:
+        user_id, member = users.get(username, (None, False))
+        if user_id is None:
+            result = {'status': status.HTTP_404_NOT_FOUND, 'error': 'User not found.'}
+        elif request.method == 'POST':
+            result = {'status': status.HTTP_200_OK if member else status.HTTP_201_CREATED}
+        elif user_id == request.user.pk:
+            result = {'status': status.HTTP_400_BAD_REQUEST,
+                      'error': 'You cannot remove yourself from a group this way.'}
+        elif member:
+            result = {'status': status.HTTP_204_NO_CONTENT}
+        else:
+            result = {'status': status.HTTP_404_NOT_FOUND, 'error': 'User is not a member of this group.'}
+        if result['status'] in (status.HTTP_201_CREATED, status.HTTP_204_NO_CONTENT):
+            changed.append(user_id)
+        results.append({'username': username, **result})
 
     if request.method == 'POST':
-        group.members.add(member_to_modify)
-        return Response({'message': f'User "{username}" added to group successfully.'},
-                        status=status.HTTP_200_OK)
+        add_members(group.pk, changed)
+    elif len(changed) > settings.SYNCO_MEMBERS_SYNC_REMOVALS:
+        return enqueue('remove_members', {
+            'group_id': group.pk,
+            'user_ids': sorted(changed),
+            'skipped': [result['username'] for result in results if result['status'] != status.HTTP_204_NO_CONTENT],
+        }, user=request.user, total=len(changed))
+    else:
+        remove_members(group.pk, changed)
+    return results
 
-    elif request.method == 'DELETE':
-        if member_to_modify == request.user:
-            return Response({'error': 'You cannot remove yourself from a group this way.'},
-                            status=status.HTTP_400_BAD_REQUEST)
-        group.members.remove(member_to_modify)
-        return Response({'message': f'User "{username}" removed from group successfully.'},
-                        status=status.HTTP_200_OK)
\ No newline at end of file
+
+def _job_accepted(request, job):
+    # 202 for work handed to tasks.jobs; poll the Location for progress and result
+    return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': reverse('job_detail', args=[job.pk], request=request)})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def job_detail(request, pk):
+    """
+    Status, progress and result of a background job started by the user.
+    """
+    try:
+        job = Job.objects.get(pk=pk, created_by=request.user)
+    except Job.DoesNotExist:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    return Response(JobSerializer(job).data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics(request):
+    """
+    Request metrics of this worker process in the Prometheus text format (staff only).
+    """
+    return HttpResponse(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')